@@ -13,14 +13,16 @@ This module implements the Zodiac Travel Agent using:
 import os
 import asyncio
 
-# --- ADK Imports (moved inside conditional blocks to support cloud deployment) ---
-# Note: ADK imports are done inside _LOCAL_DEV_MODE block and ZodiacAgentWrapper
-# to prevent import-time initialization failures in cloud environments.
-# Only `types` is imported at module level for the wrapper class.
-try:
-    from google.genai import types
-except ImportError:
-    types = None  # Will be imported in ZodiacAgentWrapper
+import catalog
+import memory_diag
+from retry_policy import Deadline, RetryPolicy
+from scheduler import model_scheduler
+
+# --- ADK Imports (deferred) ---
+# Note: ADK and google.genai imports are done inside functions and the
+# wrapper classes to keep module import cheap and to prevent import-time
+# initialization failures in cloud environments. Call `set_up()` on the
+# deployed wrapper to pay these costs at replica startup instead.
 
 # --- API Configuration ---
 # Using Vertex AI backend (for Cloud deployment)
@@ -28,22 +30,44 @@ except ImportError:
 GOOGLE_CLOUD_PROJECT = "gen-lang-client-0344771775"
 GOOGLE_CLOUD_LOCATION = "us-central1"
 
-os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = "true"  # Key setting!
-os.environ["GOOGLE_CLOUD_PROJECT"] = GOOGLE_CLOUD_PROJECT
-os.environ["GOOGLE_CLOUD_LOCATION"] = GOOGLE_CLOUD_LOCATION
+
+def configure_vertex_env() -> None:
+    """Point the ADK's Gemini model at Vertex AI (applied at startup, not import)."""
+    os.environ["GOOGLE_GENAI_USE_VERTEXAI"] = "true"  # Key setting!
+    os.environ["GOOGLE_CLOUD_PROJECT"] = GOOGLE_CLOUD_PROJECT
+    os.environ["GOOGLE_CLOUD_LOCATION"] = GOOGLE_CLOUD_LOCATION
+
 
 # --- Constants ---
 APP_NAME = "ZodiacTravelApp"
 USER_ID = "default_user"
 MODEL_NAME = "gemini-2.5-flash-lite"
 
-# --- Retry Configuration (from Kaggle notebook) ---
-RETRY_CONFIG = types.HttpRetryOptions(
-    attempts=5,
-    exp_base=7,
-    initial_delay=1,
-    http_status_codes=[429, 500, 503, 504],
-)
+
+# --- Retry Configuration ---
+# Bounded full-jitter backoff shared with the backend (see retry_policy.py).
+# The notebook's exp_base=7 x 5 attempts could sleep for minutes.
+MODEL_RETRY_POLICY = RetryPolicy(attempts=3, base_delay=0.5, max_delay=4.0, attempt_timeout=30.0)
+# Overall budget for one wrapper query when the caller does not pass deadline_ms
+DEFAULT_QUERY_DEADLINE_SECONDS = 60.0
+_RETRY_CONFIG = None
+
+
+def get_retry_config():
+    """Build the ADK HTTP retry options from MODEL_RETRY_POLICY on first use (imports google.genai)."""
+    global _RETRY_CONFIG
+    if _RETRY_CONFIG is None:
+        from google.genai import types
+        _RETRY_CONFIG = types.HttpRetryOptions(
+            attempts=MODEL_RETRY_POLICY.attempts,
+            exp_base=2,
+            initial_delay=MODEL_RETRY_POLICY.base_delay,
+            max_delay=MODEL_RETRY_POLICY.max_delay,
+            jitter=1.0,
+            http_status_codes=sorted(MODEL_RETRY_POLICY.retry_statuses),
+        )
+    return _RETRY_CONFIG
+
 
 # --- Data ---
 FLIGHT_DATA = [
@@ -58,6 +82,8 @@ FLIGHT_DATA = [
     {"City": "Amalfi", "Price": 500, "Tags": "Luxury, Sun, Romantic, Foodie"},
     {"City": "New York", "Price": 500, "Tags": "City, Shopping, High-Energy"}
 ]
+# Catalog-shaped rows (with daily fares) for the shared ranked search (catalog.search)
+DESTINATIONS = catalog.with_default_fares([{"city": f["City"], "price": f["Price"], "tags": [t.strip() for t in f["Tags"].split(",")]} for f in FLIGHT_DATA])
 
 USER_DATA = {
     "user_001": {"name": "Alice Sky", "dob": "1995-10-15"},
@@ -116,36 +142,27 @@ def get_user_profile(user_id: str) -> str:
     return f"Name: {user['name']}, Zodiac Sign: {sign}"
 
 
-def search_destinations(vibe_keywords: list[str], max_budget: int) -> str:
+def search_destinations(vibe_keywords: list[str], max_budget: int, cursor: str = "", date_from: str = "",
+                        date_to: str = "") -> str:
     """Search for travel destinations matching vibe keywords within budget.
     
     Args:
         vibe_keywords: List of vibes to match (e.g., ['romantic', 'sun', 'luxury'])
         max_budget: Maximum budget in dollars
+        cursor: Cursor from a previous result's "More results" line, for the next page
+        date_from: Earliest departure date (YYYY-MM-DD) if the user gave travel dates
+        date_to: Latest departure date (YYYY-MM-DD); empty for a single day
     
     Returns:
-        Matching destinations with prices and tags, or error message.
+        Ranked destinations with prices and tags, or error message.
     """
     try:
         budget = int(max_budget)
     except:
         return f"Invalid budget format: {max_budget}. Please provide a number."
     
-    results = []
-    for flight in FLIGHT_DATA:
-        if flight["Price"] <= budget:
-            score = 0
-            tags_lower = flight["Tags"].lower()
-            for keyword in vibe_keywords:
-                if keyword.lower() in tags_lower:
-                    score += 1
-            if score > 0:
-                results.append(f"✈️ {flight['City']} (${flight['Price']}): {flight['Tags']}")
-    
-    if not results:
-        return f"No destinations found matching {vibe_keywords} under ${budget}. Try increasing budget or different vibes."
-    
-    return "\n".join(results[:5])
+    return catalog.search_destinations(DESTINATIONS, budget, vibe_keywords, cursor or None,
+                                       date_from=date_from or None, date_to=date_to or None)
 
 
 def get_zodiac_traits(sign: str) -> str:
@@ -299,11 +316,17 @@ When recommending, format like:
         self._model = GenerativeModel("gemini-2.5-flash-lite", system_instruction=system_prompt)
         self._chat = self._model.start_chat()
     
-    def query(self, message: str, session_id: str = "default", user_id: str = None) -> str:
+    def set_up(self):
+        """Warm-up hook: build the model at replica startup instead of first query."""
+        configure_vertex_env()
+        self._initialize()
+    
+    def query(self, message: str, session_id: str = "default", user_id: str = None, deadline_ms: int = None) -> str:
         """Query the agent with a message.
         
         This is the method the backend calls via the Agent Engine API.
-        Fully synchronous - no async/await.
+        Fully synchronous - no async/await. Retries, queueing for a model slot
+        and each attempt's timeout all stay within `deadline_ms`.
         """
         self._initialize()
         
@@ -317,8 +340,17 @@ When recommending, format like:
         
         full_message = context_prefix + message
         
+        deadline = Deadline(deadline_ms / 1000.0 if deadline_ms else DEFAULT_QUERY_DEADLINE_SECONDS)
         try:
-            response = self._chat.send_message(full_message)
+            def attempt(timeout):
+                # A copy of the chat, so an abandoned call cannot append to the real history late
+                trial = self._model.start_chat(history=list(self._chat.history))
+                response = model_scheduler.call(lambda: trial.send_message(full_message), timeout,
+                                                deadline, tenant=user_id)
+                self._chat.history.extend(trial.history[len(self._chat.history):])
+                return response
+            
+            response = MODEL_RETRY_POLICY.call(attempt, deadline)
             return response.text
         except Exception as e:
             return f"✨ The stars are a bit cloudy right now... Error: {str(e)}"
@@ -349,6 +381,8 @@ async def run_query(query: str, session_id: str = "default") -> str:
             app_name=APP_NAME, user_id=USER_ID, session_id=session_id
         )
     
+    from google.genai import types
+    
     # Create query content
     query_content = types.Content(role="user", parts=[types.Part(text=query)])
     
@@ -419,6 +453,7 @@ class ZodiacAgentWrapper:
         {"City": "Amalfi", "Price": 500, "Tags": "Luxury, Sun, Romantic, Foodie"},
         {"City": "New York", "Price": 500, "Tags": "City, Shopping, High-Energy"}
     ]
+    DESTINATIONS = catalog.with_default_fares([{"city": f["City"], "price": f["Price"], "tags": [t.strip() for t in f["Tags"].split(",")]} for f in FLIGHT_DATA])
     
     USER_DATA = {
         "user_001": {"name": "Alice Sky", "dob": "1995-10-15"},
@@ -465,6 +500,8 @@ TOOLS AVAILABLE:
         self._runner = None
         self._session_service = None
         self._memory_service = None
+        self.startup_report = {}
+        self._memory_diag = memory_diag.MemoryDiagnostics()
     
     # --- Inline tool functions as static methods ---
     @staticmethod
@@ -496,21 +533,16 @@ TOOLS AVAILABLE:
         return f"Name: {user['name']}, Zodiac Sign: {sign}"
     
     @staticmethod
-    def search_destinations(vibe_keywords: list, max_budget: int) -> str:
-        """Search for destinations matching vibes and budget."""
+    def search_destinations(vibe_keywords: list, max_budget: int, cursor: str = "", date_from: str = "",
+                            date_to: str = "") -> str:
+        """Search for destinations matching vibes and budget (ranked, paged via cursor, optional YYYY-MM-DD dates)."""
         try:
             budget = int(max_budget)
         except:
             return f"Invalid budget: {max_budget}"
         
-        results = []
-        for flight in ZodiacAgentWrapper.FLIGHT_DATA:
-            if flight["Price"] <= budget:
-                score = sum(1 for kw in vibe_keywords if kw.lower() in flight["Tags"].lower())
-                if score > 0:
-                    results.append(f"✈️ {flight['City']} (${flight['Price']}): {flight['Tags']}")
-        
-        return "\n".join(results[:5]) if results else f"No destinations under ${budget}"
+        return catalog.search_destinations(ZodiacAgentWrapper.DESTINATIONS, budget, vibe_keywords, cursor or None,
+                                           date_from=date_from or None, date_to=date_to or None)
     
     @staticmethod
     def get_zodiac_traits(sign: str) -> str:
@@ -538,7 +570,7 @@ TOOLS AVAILABLE:
         self._memory_service = InMemoryMemoryService()
         
         agent = LlmAgent(
-            model=Gemini(model=self.model_name),
+            model=Gemini(model=self.model_name, retry_options=get_retry_config()),
             name="ZodiacTravelAgent",
             instruction=self.SYSTEM_INSTRUCTION,
             tools=[
@@ -557,8 +589,48 @@ TOOLS AVAILABLE:
         
         self._initialized = True
     
-    def query(self, message: str, session_id: str = "default") -> str:
-        """Query the agent."""
+    def set_up(self):
+        """Warm-up hook, called by Agent Engine once per replica at startup.
+        
+        Pre-imports the ADK stack, builds the runner, pre-authenticates and,
+        when ZODIAC_WARMUP_PRIME=1, fires a tiny priming query so the first
+        real user does not pay the cold-start cost.
+        """
+        import os
+        import time
+        
+        started = time.perf_counter()
+        if memory_diag.ENABLED:
+            self._memory_diag.start()
+        self._ensure_initialized()
+        self.startup_report["adk_init_seconds"] = time.perf_counter() - started
+        
+        phase = time.perf_counter()
+        try:
+            import google.auth
+            from google.auth.transport.requests import Request
+            creds, _ = google.auth.default()
+            creds.refresh(Request())
+            self.startup_report["auth_seconds"] = time.perf_counter() - phase
+        except Exception as e:
+            self.startup_report["auth_error"] = str(e)
+        
+        if os.environ.get("ZODIAC_WARMUP_PRIME") == "1":
+            phase = time.perf_counter()
+            try:
+                self.query("Hi", session_id="__warmup__")
+                self.startup_report["prime_seconds"] = time.perf_counter() - phase
+            except Exception as e:
+                self.startup_report["prime_error"] = str(e)
+        
+        self.startup_report["total_seconds"] = time.perf_counter() - started
+    
+    def query(self, message: str, session_id: str = "default", priority: str = "interactive") -> str:
+        """Query the agent.
+        
+        The runner's model calls happen inside ADK, so the whole turn holds
+        one model slot (fair-shared per session; batch jobs pass priority="batch").
+        """
         import asyncio
         from google.genai import types
         
@@ -577,14 +649,14 @@ TOOLS AVAILABLE:
             query_content = types.Content(role="user", parts=[types.Part(text=message)])
             
             response_text = ""
-            async for event in self._runner.run_async(
-                user_id=self.USER_ID, session_id=session.id, new_message=query_content
-            ):
-                if event.is_final_response() and event.content and event.content.parts:
-                    text = event.content.parts[0].text
-                    if text and text != "None":
-                        response_text = text
-            
+            async with model_scheduler.slot_async(priority=priority, tenant=session_id):
+                async for event in self._runner.run_async(
+                    user_id=self.USER_ID, session_id=session.id, new_message=query_content
+                ):
+                    if event.is_final_response() and event.content and event.content.parts:
+                        text = event.content.parts[0].text
+                        if text and text != "None":
+                            response_text = text
             
             return response_text
         
@@ -598,6 +670,11 @@ TOOLS AVAILABLE:
         except RuntimeError:
             # No event loop running (local), use asyncio.run()
             return asyncio.run(_run())
+    
+    def memory_report(self) -> dict:
+        """Memory diagnostics: RSS, object counts, per-session event counts, growth sites."""
+        sessions = memory_diag.session_service_sizes(self._session_service)
+        return self._memory_diag.report(extra={"sessions": sessions, "session_count": len(sessions)})
 
 
 # --- EXPOSE AGENT FOR ADK DEPLOYMENT ---
@@ -611,6 +688,8 @@ if __name__ == "__main__":
     print("Type 'quit' to exit, 'save' to save session to memory")
     print()
     
+    configure_vertex_env()
+    
     session_id = "interactive_session"
     
     while True:
@@ -0,0 +1,292 @@
+"""
+Conversation Log
+================
+
+Append-only transcript log that keeps disk I/O off the request path:
+
+1. Request handlers call `log()`, which only puts a record on a bounded
+   in-memory queue.
+2. A background task drains the queue in batches. A batch closes at
+   BATCH_SIZE records (or half the queue, if smaller) or after
+   FLUSH_INTERVAL_SECONDS, whichever comes first. Each batch is compressed
+   into one gzip member and appended to the current segment on a worker
+   thread.
+3. Segments rotate by size and age. Nothing is deleted unless `keep` is set,
+   in which case only the newest `keep` are retained. Because every batch
+   is a complete gzip member, a segment cut off by a crash loses at most
+   the batch being written.
+
+When the queue is full, the backpressure policy decides what happens:
+
+- `drop_newest` (default) rejects the new record.
+- `drop_oldest` evicts the oldest queued record to make room.
+- `block` waits up to BLOCK_TIMEOUT_SECONDS for room (`log_async()` only;
+  `log()` cannot wait and falls back to drop_newest).
+
+Dropped records are counted in `snapshot()`. They are never silent.
+
+Segments are named `conversations-<pid>-<utc time>-<seq>.jsonl.gz`, so each
+worker process writes its own files. `read_records()` and `to_scenarios()`
+turn a log directory back into load_test.py scenarios:
+
+    python load_test.py --replay-logs /var/log/zodiac --target http://localhost:8000
+
+The writer runs in the backend and the reader in load_test.py, so the file
+exists in both backend/ and agent-source/; backend/tests/test_shared_modules.py
+fails if they drift. Stdlib only.
+
+Environment:
+    ZODIAC_CONVERSATION_LOG_DIR         Directory for segments (unset = logging disabled)
+    ZODIAC_CONVERSATION_LOG_QUEUE       Queued records before backpressure applies (default 10000)
+    ZODIAC_CONVERSATION_LOG_POLICY      drop_newest | drop_oldest | block (default drop_newest)
+    ZODIAC_CONVERSATION_LOG_SEGMENT_MB  Compressed size at which a segment rotates (default 64)
+    ZODIAC_CONVERSATION_LOG_KEEP        Segments kept per worker, older ones deleted (default 0 = keep all)
+"""
+
+import asyncio
+import gzip
+import json
+import os
+import time
+import zlib
+
+POLICIES = ("drop_newest", "drop_oldest", "block")
+BATCH_SIZE = 256
+FLUSH_INTERVAL_SECONDS = 1.0
+# A segment also rotates after this long, so old transcripts age out by time too
+SEGMENT_MAX_SECONDS = 3600.0
+BLOCK_TIMEOUT_SECONDS = 0.05
+SEGMENT_PREFIX = "conversations-"
+SEGMENT_SUFFIX = ".jsonl.gz"
+
+
+class ConversationLog:
+    """Bounded queue plus background batch writer for transcript records.
+
+    Args:
+        directory: Segment directory (None disables logging; `log()` is then a no-op)
+        max_queue: Records held in memory before the policy applies
+        policy: One of POLICIES
+        segment_bytes: Compressed bytes after which the segment rotates
+        keep: Newest segments (of this process) kept on disk; 0 keeps all
+    """
+
+    def __init__(self, directory: str = None, max_queue: int = 10000, policy: str = "drop_newest",
+                 segment_bytes: int = 64 * 1024 * 1024, keep: int = 0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown conversation log policy {policy!r}; expected one of {POLICIES}")
+        self.directory = directory
+        self.max_queue = max(1, max_queue)
+        # Flush at half a small queue, so producers are not dropping while a batch fills
+        self.batch_size = min(BATCH_SIZE, max(1, self.max_queue // 2))
+        self.policy = policy
+        self.segment_bytes = segment_bytes
+        self.keep = keep
+        self._queue = None
+        self._task = None
+        self._pending = []  # batch being collected (survives the writer's cancellation)
+        self._batch_ready = None  # set by producers once a full batch is queued
+        self._writing = None
+        self._segment = None  # (path, opened_at, bytes written)
+        self._seq = 0
+        self.stats = {"enqueued": 0, "written": 0, "dropped": 0, "batches": 0, "segments": 0,
+                      "bytes_written": 0, "write_errors": 0, "max_depth": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    # --- Lifecycle ---
+    def start(self) -> None:
+        """Start the writer on the running event loop (call from the app's startup)."""
+        if not self.enabled or self._task is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._batch_ready = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        """Flush everything queued, then stop the writer."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        if self._writing is not None:
+            await self._writing
+        batch, self._pending = self._pending + self._drain(self._queue.qsize()), []
+        await self._write(batch)
+        self._queue = None
+
+    # --- Producers ---
+    def log(self, record: dict) -> bool:
+        """Queue a record without waiting. Returns False if it was dropped."""
+        if self._queue is None:
+            return False
+        record.setdefault("ts", round(time.time(), 3))
+        try:
+            self._queue.put_nowait(record)
+        except asyncio.QueueFull:
+            if self.policy != "drop_oldest":
+                self.stats["dropped"] += 1
+                return False
+            self._queue.get_nowait()
+            self._queue.put_nowait(record)
+            self.stats["dropped"] += 1
+        self._enqueued()
+        return True
+
+    async def log_async(self, record: dict) -> bool:
+        """`log()`, except the block policy waits briefly for room instead of dropping."""
+        if self._queue is None or self.policy != "block" or not self._queue.full():
+            return self.log(record)
+        record.setdefault("ts", round(time.time(), 3))
+        try:
+            await asyncio.wait_for(self._queue.put(record), BLOCK_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            self.stats["dropped"] += 1
+            return False
+        self._enqueued()
+        return True
+
+    def _enqueued(self) -> None:
+        self.stats["enqueued"] += 1
+        self.stats["max_depth"] = max(self.stats["max_depth"], self._queue.qsize())
+        if self._queue.qsize() + len(self._pending) >= self.batch_size:
+            self._batch_ready.set()
+
+    # --- Writer ---
+    def _drain(self, limit: int) -> list:
+        batch = []
+        while len(batch) < limit and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _collect(self) -> None:
+        """Fill self._pending until batch_size records or FLUSH_INTERVAL_SECONDS after the first."""
+        if not self._pending:
+            self._pending.append(await self._queue.get())
+        self._batch_ready.clear()
+        if self._queue.qsize() + len(self._pending) < self.batch_size:
+            # Not wait_for(queue.get()): a timeout racing a get can lose the record
+            ready = asyncio.ensure_future(self._batch_ready.wait())
+            try:
+                await asyncio.wait({ready}, timeout=FLUSH_INTERVAL_SECONDS)
+            finally:
+                ready.cancel()
+        self._pending += self._drain(self.batch_size - len(self._pending))
+
+    async def _run(self) -> None:
+        while True:
+            await self._collect()
+            batch, self._pending = self._pending, []
+            # Shielded: close() cancels the loop, never a batch already handed to the disk
+            self._writing = asyncio.ensure_future(self._write(batch))
+            await asyncio.shield(self._writing)
+
+    async def _write(self, batch: list) -> None:
+        if not batch:
+            return
+        try:
+            await asyncio.to_thread(self._append, batch)
+        except OSError:
+            self.stats["write_errors"] += 1
+            self.stats["dropped"] += len(batch)
+            return
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+
+    def _append(self, batch: list) -> None:
+        """Compress a batch into one gzip member and append it to the current segment (worker thread)."""
+        lines = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in batch)
+        member = gzip.compress(lines.encode("utf-8"), compresslevel=6)
+        path, opened_at, size = self._segment or (None, 0.0, 0)
+        if path is None or size >= self.segment_bytes or time.monotonic() - opened_at >= SEGMENT_MAX_SECONDS:
+            path, opened_at, size = self._rotate(), time.monotonic(), 0
+        with open(path, "ab") as f:
+            f.write(member)
+        self._segment = (path, opened_at, size + len(member))
+        self.stats["bytes_written"] += len(member)
+
+    def _rotate(self) -> str:
+        self._seq += 1
+        stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{os.getpid()}-{stamp}-{self._seq:05d}{SEGMENT_SUFFIX}")
+        self.stats["segments"] += 1
+        if self.keep:
+            own = sorted(p for p in segment_paths(self.directory) if f"{SEGMENT_PREFIX}{os.getpid()}-" in p)
+            for old in own[:max(0, len(own) - self.keep + 1)]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        return path
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, enabled=self.enabled, policy=self.policy,
+                    depth=self._queue.qsize() if self._queue is not None else 0)
+
+
+def from_env() -> ConversationLog:
+    return ConversationLog(
+        directory=os.environ.get("ZODIAC_CONVERSATION_LOG_DIR") or None,
+        max_queue=int(os.environ.get("ZODIAC_CONVERSATION_LOG_QUEUE", "10000")),
+        policy=os.environ.get("ZODIAC_CONVERSATION_LOG_POLICY", "drop_newest"),
+        segment_bytes=int(float(os.environ.get("ZODIAC_CONVERSATION_LOG_SEGMENT_MB", "64")) * 1024 * 1024),
+        keep=int(os.environ.get("ZODIAC_CONVERSATION_LOG_KEEP", "0")),
+    )
+
+
+# --- Reading ---
+def segment_paths(path: str) -> list:
+    """Segment files under a directory (or the file itself), oldest first per worker."""
+    if os.path.isfile(path):
+        return [path]
+    names = sorted(n for n in os.listdir(path) if n.startswith(SEGMENT_PREFIX) and n.endswith(SEGMENT_SUFFIX))
+    return [os.path.join(path, n) for n in names]
+
+
+def read_records(path: str):
+    """Yield records from a segment file or directory, ordered by timestamp.
+
+    A truncated final gzip member (crash mid-write) ends that segment
+    without an error; the complete batches before it are still returned.
+    """
+    records = []
+    for segment in segment_paths(path):
+        with gzip.open(segment, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue
+            except (EOFError, OSError, zlib.error):
+                pass
+    records.sort(key=lambda r: r.get("ts", 0))
+    yield from records
+
+
+def to_scenarios(records, max_think_time: float = 30.0) -> list:
+    """Group records into load_test.py conversations (one per session, original think times).
+
+    Think time is the gap between one turn's reply and the next message,
+    capped at max_think_time so idle sessions do not stall a replay.
+    """
+    sessions = {}
+    for record in records:
+        if not record.get("message"):
+            continue
+        key = record.get("session_id") or record.get("user_id") or "anonymous"
+        session = sessions.setdefault(key, {"user_id": record.get("user_id") or "anonymous", "turns": [], "_last": None})
+        turn = {"message": record["message"]}
+        started = record.get("ts", 0) - record.get("latency_ms", 0) / 1000.0
+        if session["_last"] is not None:
+            turn["think_time"] = round(min(max_think_time, max(0.0, started - session["_last"])), 3)
+        session["_last"] = record.get("ts", 0)
+        session["turns"].append(turn)
+    return [{"user_id": s["user_id"], "turns": s["turns"]} for s in sessions.values()]
@@ -6,17 +6,82 @@ This script deploys the Zodiac Travel Agent using the ReasoningEngine.create() S
 instead of `adk deploy`. This gives us full control over which methods are exposed.
 
 Usage:
-    python deploy_sdk.py
+    python deploy_sdk.py            # full payload (catalog pickled with the agent)
+    python deploy_sdk.py --thin     # thin loader + versioned catalog artifact
+    python deploy_sdk.py --measure  # compare payload size / unpickle time, no deploy
 """
 
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+
 import vertexai
 from vertexai.preview import reasoning_engines
 
+import catalog
+import memory_diag
+import structured
+from fast_path import FastPath, user_text
+from model_router import ESCALATION_MODEL_NAME, ModelRouter, avg_logprob, validate_reply
+from retry_policy import Deadline, DeadlineExceeded, RetryPolicy
+from scheduler import model_scheduler, scheduling
+from speculation import Speculator, normalize_args
+
 # --- Configuration ---
 PROJECT_ID = "gen-lang-client-0344771775"
 LOCATION = "us-central1"
 DISPLAY_NAME = "Zodiac Travel Agent (SDK Deploy)"
+# Cheapest model first; hard or failed turns escalate to the next (ZODIAC_CASCADE)
 MODEL_NAME = "gemini-2.5-flash-lite"
+MODEL_TIERS = [MODEL_NAME, ESCALATION_MODEL_NAME]
+# Process-pool workers for heavy tool calls (0 = always run tools inline)
+TOOL_WORKERS = int(os.environ.get("ZODIAC_TOOL_WORKERS", "0"))
+# Model call retries (never hedged: a chat turn is not idempotent)
+MODEL_RETRY_POLICY = RetryPolicy(attempts=3, base_delay=0.5, max_delay=4.0, attempt_timeout=30.0)
+# Conversations (one chat each) kept per replica; the least recently used is dropped first
+MAX_CHAT_SESSIONS = int(os.environ.get("ZODIAC_CHAT_SESSIONS", "1000"))
+# Guards every agent's session table (module level: the agent itself is pickled)
+_sessions_lock = threading.Lock()
+# Model round trips allowed for tool calls in one turn
+MAX_TOOL_ITERATIONS = 5
+# Overall budget for one query when the caller does not pass deadline_ms
+DEFAULT_QUERY_DEADLINE_SECONDS = 60.0
+# Answer fully specified turns from the catalog without calling the model
+FAST_PATH_ENABLED = os.environ.get("ZODIAC_FAST_PATH", "1") == "1"
+# Default reply style: "markdown" (tool loop), "structured" (schema-constrained picks,
+# rendered server-side) or "json" (the validated picks); callers override per query
+DEFAULT_RESPONSE_FORMAT = os.environ.get("ZODIAC_RESPONSE_FORMAT", "markdown")
+# Prefetch likely tool calls (profile, search) while the first model call runs
+SPECULATION_ENABLED = os.environ.get("ZODIAC_SPECULATE", "1") == "1"
+# Fire a one-token priming request during set_up() (costs one model call per replica)
+WARMUP_PRIME = os.environ.get("ZODIAC_WARMUP_PRIME", "0") == "1"
+
+
+class _Conversation:
+    """One session's chat of record and the lock that runs its turns one at a time."""
+
+    def __init__(self, chat):
+        self.chat = chat
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def turn(self):
+        with self.lock:
+            yield self.chat
+
+    @asynccontextmanager
+    async def turn_async(self):
+        # Polled, not an asyncio.Lock: a sync query() on the same session takes this lock too
+        while not self.lock.acquire(blocking=False):
+            await asyncio.sleep(0.005)
+        try:
+            yield self.chat
+        finally:
+            self.lock.release()
 
 
 class ZodiacTravelAgent:
@@ -26,55 +91,53 @@ class ZodiacTravelAgent:
     The `query` method is exposed as the main entry point.
     """
     
-    def __init__(self):
+    def __init__(self, catalog_artifact: str = None):
         self._model = None
-        self._chat = None
-        
-        # User database (one user per zodiac sign)
-        self.user_data = {
-            "user_001": {"name": "Alice Sky", "dob": "1995-10-15"},       # Libra
-            "user_002": {"name": "Bob Voyager", "dob": "1988-08-10"},     # Leo
-            "user_003": {"name": "Carol Star", "dob": "1990-03-25"},      # Aries
-            "user_004": {"name": "Diana Moon", "dob": "1992-04-28"},      # Taurus
-            "user_005": {"name": "Ethan Breeze", "dob": "1985-06-15"},    # Gemini
-            "user_006": {"name": "Fiona Tide", "dob": "1993-07-04"},      # Cancer
-            "user_007": {"name": "George Blaze", "dob": "1987-08-22"},    # Leo
-            "user_008": {"name": "Hannah Ivy", "dob": "1991-09-10"},      # Virgo
-            "user_009": {"name": "Ivan Storm", "dob": "1989-11-15"},      # Scorpio
-            "user_010": {"name": "Julia Arrow", "dob": "1994-12-05"},     # Sagittarius
-            "user_011": {"name": "Kevin Peak", "dob": "1986-01-10"},      # Capricorn
-            "user_012": {"name": "Luna Wave", "dob": "1995-02-14"},       # Aquarius
-            "user_013": {"name": "Maya Dream", "dob": "1990-03-05"},      # Pisces
-        }
+        self._models = []
+        self._conversations = OrderedDict()
+        self._structured_model = None
+        self._function_response = None
+        self._router = ModelRouter(MODEL_TIERS)
+        self._tool_executor = None
+        self.startup_report = {}
+        self._fast_path = FastPath()
+        self._structured = structured.StructuredResponder()
+        self._speculator = Speculator()
+        self._tracer = None
+        self._memory_diag = memory_diag.MemoryDiagnostics()
         
-        # Destination database
-        self.destinations = [
-            {"city": "Santorini", "price": 450, "tags": ["Luxury", "Sun", "Romantic", "Water"]},
-            {"city": "Bali", "price": 850, "tags": ["Nature", "Spiritual", "Sun", "Water"]},
-            {"city": "Paris", "price": 300, "tags": ["Romantic", "Shopping", "Art", "City"]},
-            {"city": "Tokyo", "price": 900, "tags": ["City", "Foodie", "Tech", "Future"]},
-            {"city": "Tulum", "price": 600, "tags": ["Party", "Sun", "Trendy", "Water"]},
-            {"city": "Lisbon", "price": 250, "tags": ["City", "Sun", "Foodie", "History"]},
-            {"city": "Budapest", "price": 150, "tags": ["City", "Party", "Budget", "History"]},
-            {"city": "Prague", "price": 180, "tags": ["City", "History", "Budget", "Romantic"]},
-            {"city": "Barcelona", "price": 350, "tags": ["City", "Sun", "Art", "Party"]},
-        ]
-        
-        # Zodiac traits
-        self.zodiac_traits = {
-            "Aries": "Adventurous, Bold, Energetic",
-            "Taurus": "Luxurious, Sensual, Grounded",
-            "Gemini": "Curious, Social, Versatile",
-            "Cancer": "Nurturing, Emotional, Home-loving",
-            "Leo": "Dramatic, Confident, Creative",
-            "Virgo": "Analytical, Practical, Health-conscious",
-            "Libra": "Artistic, Harmonious, Social",
-            "Scorpio": "Intense, Mysterious, Passionate",
-            "Sagittarius": "Adventurous, Philosophical, Free-spirited",
-            "Capricorn": "Ambitious, Disciplined, Traditional",
-            "Aquarius": "Innovative, Independent, Humanitarian",
-            "Pisces": "Dreamy, Intuitive, Artistic",
-        }
+        # Catalog (users, destinations, zodiac traits). With a catalog artifact
+        # the pickle only carries its name; data is loaded on first use.
+        self.catalog_artifact = catalog_artifact
+        self._catalog = None if catalog_artifact else catalog.default_catalog()
+    
+    def __getstate__(self):
+        """Drop live clients when pickled for deployment; replicas rebuild them in set_up()."""
+        state = self.__dict__.copy()
+        state.update(_model=None, _models=[], _conversations=OrderedDict(), _structured_model=None, _function_response=None, _tool_executor=None, _tracer=None, startup_report={})
+        if self.catalog_artifact:
+            state["_catalog"] = None
+        return state
+    
+    def _get_catalog(self) -> dict:
+        """Return the catalog, loading the artifact on first use."""
+        if self._catalog is None:
+            started = time.perf_counter()
+            self._catalog = catalog.load_artifact(self.catalog_artifact)
+            self.startup_report["catalog_load_seconds"] = time.perf_counter() - started
+        return self._catalog
+    
+    @property
+    def user_data(self) -> dict:
+        return self._get_catalog()["user_data"]
+    
+    @property
+    def destinations(self) -> list:
+        return self._get_catalog()["destinations"]
+    
+    @property
+    def zodiac_traits(self) -> dict:
+        return self._get_catalog()["zodiac_traits"]
     
     def _get_zodiac_sign(self, dob: str) -> str:
         """Calculate zodiac sign from date of birth (YYYY-MM-DD)."""
@@ -100,7 +163,7 @@ class ZodiacTravelAgent:
         if self._model is not None:
             return
         
-        from vertexai.generative_models import GenerativeModel, FunctionDeclaration, Tool
+        from vertexai.generative_models import GenerativeModel, GenerationConfig, FunctionDeclaration, Part, Tool
         
         # Define the search_destinations tool
         search_destinations_func = FunctionDeclaration(
@@ -117,6 +180,18 @@ class ZodiacTravelAgent:
                         "type": "array",
                         "items": {"type": "string"},
                         "description": "List of desired vibes/tags like 'Romantic', 'Party', 'Nature', 'City', 'Spiritual', 'Luxury', 'Budget'"
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "Cursor from a previous result's 'More results' line, to get the next page"
+                    },
+                    "date_from": {
+                        "type": "string",
+                        "description": "Earliest departure date (YYYY-MM-DD) when the user gives travel dates; prices become the cheapest fare in the window"
+                    },
+                    "date_to": {
+                        "type": "string",
+                        "description": "Latest departure date (YYYY-MM-DD); omit for a single departure day"
                     }
                 },
                 "required": ["max_budget"]
@@ -151,7 +226,7 @@ class ZodiacTravelAgent:
 
 ## AVAILABLE TOOLS
 1. **get_user_profile**: Call this to get the user's zodiac sign and traits
-2. **search_destinations**: Call this to find destinations within budget matching vibes
+2. **search_destinations**: Call this to find destinations within budget matching vibes (pass date_from/date_to when the user gives travel dates)
 
 ## DECISION ENGINE (Priority Loop)
 
@@ -177,37 +252,280 @@ class ZodiacTravelAgent:
 ## RESPONSE FORMAT
 ✨ **[City Name]** ($[Price]) — [1-sentence cosmic justification linking user's sign/traits to destination's vibe tags]
 '''
-        self._model = GenerativeModel(MODEL_NAME, system_instruction=system_prompt, tools=[travel_tools])
-        self._chat = self._model.start_chat()
+        self._models = [GenerativeModel(name, system_instruction=system_prompt, tools=[travel_tools]) for name in self._router.tiers]
+        self._model = self._models[0]
+        self._function_response = Part.from_function_response
+        # Tool-free and schema-constrained: the agent supplies the candidates
+        self._structured_model = GenerativeModel(
+            MODEL_NAME,
+            system_instruction=structured.SYSTEM_PROMPT,
+            generation_config=GenerationConfig(
+                response_mime_type="application/json",
+                response_schema=structured.RESPONSE_SCHEMA,
+                max_output_tokens=structured.MAX_OUTPUT_TOKENS,
+            ),
+        )
+        
+        # Optional process pool for heavy tool calls (never pickled - built on the replica)
+        if TOOL_WORKERS > 0 and self._tool_executor is None:
+            from tool_executor import ToolExecutor
+            self._tool_executor = ToolExecutor(self.destinations, max_workers=TOOL_WORKERS)
+            self._tool_executor.start()
     
-    def _handle_tool_call(self, function_call):
-        """Execute a tool call and return the result."""
-        name = function_call.name
-        args = dict(function_call.args)
+    def use_model(self, model, function_response=None, escalation_model=None):
+        """Swap in a different model, e.g. `fake_model.FakeGenerativeModel` for load tests.
+        
+        Args:
+            model: Object with the GenerativeModel `start_chat()` interface
+            function_response: Builds a tool-result part (name=, response=);
+                defaults to `model.function_response`
+            escalation_model: Optional larger model for the cascade
+        """
+        self._models = [model] + ([escalation_model] if escalation_model is not None else [])
+        self._router = ModelRouter([getattr(m, "model_name", f"model-{i}") for i, m in enumerate(self._models)])
+        self._model = model
+        with _sessions_lock:
+            self._conversations.clear()
+        self._structured_model = model
+        self._function_response = function_response or model.function_response
+    
+    def set_up(self):
+        """Warm-up hook, called by Agent Engine once per replica at startup.
+        
+        Pre-imports the Vertex AI SDK, pre-authenticates, builds the model
+        (and tool pool) and optionally fires a tiny priming request, so the
+        first user after a scale-up does not pay for any of it. Phase timings
+        are kept in `self.startup_report`.
+        """
+        started = time.perf_counter()
+        if memory_diag.ENABLED:
+            self._memory_diag.start()
+        
+        phase = time.perf_counter()
+        from vertexai.generative_models import GenerativeModel, Part  # noqa: F401
+        self.startup_report["import_seconds"] = time.perf_counter() - phase
+        
+        phase = time.perf_counter()
+        try:
+            import google.auth
+            from google.auth.transport.requests import Request
+            creds, _ = google.auth.default()
+            creds.refresh(Request())
+            self.startup_report["auth_seconds"] = time.perf_counter() - phase
+        except Exception as e:
+            self.startup_report["auth_error"] = str(e)
         
+        self._get_catalog()
+        
+        phase = time.perf_counter()
+        self._initialize_model()
+        self.startup_report["model_seconds"] = time.perf_counter() - phase
+        
+        if WARMUP_PRIME:
+            phase = time.perf_counter()
+            try:
+                # Goes through the model directly so the shared chat history stays clean
+                self._model.generate_content("Hi", generation_config={"max_output_tokens": 1})
+                self.startup_report["prime_seconds"] = time.perf_counter() - phase
+            except Exception as e:
+                self.startup_report["prime_error"] = str(e)
+        
+        self.startup_report["total_seconds"] = time.perf_counter() - started
+    
+    def memory_report(self) -> dict:
+        """Memory diagnostics: RSS, object counts, per-session chat history size, growth sites."""
+        return self._memory_diag.report(histories=self._histories(), extra={"fast_path": self._fast_path.stats})
+    
+    def _histories(self) -> dict:
+        """{session key: chat history} for the conversations this replica holds."""
+        with _sessions_lock:
+            return {key: conversation.chat.history for key, conversation in self._conversations.items()}
+    
+    def _conversation(self, key: str) -> _Conversation:
+        """The session's conversation, started on first use (least recently used evicted)."""
+        self._initialize_model()
+        with _sessions_lock:
+            conversation = self._conversations.get(key)
+            if conversation is None:
+                conversation = self._conversations[key] = _Conversation(self._model.start_chat())
+                while len(self._conversations) > MAX_CHAT_SESSIONS:
+                    self._conversations.popitem(last=False)
+            else:
+                self._conversations.move_to_end(key)
+            return conversation
+    
+    def metrics(self) -> dict:
+        """Counters for this replica: fast path, search outcomes, model cascade, queue and retries, tool pool."""
+        return {
+            "fast_path": dict(self._fast_path.stats, hit_rate=self._fast_path.hit_rate()),
+            "structured": self._structured.stats,
+            "search": catalog.search_stats.snapshot(),
+            "speculation": dict(self._speculator.stats, hit_rate=self._speculator.hit_rate()),
+            "models": self._router.snapshot(),
+            "model_queue": model_scheduler.snapshot(),
+            "model_retries": MODEL_RETRY_POLICY.stats,
+            "tools": self._tool_executor.metrics() if self._tool_executor is not None else None,
+        }
+    
+    def _profile(self, user_id: str):
+        """Return (name, zodiac, traits) for a known user, else None."""
+        user = self.user_data.get(user_id) if user_id else None
+        if user is None:
+            return None
+        zodiac = self._get_zodiac_sign(user["dob"])
+        return user["name"], zodiac, self.zodiac_traits.get(zodiac, "")
+    
+    def _record_turn(self, chat, message: str, reply: str):
+        """Append a locally answered turn to the chat history so the model keeps context."""
+        try:
+            from vertexai.generative_models import Content, Part
+            chat.history.append(Content(role="user", parts=[Part.from_text(message)]))
+            chat.history.append(Content(role="model", parts=[Part.from_text(reply)]))
+        except Exception:
+            pass  # history is best-effort; the reply itself is still correct
+    
+    def _span(self, name: str, attributes: dict = None, traceparent: str = None):
+        """Start a trace span (tracer is built on the replica, never pickled)."""
+        if self._tracer is None:
+            from tracing import Tracer
+            self._tracer = Tracer("agent")
+        return self._tracer.span(name, attributes, traceparent)
+    
+    def _send(self, chat, tier: int, content, deadline: Deadline):
+        """Send a chat message, retrying transient model errors within the deadline.
+        
+        Each attempt waits for a model slot; backoff sleeps do not hold one.
+        An attempt is abandoned at its timeout. It runs on a copy of the chat,
+        so a call that finishes late cannot append to the real history.
+        """
+        def attempt(timeout):
+            trial = self._models[tier].start_chat(history=list(chat.history))
+            # The vertexai SDK takes no per-call timeout; an abandoned call keeps its slot
+            response = model_scheduler.call(lambda: trial.send_message(content), timeout, deadline)
+            chat.history.extend(trial.history[len(chat.history):])
+            return response
+        
+        model = self._router.tiers[tier]
+        with self._span("model.send_message", {"model": model}):
+            started = time.perf_counter()
+            response = MODEL_RETRY_POLICY.call(attempt, deadline)
+        self._router.record_call(model, time.perf_counter() - started, response, len(content) if isinstance(content, str) else 0)
+        return response
+    
+    async def _send_async(self, chat, tier: int, content, deadline: Deadline):
+        """Async `_send()` on the chat's `send_message_async`."""
+        async def attempt():
+            async with model_scheduler.slot_async(deadline):
+                return await chat.send_message_async(content)
+        
+        model = self._router.tiers[tier]
+        with self._span("model.send_message", {"model": model, "async": True}):
+            started = time.perf_counter()
+            response = await MODEL_RETRY_POLICY.call_async(lambda timeout: attempt(), deadline)
+        self._router.record_call(model, time.perf_counter() - started, response, len(content) if isinstance(content, str) else 0)
+        return response
+    
+    def _generate(self, prompt: str, deadline: Deadline):
+        """One-shot structured-model call (slot, retries, cascade stats)."""
+        def attempt(timeout):
+            return model_scheduler.call(lambda: self._structured_model.generate_content(prompt), timeout, deadline)
+        
+        with self._span("model.generate_content", {"model": MODEL_NAME, "structured": True}):
+            started = time.perf_counter()
+            response = MODEL_RETRY_POLICY.call(attempt, deadline)
+        self._router.record_call(self._router.tiers[0], time.perf_counter() - started, response, len(prompt))
+        return response
+    
+    async def _generate_async(self, prompt: str, deadline: Deadline):
+        """Awaitable `_generate()`."""
+        async def attempt():
+            async with model_scheduler.slot_async(deadline):
+                return await self._structured_model.generate_content_async(prompt)
+        
+        with self._span("model.generate_content", {"model": MODEL_NAME, "structured": True, "async": True}):
+            started = time.perf_counter()
+            response = await MODEL_RETRY_POLICY.call_async(lambda timeout: attempt(), deadline)
+        self._router.record_call(self._router.tiers[0], time.perf_counter() - started, response, len(prompt))
+        return response
+    
+    def _structured_result(self, chat, message: str, response, budget: int, as_json: bool) -> str:
+        """Validate and render a structured response (recorded in history); None if unusable."""
+        picks = self._structured.finish(self._final_text(response), self.destinations, budget)
+        if picks is None:
+            return None
+        reply = structured.render(picks, budget)
+        self._record_turn(chat, message, reply)
+        return structured.as_json(picks, reply) if as_json else reply
+    
+    def _structured_reply(self, chat, message: str, user_id: str, deadline: Deadline, as_json: bool) -> str:
+        """Structured-mode reply, or None to use the normal tool loop."""
+        prepared = self._structured.prepare(message, user_id, self.destinations, self._profile)
+        if prepared is None:
+            return None
+        prompt, budget = prepared
+        try:
+            return self._structured_result(chat, message, self._generate(prompt, deadline), budget, as_json)
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            return None  # the tool loop can still answer
+    
+    async def _structured_reply_async(self, chat, message: str, user_id: str, deadline: Deadline, as_json: bool) -> str:
+        """Awaitable `_structured_reply()`."""
+        prepared = self._structured.prepare(message, user_id, self.destinations, self._profile)
+        if prepared is None:
+            return None
+        prompt, budget = prepared
+        try:
+            return self._structured_result(chat, message, await self._generate_async(prompt, deadline), budget, as_json)
+        except DeadlineExceeded:
+            raise
+        except Exception:
+            return None
+    
+    async def _handle_tool_call_async(self, function_call, speculation=None, deadline: Deadline = None):
+        """Run a tool call without blocking the loop.
+        
+        Catalog lookups are microseconds and run inline; calls heavy enough
+        for the process pool wait for it on a worker thread.
+        """
+        name = function_call.name
+        args = normalize_args(name, dict(function_call.args))
+        result = speculation.take(name, args, wait=False) if speculation is not None else None
+        if result is None:
+            if self._tool_executor is not None and name == "search_destinations":
+                result = await asyncio.to_thread(self._run_tool, name, args, deadline)
+            else:
+                result = self._run_tool(name, args, deadline)
         if name == "search_destinations":
-            max_budget = int(args.get("max_budget", 1000))
-            vibes_raw = args.get("vibes", [])
-            # Convert protobuf RepeatedComposite to Python list
-            vibes = list(vibes_raw) if vibes_raw else []
-            
-            # Filter destinations by budget
-            results = [d for d in self.destinations if d["price"] <= max_budget]
-            
-            # If vibes specified, prioritize matches
-            if vibes:
-                def vibe_score(dest):
-                    return sum(1 for v in vibes if v.lower() in [t.lower() for t in dest["tags"]])
-                results.sort(key=vibe_score, reverse=True)
-            
-            # Format results
-            if results:
-                formatted = [f"{d['city']} (${d['price']}): {', '.join(d['tags'])}" for d in results[:5]]
-                return f"Found {len(results)} destinations within ${max_budget} budget:\n" + "\n".join(formatted)
-            return "No destinations found within that budget."
+            catalog.search_stats.observe(self.destinations, args["vibes"], result)
+        return result
+    
+    def _handle_tool_call(self, function_call, speculation=None, deadline: Deadline = None):
+        """Execute a tool call (or serve its prefetched result) and return the result."""
+        name = function_call.name
+        # Convert protobuf containers (e.g. RepeatedComposite vibes) to Python types
+        args = normalize_args(name, dict(function_call.args))
+        result = speculation.take(name, args) if speculation is not None else None
+        if result is None:
+            result = self._run_tool(name, args, deadline)
+        if name == "search_destinations":
+            catalog.search_stats.observe(self.destinations, args["vibes"], result)
+        return result
+    
+    def _run_tool(self, name: str, args: dict, deadline: Deadline = None) -> str:
+        """Execute a tool with normalized arguments (pooled calls wait at most until the deadline)."""
+        if name == "search_destinations":
+            if self._tool_executor is not None:
+                try:
+                    return self._tool_executor.run(name, args, timeout=deadline.remaining() if deadline else None)
+                except TimeoutError:
+                    raise DeadlineExceeded(f"Tool {name} did not finish before the deadline") from None
+            return catalog.search_destinations(self.destinations, args["max_budget"], args["vibes"], args.get("cursor"),
+                                              date_from=args.get("date_from"), date_to=args.get("date_to"))
         
         elif name == "get_user_profile":
-            user_id = args.get("user_id", "")
+            user_id = args["user_id"]
             if user_id in self.user_data:
                 user = self.user_data[user_id]
                 zodiac = self._get_zodiac_sign(user["dob"])
@@ -217,6 +535,43 @@ class ZodiacTravelAgent:
         
         return f"Unknown tool: {name}"
     
+    def _parse_request(self, input: dict, message: str, user_id: str, session_id: str, kwargs: dict) -> tuple:
+        """Normalize query()/async_query() arguments.
+        
+        Returns:
+            (immediate_reply, message, user_id, session_key, deadline, traceparent,
+            priority, response_format); when immediate_reply is not None it is the
+            whole answer.
+        """
+        # Handle wrapped input from Agent Engine
+        if input is not None:
+            # Agent Engine only exposes query(), so diagnostics ride on it (opt-in)
+            if input.get("diagnostics") == "memory" and memory_diag.ENABLED:
+                return json.dumps(self.memory_report(), default=str), None, None, None, None, None, None, None
+            if input.get("diagnostics") == "metrics":
+                return json.dumps(self.metrics(), default=str), None, None, None, None, None, None, None
+            message = input.get("message", "")
+            user_id = input.get("user_id")
+            session_id = input.get("session_id", session_id)
+            # input may also contain history; each session's chat keeps its own
+            kwargs = input
+        
+        if not message:
+            return "✨ Please tell me about your travel dreams!", None, None, None, None, None, None, None
+        
+        # Never outlive the caller's remaining budget
+        deadline_ms = kwargs.get("deadline_ms")
+        deadline = Deadline(deadline_ms / 1000.0 if deadline_ms else DEFAULT_QUERY_DEADLINE_SECONDS)
+        # Join the caller's trace (backend /chat) when it sent a traceparent;
+        # batch jobs pass priority="batch" so they only use spare model slots
+        response_format = kwargs.get("response_format", DEFAULT_RESPONSE_FORMAT)
+        if response_format not in structured.RESPONSE_FORMATS:
+            response_format = "markdown"
+        # Callers that do not name a session get one conversation per user
+        session_key = session_id if session_id and session_id != "default" else user_id or "default"
+        return (None, message, user_id, session_key, deadline, kwargs.get("traceparent"),
+                kwargs.get("priority", "interactive"), response_format)
+    
     def query(self, *, input: dict = None, message: str = None, user_id: str = None, session_id: str = "default", **kwargs) -> str:
         """Query the travel agent.
         
@@ -224,81 +579,275 @@ class ZodiacTravelAgent:
         - Direct args: query(message="...", user_id="...")
         - Wrapped format from Agent Engine: query(input={"message": "...", "user_id": "..."})
         
+        Optional `response_format`: "markdown" (default), "structured" (picks from a
+        schema-constrained call, rendered as usual) or "json" (the validated picks).
+        
+        Each `session_id` (default: the user_id) has its own chat; turns of one
+        session run one at a time, turns of different sessions concurrently.
+        
         Returns:
             Agent's response text
         """
-        # Handle wrapped input from Agent Engine
-        if input is not None:
-            message = input.get("message", "")
-            user_id = input.get("user_id")
-            # input may also contain history which we can use for context
-            history = input.get("history", [])
-            # Prepend history context if available
-            if history and len(history) > 0:
-                # Get the last user message from history if message is wrapped
-                pass  # message already extracted
+        reply, message, user_id, session_key, deadline, traceparent, priority, response_format = \
+            self._parse_request(input, message, user_id, session_id, kwargs)
+        if reply is not None:
+            return reply
+        with self._span("agent.query", {"user_id": user_id or "", "priority": priority}, traceparent=traceparent), \
+                scheduling(priority, tenant=user_id), self._conversation(session_key).turn() as chat:
+            return self._answer(chat, message, user_id, deadline, response_format)
+    
+    async def async_query(self, *, input: dict = None, message: str = None, user_id: str = None, session_id: str = "default", **kwargs) -> str:
+        """Async `query()`: same arguments and replies, built on `send_message_async`.
         
-        if not message:
-            return "✨ Please tell me about your travel dreams!"
+        Model calls, retries and backoff are awaited, so one event loop can
+        carry many in-flight conversations without a thread per request.
+        """
+        reply, message, user_id, session_key, deadline, traceparent, priority, response_format = \
+            self._parse_request(input, message, user_id, session_id, kwargs)
+        if reply is not None:
+            return reply
+        with self._span("agent.query", {"user_id": user_id or "", "priority": priority, "async": True}, traceparent=traceparent), \
+                scheduling(priority, tenant=user_id):
+            async with self._conversation(session_key).turn_async() as chat:
+                return await self._answer_async(chat, message, user_id, deadline, response_format)
+    
+    def _local_reply(self, chat, message: str, user_id: str) -> str:
+        """Fast-path reply for fully specified turns (recorded in history), else None."""
+        if not FAST_PATH_ENABLED:
+            return None
+        with self._span("fast_path") as span:
+            reply = self._fast_path.try_answer(message, user_id, self.destinations, self._profile)
+            span.set_attribute("hit", reply is not None)
+        if reply is not None:
+            self._record_turn(chat, message, reply)
+        return reply
+    
+    def _start_speculation(self, message: str, user_id: str, deadline: Deadline = None):
+        """Prefetch the tool calls this turn will probably make (None when disabled)."""
+        if not SPECULATION_ENABLED:
+            return None
+        with self._span("speculation.start") as span:
+            speculation = self._speculator.start(
+                message, user_id, self.destinations, lambda name, args: self._run_tool(name, args, deadline),
+            )
+            span.set_attribute("calls", len(speculation))
+        return speculation
+    
+    def _prompt(self, message: str, user_id: str) -> str:
+        """Prefix the message with the user's profile context, if known."""
+        profile = self._profile(user_id)
+        if not profile:
+            return message
+        name, zodiac, traits = profile
+        return f"[CONTEXT: User is {name}, a {zodiac}. Traits: {traits}]\n\n" + message
+    
+    @staticmethod
+    def _function_call(response):
+        """The function call requested by a model response, or None."""
+        parts = response.candidates[0].content.parts
+        part = parts[0] if parts else None
+        return getattr(part, "function_call", None) or None
+    
+    @staticmethod
+    def _final_text(response) -> str:
+        if response.candidates and response.candidates[0].content.parts:
+            final_text = response.candidates[0].content.parts[0].text
+            return final_text if final_text else "✨ The cosmos have spoken, but silently..."
+        return "✨ The stars are aligning..."
+    
+    def _chat_for(self, chat, tier: int):
+        """Chat for a model tier. Tier 0's chat is the session's conversation of
+        record; a larger model starts from a copy of its history."""
+        if tier == 0:
+            return chat
+        return self._models[tier].start_chat(history=list(chat.history))
+    
+    def _review(self, text: str, tier: int, response=None, error: Exception = None) -> bool:
+        """True if the reply is final; False if the turn should move to the next tier."""
+        if isinstance(error, DeadlineExceeded) or not self._router.can_escalate(tier):
+            if error is not None:
+                raise error
+            self._router.record_turn(tier)
+            return True
+        problem = "error" if error is not None else validate_reply(text, self._final_text(response), avg_logprob(response))
+        if problem is None:
+            self._router.record_turn(tier)
+            return True
+        self._router.record_escalation(tier, problem)
+        return False
+    
+    def _converse(self, chat, tier: int, message: str, user_id: str, deadline: Deadline, speculation):
+        """One model's attempt at a turn: prompt, then the tool-calling loop. Returns the final response."""
+        response = self._send(chat, tier, self._prompt(message, user_id), deadline)
         
-        self._initialize_model()
+        # Function calling loop (bounded to prevent infinite loops)
+        for iteration in range(MAX_TOOL_ITERATIONS):
+            function_call = self._function_call(response)
+            if function_call is None:
+                break
+            
+            with self._span(f"tool.{function_call.name}", {"iteration": iteration}):
+                tool_result = self._handle_tool_call(function_call, speculation, deadline)
+            
+            # Send tool result back to the model
+            response = self._send(
+                chat, tier,
+                self._function_response(name=function_call.name, response={"result": tool_result}),
+                deadline,
+            )
+        return response
+    
+    async def _converse_async(self, chat, tier: int, message: str, user_id: str, deadline: Deadline, speculation):
+        """Awaitable `_converse()`."""
+        response = await self._send_async(chat, tier, self._prompt(message, user_id), deadline)
         
-        # Build context if user_id provided
-        context = ""
-        if user_id and user_id in self.user_data:
-            user = self.user_data[user_id]
-            zodiac = self._get_zodiac_sign(user["dob"])
-            traits = self.zodiac_traits.get(zodiac, "")
-            context = f"[CONTEXT: User is {user['name']}, a {zodiac}. Traits: {traits}]\n\n"
+        for iteration in range(MAX_TOOL_ITERATIONS):
+            function_call = self._function_call(response)
+            if function_call is None:
+                break
+            
+            with self._span(f"tool.{function_call.name}", {"iteration": iteration}):
+                tool_result = await self._handle_tool_call_async(function_call, speculation, deadline)
+            
+            response = await self._send_async(
+                chat, tier,
+                self._function_response(name=function_call.name, response={"result": tool_result}),
+                deadline,
+            )
+        return response
+    
+    def _answer(self, session_chat, message: str, user_id: str, deadline: Deadline, response_format: str = "markdown") -> str:
+        """Answer one turn: fast path, structured picks, else the model cascade with its tool-calling loop.
+        
+        The caller holds the session's turn lock, so nothing else touches
+        `session_chat` until this returns.
+        """
+        self._initialize_model()
         
-        full_message = context + message
+        # Fully specified turns are answered from the catalog without a model call
+        reply = self._local_reply(session_chat, message, user_id) if response_format != "json" else None
+        if reply is not None:
+            return reply
         
+        text = user_text(message)
+        tier = self._router.choose(text)
+        # Likely tool calls run while the first model request is in flight
+        speculation = self._start_speculation(message, user_id, deadline) if response_format == "markdown" else None
         try:
-            from vertexai.generative_models import Part
-            
-            response = self._chat.send_message(full_message)
+            if response_format != "markdown":
+                reply = self._structured_reply(session_chat, message, user_id, deadline, as_json=response_format == "json")
+                if reply is not None:
+                    return reply
+            while True:
+                chat = self._chat_for(session_chat, tier)
+                mark = len(chat.history)
+                response, error = None, None
+                try:
+                    response = self._converse(chat, tier, message, user_id, deadline, speculation)
+                except Exception as e:
+                    error = e
+                if self._review(text, tier, response, error):
+                    break
+                if tier == 0:
+                    # The rejected attempt leaves no trace; only this turn has
+                    # appended since `mark`, as the caller holds the session lock
+                    del chat.history[mark:]
+                tier += 1
             
-            # Function calling loop - handle tool calls
-            max_iterations = 5  # Prevent infinite loops
-            iteration = 0
+            reply = self._final_text(response)
+            if tier > 0:
+                self._record_turn(session_chat, message, reply)
+            # JSON callers always get the same envelope, with no picks when the model answered freely
+            return structured.as_json([], reply) if response_format == "json" else reply
             
-            while response.candidates[0].content.parts and iteration < max_iterations:
-                part = response.candidates[0].content.parts[0]
-                
-                # Check if this is a function call
-                if hasattr(part, 'function_call') and part.function_call:
-                    function_call = part.function_call
-                    
-                    # Execute the tool
-                    tool_result = self._handle_tool_call(function_call)
-                    
-                    # Send tool result back to the model
-                    response = self._chat.send_message(
-                        Part.from_function_response(
-                            name=function_call.name,
-                            response={"result": tool_result}
-                        )
-                    )
-                    iteration += 1
-                else:
-                    # No function call, we have the final response
+        except Exception as e:
+            return f"✨ The stars are cloudy... Error: {str(e)}"
+        finally:
+            if speculation is not None:
+                speculation.discard()
+    
+    async def _answer_async(self, session_chat, message: str, user_id: str, deadline: Deadline, response_format: str = "markdown") -> str:
+        """Awaitable `_answer()`; the caller holds the session's turn lock."""
+        self._initialize_model()
+        
+        reply = self._local_reply(session_chat, message, user_id) if response_format != "json" else None
+        if reply is not None:
+            return reply
+        
+        text = user_text(message)
+        tier = self._router.choose(text)
+        speculation = self._start_speculation(message, user_id, deadline) if response_format == "markdown" else None
+        try:
+            if response_format != "markdown":
+                reply = await self._structured_reply_async(session_chat, message, user_id, deadline, as_json=response_format == "json")
+                if reply is not None:
+                    return reply
+            while True:
+                chat = self._chat_for(session_chat, tier)
+                mark = len(chat.history)
+                response, error = None, None
+                try:
+                    response = await self._converse_async(chat, tier, message, user_id, deadline, speculation)
+                except Exception as e:
+                    error = e
+                if self._review(text, tier, response, error):
                     break
+                if tier == 0:
+                    del chat.history[mark:]  # safe: the caller holds the session lock
+                tier += 1
             
-            # Extract text from final response
-            if response.candidates and response.candidates[0].content.parts:
-                final_text = response.candidates[0].content.parts[0].text
-                return final_text if final_text else "✨ The cosmos have spoken, but silently..."
-            
-            return "✨ The stars are aligning..."
+            reply = self._final_text(response)
+            if tier > 0:
+                self._record_turn(session_chat, message, reply)
+            # JSON callers always get the same envelope, with no picks when the model answered freely
+            return structured.as_json([], reply) if response_format == "json" else reply
             
         except Exception as e:
             return f"✨ The stars are cloudy... Error: {str(e)}"
+        finally:
+            if speculation is not None:
+                speculation.discard()
+
+def build_agent(thin: bool = False) -> tuple:
+    """Build the agent to deploy and the extra files it needs.
+    
+    Args:
+        thin: Ship only a thin loader; the catalog goes in a compressed artifact
+    
+    Returns:
+        (agent, extra_packages)
+    """
+    extra_packages = ["catalog.py", "tool_executor.py", "retry_policy.py", "fast_path.py", "tracing.py", "memory_diag.py", "speculation.py", "scheduler.py", "model_router.py", "structured.py"]
+    if not thin:
+        return ZodiacTravelAgent(), extra_packages
+    
+    info = catalog.write_artifact(catalog.ARTIFACT_NAME)
+    print(f"📦 Catalog artifact {info['path']}: v{info['version']}, {info['compressed_bytes']} bytes (sha256 {info['sha256'][:12]})")
+    return ZodiacTravelAgent(catalog_artifact=catalog.ARTIFACT_NAME), extra_packages + [catalog.ARTIFACT_NAME]
+
+
+def measure_payload(agent, repeats: int = 20) -> dict:
+    """Measure the cloudpickled size and unpickle time of an agent."""
+    import cloudpickle
+    
+    payload = cloudpickle.dumps(agent)
+    started = time.perf_counter()
+    for _ in range(repeats):
+        cloudpickle.loads(payload)
+    return {
+        "pickle_bytes": len(payload),
+        "unpickle_ms": (time.perf_counter() - started) * 1000 / repeats,
+    }
 
 
-def deploy():
+def deploy(thin: bool = False):
     """Deploy the agent to Vertex AI Agent Engine."""
     print(f"🚀 Deploying Zodiac Travel Agent to {LOCATION}...")
     
+    agent_obj, extra_packages = build_agent(thin)
+    stats = measure_payload(agent_obj)
+    print(f"📏 Payload: {stats['pickle_bytes']} bytes, unpickle {stats['unpickle_ms']:.2f} ms")
+    
     # Initialize Vertex AI with staging bucket
     vertexai.init(
         project=PROJECT_ID,
@@ -308,13 +857,14 @@ def deploy():
     
     # Create the ReasoningEngine with explicit method exposure
     agent = reasoning_engines.ReasoningEngine.create(
-        ZodiacTravelAgent(),
+        agent_obj,
         display_name=DISPLAY_NAME,
         description="A zodiac-based travel recommendation agent",
         requirements=[
             "google-cloud-aiplatform[reasoningengine]",
             "vertexai",
         ],
+        extra_packages=extra_packages,
     )
     
     print(f"\n✅ SUCCESS! Agent deployed:")
@@ -329,4 +879,11 @@ def deploy():
 
 
 if __name__ == "__main__":
-    deploy()
+    import sys
+    
+    if "--measure" in sys.argv:
+        for label, thin in [("full", False), ("thin", True)]:
+            stats = measure_payload(build_agent(thin)[0])
+            print(f"{label:>5}: {stats['pickle_bytes']:>7} bytes, unpickle {stats['unpickle_ms']:.3f} ms")
+    else:
+        deploy(thin="--thin" in sys.argv)
@@ -0,0 +1,166 @@
+"""
+Local Fake Model
+================
+
+Stand-in for `vertexai.generative_models.GenerativeModel` that mimics the
+function-calling flow of the real model without any network or credentials:
+
+1. A user turn that mentions a user_XXX id (and no profile fetched yet)
+   → calls get_user_profile
+2. A user turn with a budget → calls search_destinations
+3. Otherwise (or after the tool results) → a short text recommendation
+
+`generate_content` answers structured-mode prompts (CANDIDATES_JSON) with a
+JSON array of picks, as the schema-constrained model would.
+
+Latency is simulated per call (`latency_ms` ± `jitter_ms`) so load tests see
+realistic concurrency. Plug it into the agent with:
+
+    agent.use_model(FakeGenerativeModel(latency_ms=300))
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+_USER_ID_RE = re.compile(r"\buser_\d{3}\b")
+_CANDIDATES_RE = re.compile(r"^CANDIDATES_JSON: (.*)$", re.MULTILINE)
+_BUDGET_RE = re.compile(r"\$\s?(\d[\d,]*)|\b(\d{2,5})\s?(?:usd|dollars?|bucks)\b", re.IGNORECASE)
+_VIBE_WORDS = ("romantic", "sun", "party", "city", "nature", "spiritual", "luxury", "budget",
+               "history", "foodie", "art", "water", "beach", "adventure")
+
+
+class FakeFunctionCall:
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+
+class FakePart:
+    def __init__(self, text: str = None, function_call: FakeFunctionCall = None, function_response: dict = None):
+        self.text = text
+        self.function_call = function_call
+        self.function_response = function_response
+
+
+class FakeContent:
+    def __init__(self, role: str, parts: list):
+        self.role = role
+        self.parts = parts
+
+
+class FakeCandidate:
+    def __init__(self, content: FakeContent):
+        self.content = content
+
+
+class FakeResponse:
+    def __init__(self, part: FakePart):
+        self.candidates = [FakeCandidate(FakeContent("model", [part]))]
+
+    @property
+    def text(self):
+        return self.candidates[0].content.parts[0].text
+
+
+class FakeChatSession:
+    """Chat session with history, like vertexai's ChatSession."""
+
+    def __init__(self, model):
+        self._model = model
+        self.history = []
+        self._lock = threading.Lock()
+        self._profile_seen = False
+        self._pending_search = None
+
+    def send_message(self, content, **kwargs):
+        time.sleep(self._model.delay())
+        return self._respond(content)
+
+    async def send_message_async(self, content, **kwargs):
+        await asyncio.sleep(self._model.delay())
+        return self._respond(content)
+
+    def _respond(self, content) -> FakeResponse:
+        part = content if isinstance(content, FakePart) else FakePart(text=str(content))
+        with self._lock:
+            self.history.append(FakeContent("user", [part]))
+            reply = self._next(part)
+            self.history.append(FakeContent("model", [reply]))
+            self._model.calls += 1
+        return FakeResponse(reply)
+
+    def _next(self, part: FakePart) -> FakePart:
+        if part.function_response is not None:
+            name = part.function_response["name"]
+            result = str(part.function_response["response"].get("result", ""))
+            if name == "get_user_profile" and self._pending_search:
+                args, self._pending_search = self._pending_search, None
+                return FakePart(function_call=FakeFunctionCall("search_destinations", args))
+            first = result.splitlines()[1] if "\n" in result else result
+            return FakePart(text=f"✨ **{first.split(' (')[0]}** — the stars say yes! {self._model.filler}")
+
+        text = part.text or ""
+        budget = _BUDGET_RE.search(text)
+        search_args = None
+        if budget:
+            amount = int((budget.group(1) or budget.group(2)).replace(",", ""))
+            vibes = [w.capitalize() for w in _VIBE_WORDS if w in text.lower()]
+            search_args = {"max_budget": amount, "vibes": vibes}
+
+        user = _USER_ID_RE.search(text)
+        if user and not self._profile_seen:
+            self._profile_seen = True
+            self._pending_search = search_args
+            return FakePart(function_call=FakeFunctionCall("get_user_profile", {"user_id": user.group(0)}))
+        if search_args:
+            return FakePart(function_call=FakeFunctionCall("search_destinations", search_args))
+        return FakePart(text=f"🔮 Tell me your budget and vibe and I'll consult the stars! {self._model.filler}")
+
+
+class FakeGenerativeModel:
+    """Drop-in fake for GenerativeModel (start_chat / generate_content)."""
+
+    def __init__(self, model_name: str = "fake-model", latency_ms: float = 200.0, jitter_ms: float = 50.0,
+                 filler_chars: int = 200, seed: int = None):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.filler = "🌌" + "✨" * max(0, filler_chars - 1)
+        self.calls = 0
+        self._rng = random.Random(seed)
+
+    def delay(self) -> float:
+        """Simulated latency of one call, in seconds."""
+        return max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0
+
+    def start_chat(self, history: list = None):
+        chat = FakeChatSession(self)
+        chat.history.extend(history or [])
+        return chat
+
+    def generate_content(self, contents, **kwargs):
+        time.sleep(self.delay())
+        return self._generate(contents)
+
+    async def generate_content_async(self, contents, **kwargs):
+        await asyncio.sleep(self.delay())
+        return self._generate(contents)
+
+    def _generate(self, contents) -> FakeResponse:
+        self.calls += 1
+        match = _CANDIDATES_RE.search(contents if isinstance(contents, str) else "")
+        if match is None:
+            return FakeResponse(FakePart(text="✨"))
+        # Structured prompt: pick the first candidates, like a schema-constrained model
+        picks = [{"city": c["city"], "price": c["price"], "reason": f"{c['tags'][0].lower()} energy for your stars."}
+                 for c in json.loads(match.group(1))[:2]]
+        return FakeResponse(FakePart(text=json.dumps(picks)))
+
+    @staticmethod
+    def function_response(name: str, response: dict) -> FakePart:
+        """Counterpart of Part.from_function_response."""
+        return FakePart(function_response={"name": name, "response": response})
@@ -0,0 +1,135 @@
+"""
+Deterministic Fast Path
+=======================
+
+Rule-based intent parser that answers fully specified recommendation turns
+("$300, romantic, user_001") straight from the catalog and zodiac traits,
+with no model call. Anything ambiguous returns None and goes to the model.
+
+A turn is fully specified when it has a budget, at least one vibe that is a
+catalog tag, and a known user, and it is not a question or an itinerary or
+follow-up request. The reply uses the agent's response format:
+
+    ✨ **[City]** ($[Price]) — [why it matches the user's traits]
+"""
+
+import re
+import threading
+
+import catalog
+
+# The backend wraps the user's text in instructions; only the text counts
+_USER_MESSAGE_RE = re.compile(r"User Message:\s*(.*)\Z", re.DOTALL)
+_USER_ID_RE = re.compile(r"\buser_\d{3}\b")
+_BUDGET_RES = (
+    re.compile(r"\$\s?(\d[\d,]*)"),
+    re.compile(r"\b(\d[\d,]*)\s?(?:usd|dollars?|bucks)\b", re.IGNORECASE),
+    re.compile(r"\bbudget\s+(?:of|is|around|about)?\s*(\d[\d,]*)\b", re.IGNORECASE),
+)
+_WORD_RE = re.compile(r"[a-z][a-z\-]*")
+# Turns that need conversation, reasoning or detail go to the model
+_NEEDS_MODEL_RE = re.compile(
+    r"\?|\b(itinerary|itineraries|plan|day\s*\d|tell me|more about|compare|why|how|what|which|"
+    r"instead|else|other|cheaper|not)\b",
+    re.IGNORECASE,
+)
+
+MAX_RECOMMENDATIONS = 3
+
+
+def user_text(message: str) -> str:
+    """Strip the backend's instruction wrapper, if any."""
+    match = _USER_MESSAGE_RE.search(message or "")
+    return (match.group(1) if match else message or "").strip()
+
+
+def parse_budget(text: str) -> int:
+    for pattern in _BUDGET_RES:
+        match = pattern.search(text)
+        if match:
+            return int(match.group(1).replace(",", ""))
+    return None
+
+
+def parse_vibes(text: str, known_tags: dict) -> list:
+    """Catalog tags mentioned in the text (whole words, plural-tolerant), in order."""
+    vibes = []
+    for word in _WORD_RE.findall(text.lower()):
+        tag = known_tags.get(word) or (known_tags.get(word[:-1]) if word.endswith("s") else None)
+        if tag and tag not in vibes:
+            vibes.append(tag)
+    return vibes
+
+
+class FastPath:
+    """Answers fully specified turns locally and tracks the hit rate."""
+
+    def __init__(self):
+        self.stats = {"attempts": 0, "hits": 0}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def hit_rate(self) -> float:
+        return self.stats["hits"] / self.stats["attempts"] if self.stats["attempts"] else 0.0
+
+    def try_answer(self, message: str, user_id: str, destinations: list, profile_lookup) -> str:
+        """Render a reply without the model, or return None to fall back.
+
+        Args:
+            message: Raw query message (may include the backend's wrapper)
+            user_id: Caller's user id (a user_XXX in the text takes precedence)
+            destinations: Catalog rows
+            profile_lookup: user_id -> (name, sign, traits) or None
+
+        Returns:
+            The reply text, or None when the model is needed.
+        """
+        with self._lock:
+            self.stats["attempts"] += 1
+
+        text = user_text(message)
+        if not text or _NEEDS_MODEL_RE.search(text):
+            return None
+
+        match = _USER_ID_RE.search(text)
+        profile = profile_lookup(match.group(0) if match else user_id)
+        budget = parse_budget(text)
+        known_tags = {t.lower(): t for d in destinations for t in d["tags"]}
+        vibes = parse_vibes(text, known_tags)
+        if profile is None or budget is None or not vibes:
+            return None
+
+        ranked = [(score, d) for score, d in catalog.rank_destinations(destinations, budget, vibes) if score > 0]
+        if not ranked:
+            return None
+
+        _, sign, traits = profile
+        reply = render(ranked[:MAX_RECOMMENDATIONS], vibes, traits, budget)
+        with self._lock:
+            self.stats["hits"] += 1
+        return reply
+
+
+def render(ranked: list, vibes: list, traits: str, budget: int) -> str:
+    """Render recommendations in the agent's `✨ **[City]** ($[Price]) — ...` format."""
+    spirit = ", ".join(t.strip().lower() for t in traits.split(",")[:2]) if traits else "star-guided"
+    wanted = {v.lower() for v in vibes}
+    lines = [f"🔮 The stars have spoken — your cosmic matches under ${budget}:", ""]
+    for _, dest in ranked:
+        matched = [t.lower() for t in dest["tags"] if t.lower() in wanted]
+        extra = [t.lower() for t in dest["tags"] if t.lower() not in wanted][:1]
+        dash = f", with a dash of {extra[0]}" if extra else ""
+        lines.append(
+            f"✨ **{dest['city']}** (${dest['price']}) — your {spirit} spirit will glow amid "
+            f"{dest['city']}'s {' and '.join(matched)} vibes{dash}."
+        )
+    lines += ["", "Which of these orbits calls to you? 🌠"]
+    return "\n".join(lines)
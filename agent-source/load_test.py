@@ -0,0 +1,358 @@
+"""
+Load-Test Scenario Runner
+=========================
+
+Replays multi-turn conversations against the backend's /chat endpoint or
+directly against `ZodiacTravelAgent.query` (in-process, with the local fake
+model, so no credentials or quota are needed).
+
+- Open-loop arrivals: new sessions start as a Poisson process (`--rate`
+  sessions/s), whether or not earlier sessions have finished
+- Think time between turns (per turn from the scenario, else exponential
+  with mean `--think-time`)
+- Concurrency ramp: the cap on live sessions grows linearly from 1 to
+  `--max-sessions` over `--ramp` seconds; arrivals over the cap are dropped
+  and counted
+
+The report has throughput, latency percentiles, error rate, and memory
+(traced Python heap and RSS) sampled against the number of sessions started.
+Memory is measured in this process, so it is only meaningful for
+`--target agent`.
+
+Scenario file (JSONL, one conversation per line):
+    {"user_id": "user_001", "turns": [{"message": "Romantic trip under $400", "think_time": 2.0}, ...]}
+
+Recorded traffic can be replayed from the backend's conversation log
+(ZODIAC_CONVERSATION_LOG_DIR): each logged session becomes a scenario with
+its original messages and think times.
+
+Usage:
+    python load_test.py --target agent --rate 5 --duration 60
+    python load_test.py --target agent --async-agent --rate 200 --max-sessions 1000
+    python load_test.py --target http://localhost:8000 --scenarios convos.jsonl
+    python load_test.py --write-sample convos.jsonl --sessions 50
+    python load_test.py --replay-logs /var/log/zodiac --target http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import catalog
+import conversation_log
+from memory_diag import rss_bytes
+
+_SAMPLE_OPENERS = [
+    "Hi! I'm {user_id}. I want a {vibe} trip under ${budget}.",
+    "{vibe} getaway for about ${budget}, I'm {user_id}",
+    "Hello, looking for somewhere {vibe}",
+]
+_SAMPLE_FOLLOW_UPS = [
+    "Something cheaper?",
+    "Tell me more about the first one",
+    "Can you plan a 3 day itinerary?",
+    "What about {vibe} instead, under ${budget}?",
+    "Thanks!",
+]
+
+
+# --- Scenarios ---
+def load_scenarios(path: str) -> list:
+    """Read conversations from a JSONL file (blank lines and bad rows are skipped)."""
+    scenarios = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                scenario = json.loads(line)
+            except ValueError:
+                continue
+            if scenario.get("turns"):
+                scenarios.append(scenario)
+    return scenarios
+
+
+def synthesize_scenarios(count: int, seed: int = 0) -> list:
+    """Generate `count` plausible conversations from the catalog's users and tags."""
+    rng = random.Random(seed)
+    users = sorted(catalog.DEFAULT_USER_DATA)
+    tags = sorted({t for d in catalog.DEFAULT_DESTINATIONS for t in d["tags"]})
+    scenarios = []
+    for _ in range(count):
+        fill = {"user_id": rng.choice(users), "vibe": rng.choice(tags).lower(), "budget": rng.choice([200, 300, 500, 800, 1200])}
+        turns = [{"message": rng.choice(_SAMPLE_OPENERS).format(**fill)}]
+        for _ in range(rng.randint(0, 3)):
+            fill.update(vibe=rng.choice(tags).lower(), budget=rng.choice([200, 300, 500, 800]))
+            turns.append({"message": rng.choice(_SAMPLE_FOLLOW_UPS).format(**fill)})
+        scenarios.append({"user_id": fill["user_id"], "turns": turns})
+    return scenarios
+
+
+# --- Targets ---
+class AgentTarget:
+    """One in-process ZodiacTravelAgent (like one Agent Engine replica) on the fake model."""
+
+    def __init__(self, latency_ms: float = 200.0, jitter_ms: float = 50.0, seed: int = 0, use_async: bool = False):
+        from deploy_sdk import ZodiacTravelAgent
+        from fake_model import FakeGenerativeModel
+
+        self.agent = ZodiacTravelAgent()
+        self.agent.use_model(FakeGenerativeModel(latency_ms=latency_ms, jitter_ms=jitter_ms, seed=seed))
+        # Drive async_query on the event loop instead of query on a thread pool
+        self.use_async = use_async
+
+    @staticmethod
+    def _check(reply: str) -> str:
+        if reply.startswith("✨ The stars are cloudy"):
+            raise RuntimeError(reply)
+        return reply
+
+    def send(self, user_id: str, message: str, history: list) -> str:
+        return self._check(self.agent.query(input={"message": message, "user_id": user_id, "history": history}))
+
+    async def send_async(self, user_id: str, message: str, history: list) -> str:
+        return self._check(await self.agent.async_query(input={"message": message, "user_id": user_id, "history": history}))
+
+
+class HttpTarget:
+    """The backend's POST /chat."""
+
+    def __init__(self, base_url: str, timeout: float = 60.0):
+        self.url = base_url.rstrip("/") + ("" if base_url.rstrip("/").endswith("/chat") else "/chat")
+        self.timeout = timeout
+
+    def send(self, user_id: str, message: str, history: list) -> str:
+        import urllib.request
+
+        body = json.dumps({"user_id": user_id, "message": message, "history": history}).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            data = json.loads(response.read())
+        if data.get("session_id") == "error":
+            raise RuntimeError(data.get("response", "backend error"))
+        return data["response"]
+
+
+# --- Measurement ---
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def _slope(points: list) -> float:
+    """Least-squares slope of y over x for [(x, y), ...]."""
+    if len(points) < 2:
+        return 0.0
+    n = len(points)
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+
+class LoadTest:
+    """Open-loop session generator plus per-turn and memory bookkeeping."""
+
+    def __init__(self, target, scenarios: list, rate: float, duration: float, max_sessions: int = 50,
+                 ramp: float = 0.0, think_time: float = 1.0, seed: int = 0):
+        self.target = target
+        self.scenarios = scenarios
+        self.rate = rate
+        self.duration = duration
+        self.max_sessions = max_sessions
+        self.ramp = ramp
+        self.think_time = think_time
+        self.rng = random.Random(seed)
+        self.latencies = []
+        self.errors = {}
+        self.turns = 0
+        self.sessions_started = 0
+        self.sessions_dropped = 0
+        self.active = 0
+        self.memory_samples = []
+        self._lock = threading.Lock()
+        self._started = 0.0
+
+    def session_cap(self, elapsed: float) -> int:
+        if self.ramp <= 0 or elapsed >= self.ramp:
+            return self.max_sessions
+        return max(1, int(self.max_sessions * elapsed / self.ramp))
+
+    async def _session(self, loop, pool, scenario: dict) -> None:
+        history = []
+        user_id = scenario.get("user_id", "user_001")
+        try:
+            for i, turn in enumerate(scenario["turns"]):
+                if i > 0:
+                    pause = turn.get("think_time")
+                    if pause is None:
+                        pause = self.rng.expovariate(1.0 / self.think_time) if self.think_time > 0 else 0.0
+                    await asyncio.sleep(pause)
+                started = time.perf_counter()
+                try:
+                    if getattr(self.target, "use_async", False):
+                        reply = await self.target.send_async(user_id, turn["message"], list(history))
+                    else:
+                        reply = await loop.run_in_executor(pool, self.target.send, user_id, turn["message"], list(history))
+                except Exception as e:
+                    with self._lock:
+                        self.turns += 1
+                        self.errors[type(e).__name__] = self.errors.get(type(e).__name__, 0) + 1
+                    return  # a broken conversation does not continue
+                with self._lock:
+                    self.turns += 1
+                    self.latencies.append(time.perf_counter() - started)
+                history += [{"role": "user", "content": turn["message"]}, {"role": "assistant", "content": reply}]
+        finally:
+            self.active -= 1
+
+    async def _sample_memory(self, every: float = 0.5) -> None:
+        while True:
+            self._record_memory()
+            await asyncio.sleep(every)
+
+    def _record_memory(self) -> None:
+        traced, _ = tracemalloc.get_traced_memory()
+        self.memory_samples.append({
+            "elapsed_s": round(time.perf_counter() - self._started, 2),
+            "sessions_started": self.sessions_started,
+            "active_sessions": self.active,
+            "traced_bytes": traced,
+            "rss_bytes": rss_bytes(),
+        })
+
+    async def run(self) -> dict:
+        loop = asyncio.get_running_loop()
+        pool = ThreadPoolExecutor(max_workers=self.max_sessions)
+        tracemalloc.start()
+        self._started = time.perf_counter()
+        sampler = asyncio.create_task(self._sample_memory())
+        tasks = []
+        try:
+            while True:
+                await asyncio.sleep(self.rng.expovariate(self.rate))
+                elapsed = time.perf_counter() - self._started
+                if elapsed >= self.duration:
+                    break
+                if self.active >= self.session_cap(elapsed):
+                    self.sessions_dropped += 1
+                    continue
+                self.active += 1
+                self.sessions_started += 1
+                scenario = self.scenarios[(self.sessions_started - 1) % len(self.scenarios)]
+                tasks.append(asyncio.create_task(self._session(loop, pool, scenario)))
+            await asyncio.gather(*tasks)
+        finally:
+            sampler.cancel()
+            self._record_memory()
+            tracemalloc.stop()
+            pool.shutdown(wait=False)
+        return self.report(time.perf_counter() - self._started)
+
+    def report(self, wall_seconds: float) -> dict:
+        errors = sum(self.errors.values())
+        ms = [s * 1000 for s in self.latencies]
+        points = [(s["sessions_started"], s["traced_bytes"]) for s in self.memory_samples]
+        # Memory at each tenth of the sessions started, for a growth table
+        milestones = []
+        step = max(1, self.sessions_started // 10)
+        for sample in self.memory_samples:
+            if not milestones or sample["sessions_started"] >= milestones[-1]["sessions_started"] + step:
+                milestones.append(sample)
+        return {
+            "wall_seconds": round(wall_seconds, 2),
+            "sessions_started": self.sessions_started,
+            "sessions_dropped": self.sessions_dropped,
+            "turns": self.turns,
+            "throughput_turns_per_s": round(self.turns / wall_seconds, 2) if wall_seconds else 0.0,
+            "error_rate": round(errors / self.turns, 4) if self.turns else 0.0,
+            "errors": self.errors,
+            "latency_ms": {
+                "p50": round(percentile(ms, 50), 1),
+                "p90": round(percentile(ms, 90), 1),
+                "p95": round(percentile(ms, 95), 1),
+                "p99": round(percentile(ms, 99), 1),
+                "max": round(max(ms), 1) if ms else 0.0,
+            },
+            "memory": {
+                "traced_bytes_per_session": round(_slope(points)),
+                "rss_growth_bytes": self.memory_samples[-1]["rss_bytes"] - self.memory_samples[0]["rss_bytes"] if self.memory_samples else 0,
+                "by_sessions": milestones,
+            },
+        }
+
+
+def print_report(report: dict) -> None:
+    latency = report["latency_ms"]
+    print(f"\n📈 {report['turns']} turns in {report['wall_seconds']} s "
+          f"({report['throughput_turns_per_s']} turns/s), {report['sessions_started']} sessions "
+          f"({report['sessions_dropped']} dropped by the concurrency cap)")
+    print(f"⏱️  latency ms  p50 {latency['p50']}  p90 {latency['p90']}  p95 {latency['p95']}  "
+          f"p99 {latency['p99']}  max {latency['max']}")
+    print(f"❌ error rate {report['error_rate']:.2%} {report['errors'] or ''}")
+    memory = report["memory"]
+    print(f"🧠 traced heap ≈ {memory['traced_bytes_per_session']} bytes/session, "
+          f"RSS growth {memory['rss_growth_bytes'] / 1024:.0f} KiB")
+    print(f"   {'sessions':>8} {'active':>6} {'traced KiB':>11} {'RSS MiB':>8}")
+    for sample in memory["by_sessions"]:
+        print(f"   {sample['sessions_started']:>8} {sample['active_sessions']:>6} "
+              f"{sample['traced_bytes'] / 1024:>11.0f} {sample['rss_bytes'] / 1048576:>8.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay conversations against /chat or the agent.")
+    parser.add_argument("--target", default="agent", help="'agent' (in-process, fake model) or the backend base URL")
+    parser.add_argument("--scenarios", help="JSONL conversations (default: synthesized)")
+    parser.add_argument("--replay-logs", metavar="PATH", help="Conversation log directory or segment to replay")
+    parser.add_argument("--sessions", type=int, default=100, help="Conversations to synthesize without --scenarios")
+    parser.add_argument("--rate", type=float, default=2.0, help="New sessions per second (Poisson)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to keep starting sessions")
+    parser.add_argument("--max-sessions", type=int, default=50, help="Cap on concurrently live sessions")
+    parser.add_argument("--ramp", type=float, default=0.0, help="Seconds to ramp the cap from 1 to --max-sessions")
+    parser.add_argument("--think-time", type=float, default=1.0, help="Mean think time between turns (s)")
+    parser.add_argument("--model-latency-ms", type=float, default=200.0, help="Fake model latency per call")
+    parser.add_argument("--async-agent", action="store_true", help="Use the agent's async_query (one event loop, no thread per turn)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--write-sample", metavar="PATH", help="Write synthesized scenarios to PATH and exit")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.write_sample:
+        with open(args.write_sample, "w", encoding="utf-8") as f:
+            for scenario in synthesize_scenarios(args.sessions, args.seed):
+                f.write(json.dumps(scenario) + "\n")
+        print(f"Wrote {args.sessions} scenarios to {args.write_sample}")
+        sys.exit(0)
+
+    if args.replay_logs:
+        scenarios = conversation_log.to_scenarios(conversation_log.read_records(args.replay_logs))
+    elif args.scenarios:
+        scenarios = load_scenarios(args.scenarios)
+    else:
+        scenarios = synthesize_scenarios(args.sessions, args.seed)
+    if not scenarios:
+        sys.exit("No scenarios to replay")
+    if args.target == "agent":
+        target = AgentTarget(latency_ms=args.model_latency_ms, seed=args.seed, use_async=args.async_agent)
+    else:
+        target = HttpTarget(args.target)
+
+    test = LoadTest(target, scenarios, rate=args.rate, duration=args.duration, max_sessions=args.max_sessions,
+                    ramp=args.ramp, think_time=args.think_time, seed=args.seed)
+    result = asyncio.run(test.run())
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
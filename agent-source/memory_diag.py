@@ -0,0 +1,175 @@
+"""
+Memory Diagnostics
+==================
+
+Leak-hunting helpers for long-running replicas and workers: tracemalloc
+snapshots with the top growth sites between snapshots, RSS, live object
+counts for chat/session types, and conversation history sizes.
+
+It backs /debug/memory in the backend and memory_report() in the agent.
+Each deploy unit carries its own copy, compared by
+backend/tests/test_shared_modules.py. Stdlib only.
+
+Off unless ZODIAC_MEMORY_DIAG=1 (tracemalloc slows allocation-heavy code);
+ZODIAC_MEMORY_DIAG_FRAMES sets the traceback depth per allocation (default 1).
+
+Usage:
+    diag = MemoryDiagnostics()
+    diag.start()
+    ...
+    report = diag.report(histories={"default": chat.history})
+"""
+
+import gc
+import os
+import threading
+import time
+import tracemalloc
+
+ENABLED = os.environ.get("ZODIAC_MEMORY_DIAG", "0") == "1"
+TRACE_FRAMES = int(os.environ.get("ZODIAC_MEMORY_DIAG_FRAMES", "1"))
+
+# Types whose live instance counts tell us whether conversations are piling up
+WATCHED_TYPES = ("ChatSession", "Content", "Part", "Session", "Event", "FakeChatSession", "FakeContent", "FakePart")
+
+# Allocations inside these files are the profiler itself, not the app
+_IGNORED_FILES = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>")
+
+
+def rss_bytes() -> int:
+    """Current resident set size (Linux /proc), else peak RSS."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def object_counts(type_names=WATCHED_TYPES) -> dict:
+    """Live gc-tracked instances per watched type name."""
+    wanted = set(type_names)
+    counts = dict.fromkeys(type_names, 0)
+    for obj in gc.get_objects():
+        name = type(obj).__name__
+        if name in wanted:
+            counts[name] += 1
+    return {name: count for name, count in counts.items() if count}
+
+
+def history_size(history) -> dict:
+    """Message count and approximate text bytes of a chat history list."""
+    history = list(history or [])
+    approx = 0
+    for item in history:
+        if isinstance(item, dict):
+            approx += len(str(item.get("content", "")))
+            continue
+        for part in getattr(item, "parts", None) or []:
+            text = getattr(part, "text", None)
+            approx += len(text) if isinstance(text, str) else len(str(getattr(part, "function_response", "") or ""))
+    return {"messages": len(history), "approx_bytes": approx}
+
+
+def session_service_sizes(service) -> dict:
+    """Per-session event counts of an ADK InMemorySessionService (best effort)."""
+    sizes = {}
+    sessions = getattr(service, "sessions", None) or {}
+    for app_sessions in sessions.values():
+        for user_id, user_sessions in app_sessions.items():
+            for session_id, session in user_sessions.items():
+                events = getattr(session, "events", None) or []
+                sizes[f"{user_id}/{session_id}"] = {
+                    "events": len(events),
+                    "approx_bytes": sum(len(str(getattr(e, "content", "") or "")) for e in events),
+                }
+    return sizes
+
+
+class MemoryDiagnostics:
+    """tracemalloc snapshots plus growth between consecutive reports."""
+
+    def __init__(self, top: int = 10):
+        self.top = top
+        self._baseline = None
+        self._previous = None
+        self._started_at = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Snapshots are per-process; a pickled copy starts over
+        return {"top": self.top}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def active(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self) -> None:
+        """Start tracemalloc (if needed) and take the baseline snapshot."""
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACE_FRAMES)
+            self._started_at = time.time()
+            self._baseline = self._previous = self._snapshot()
+
+    def stop(self) -> None:
+        with self._lock:
+            tracemalloc.stop()
+            self._baseline = self._previous = None
+
+    @staticmethod
+    def _snapshot():
+        snapshot = tracemalloc.take_snapshot()
+        return snapshot.filter_traces([tracemalloc.Filter(False, path) for path in _IGNORED_FILES])
+
+    @staticmethod
+    def _growth(current, previous, top: int) -> list:
+        sites = []
+        for stat in current.compare_to(previous, "lineno")[:top]:
+            if stat.size_diff <= 0:
+                continue
+            frame = stat.traceback[0]
+            sites.append({
+                "site": f"{frame.filename}:{frame.lineno}",
+                "size_diff_bytes": stat.size_diff,
+                "count_diff": stat.count_diff,
+                "size_bytes": stat.size,
+            })
+        return sites
+
+    def report(self, histories: dict = None, extra: dict = None) -> dict:
+        """Snapshot memory and describe growth since the previous report and since start.
+
+        Args:
+            histories: {session_id: history list} to size
+            extra: Additional caller-specific fields merged into the report
+
+        Returns:
+            Dict with rss, traced memory, object counts, history sizes and
+            top growth sites (only when tracing is active).
+        """
+        report = {
+            "rss_bytes": rss_bytes(),
+            "objects": object_counts(),
+            "gc_counts": gc.get_count(),
+            "histories": {sid: history_size(h) for sid, h in (histories or {}).items()},
+        }
+        with self._lock:
+            if tracemalloc.is_tracing() and self._baseline is not None:
+                current = self._snapshot()
+                traced, peak = tracemalloc.get_traced_memory()
+                report.update(
+                    traced_bytes=traced,
+                    traced_peak_bytes=peak,
+                    tracing_since=self._started_at,
+                    growth_since_last=self._growth(current, self._previous, self.top),
+                    growth_since_start=self._growth(current, self._baseline, self.top),
+                )
+                self._previous = current
+            else:
+                report["tracing"] = "off (set ZODIAC_MEMORY_DIAG=1)"
+        report.update(extra or {})
+        return report
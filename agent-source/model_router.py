@@ -0,0 +1,219 @@
+"""
+Model Cascade Router
+====================
+
+Picks the model for a chat turn instead of running everything on one:
+
+1. `turn_complexity()` scores the user's text from 0 to 1. It looks at
+   length, likely tool calls (budget, user id), itinerary requests and
+   comparisons or multi-part questions.
+2. Turns at or below the threshold start on the cheapest model (tier 0).
+   Harder turns go straight to the larger model.
+3. `validate_reply()` checks the cheap model's answer. An empty reply, a
+   missing itinerary that was asked for, or low model confidence escalates
+   the turn to the next tier.
+
+`ModelRouter` keeps per-model call counts, latency percentiles, token usage
+and estimated cost, plus escalation counts by reason.
+
+The agent's tool loop and the backend's fallback path both cascade with
+it, from their own copies (backend/tests/test_shared_modules.py checks
+they match). Stdlib only (plus retry_policy).
+
+Environment:
+    ZODIAC_CASCADE             Set to 0 to always use the first model (default 1)
+    ZODIAC_ESCALATION_MODEL    Larger model for hard or failed turns (default gemini-2.5-flash)
+    ZODIAC_ESCALATE_ABOVE      Complexity above which a turn starts on the larger model (default 0.6)
+"""
+
+import os
+import re
+import threading
+
+from retry_policy import LatencyTracker
+
+CASCADE_ENABLED = os.environ.get("ZODIAC_CASCADE", "1") == "1"
+ESCALATION_MODEL_NAME = os.environ.get("ZODIAC_ESCALATION_MODEL", "gemini-2.5-flash")
+ESCALATE_ABOVE = float(os.environ.get("ZODIAC_ESCALATE_ABOVE", "0.6"))
+
+# USD per 1M (input, output) tokens; update when list prices change
+MODEL_PRICES = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+# Rough token estimate when a response carries no usage metadata
+CHARS_PER_TOKEN = 4
+# Mean token log-probability below which a reply counts as low confidence
+MIN_AVG_LOGPROB = -1.5
+
+_ITINERARY_RE = re.compile(
+    r"\b(itinerar\w*|day[- ]by[- ]day|\d+[- ]days?\b|schedule)",
+    re.IGNORECASE,
+)
+_COMPARE_RE = re.compile(r"\b(compare|versus|vs\.?|pros and cons|which is better|why)\b", re.IGNORECASE)
+_BUDGET_RE = re.compile(r"\$\s?\d|\b\d+\s?(?:usd|dollars|bucks)\b|\bbudget\b", re.IGNORECASE)
+_USER_ID_RE = re.compile(r"\buser_\d{3}\b")
+_DAY_LINE_RE = re.compile(r"^\s*(?:[•\-*]\s*)?\**day\s*\d+", re.IGNORECASE | re.MULTILINE)
+# Placeholder replies the agent produces when the model returned nothing usable
+_EMPTY_REPLIES = ("The cosmos have spoken, but silently", "The stars are aligning...")
+
+
+def turn_complexity(text: str) -> tuple:
+    """Score a turn's user text.
+
+    Returns:
+        (score in [0, 1], [reasons])
+    """
+    reasons = []
+    score = min(1.0, len(text.split()) / 80.0) * 0.3
+    if score >= 0.15:
+        reasons.append("long")
+    if _ITINERARY_RE.search(text):
+        score += 0.5
+        reasons.append("itinerary")
+    if _COMPARE_RE.search(text) or text.count("?") > 1:
+        score += 0.2
+        reasons.append("reasoning")
+    # Each likely tool call adds a round trip the model has to orchestrate
+    tools = bool(_BUDGET_RE.search(text)) + bool(_USER_ID_RE.search(text))
+    if tools:
+        score += 0.1 * tools
+        reasons.append("tools")
+    return min(1.0, round(score, 3)), reasons
+
+
+def validate_reply(text: str, reply: str, avg_logprob: float = None) -> str:
+    """Why a reply should be escalated, or None if it is acceptable.
+
+    Args:
+        text: The user's text for the turn
+        reply: The model's final reply
+        avg_logprob: Mean token log-probability, when the model reports it
+    """
+    if not reply or not reply.strip() or any(p in reply for p in _EMPTY_REPLIES):
+        return "empty"
+    if _ITINERARY_RE.search(text) and not _DAY_LINE_RE.search(reply):
+        return "no_itinerary"
+    if avg_logprob is not None and avg_logprob < MIN_AVG_LOGPROB:
+        return "low_confidence"
+    return None
+
+
+def avg_logprob(response):
+    """Mean token log-probability of a model response, or None if not reported."""
+    candidates = getattr(response, "candidates", None)
+    value = getattr(candidates[0], "avg_logprobs", None) if candidates else None
+    return value if isinstance(value, float) else None
+
+
+def _text_chars(response) -> int:
+    try:
+        parts = response.candidates[0].content.parts
+    except (AttributeError, IndexError, TypeError):
+        return 0
+    total = 0
+    for part in parts:
+        try:
+            total += len(part.text or "")
+        except (AttributeError, ValueError):
+            pass  # function-call parts have no text
+    return total
+
+
+def usage_tokens(response, input_chars: int) -> tuple:
+    """(input_tokens, output_tokens) from response usage metadata, else estimated from text sizes."""
+    usage = getattr(response, "usage_metadata", None)
+    prompt = getattr(usage, "prompt_token_count", None)
+    output = getattr(usage, "candidates_token_count", None)
+    if isinstance(prompt, int) and isinstance(output, int):
+        return prompt, output
+    return input_chars // CHARS_PER_TOKEN, _text_chars(response) // CHARS_PER_TOKEN
+
+
+class ModelRouter:
+    """Chooses a model tier per turn and records per-model latency and cost.
+
+    Args:
+        tiers: Model names, cheapest first
+        escalate_above: Complexity above which a turn starts on the last tier
+        enabled: When False every turn uses the first tier and never escalates
+    """
+
+    def __init__(self, tiers: list, escalate_above: float = ESCALATE_ABOVE, enabled: bool = CASCADE_ENABLED):
+        self.tiers = list(tiers)
+        self.escalate_above = escalate_above
+        self.enabled = enabled and len(self.tiers) > 1
+        self._init_stats()
+
+    def _init_stats(self):
+        self._lock = threading.Lock()
+        self._latency = {name: LatencyTracker() for name in self.tiers}
+        self.stats = {
+            "turns": dict.fromkeys(self.tiers, 0),
+            "escalations": {},
+            "models": {name: {"calls": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0} for name in self.tiers},
+        }
+
+    def __getstate__(self):
+        return {"tiers": self.tiers, "escalate_above": self.escalate_above, "enabled": self.enabled}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_stats()
+
+    def choose(self, text: str) -> int:
+        """Tier index to start a turn on."""
+        if not self.enabled:
+            return 0
+        score, _ = turn_complexity(text)
+        return len(self.tiers) - 1 if score > self.escalate_above else 0
+
+    def can_escalate(self, tier: int) -> bool:
+        return self.enabled and tier < len(self.tiers) - 1
+
+    def record_turn(self, tier: int) -> None:
+        """Count the tier that produced a turn's final reply."""
+        with self._lock:
+            self.stats["turns"][self.tiers[tier]] += 1
+
+    def record_escalation(self, tier: int, reason: str) -> None:
+        with self._lock:
+            key = f"{self.tiers[tier]}:{reason}"
+            self.stats["escalations"][key] = self.stats["escalations"].get(key, 0) + 1
+
+    def record_call(self, model: str, seconds: float, response=None, input_chars: int = 0) -> None:
+        """Record one model round trip (latency and token usage)."""
+        input_tokens, output_tokens = usage_tokens(response, input_chars)
+        latency = self._latency.get(model)
+        if latency is not None:
+            latency.record(seconds)
+        with self._lock:
+            entry = self.stats["models"].setdefault(model, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "seconds": 0.0})
+            entry["calls"] += 1
+            entry["input_tokens"] += input_tokens
+            entry["output_tokens"] += output_tokens
+            entry["seconds"] += seconds
+
+    def snapshot(self) -> dict:
+        """Per-model calls, latency percentiles, tokens and estimated cost; turns and escalations."""
+        with self._lock:
+            models = {}
+            for name, entry in self.stats["models"].items():
+                input_price, output_price = MODEL_PRICES.get(name, (0.0, 0.0))
+                latency = self._latency.get(name)
+                p50 = latency.percentile(50) if latency else None
+                p95 = latency.percentile(95) if latency else None
+                models[name] = dict(
+                    entry,
+                    seconds=round(entry["seconds"], 3),
+                    latency_p50_ms=round(p50 * 1000, 1) if p50 is not None else None,
+                    latency_p95_ms=round(p95 * 1000, 1) if p95 is not None else None,
+                    cost_usd=round((entry["input_tokens"] * input_price + entry["output_tokens"] * output_price) / 1e6, 6),
+                )
+            return {
+                "enabled": self.enabled,
+                "turns": dict(self.stats["turns"]),
+                "escalations": dict(self.stats["escalations"]),
+                "models": models,
+            }
@@ -0,0 +1,92 @@
+"""
+Memory Soak Test
+================
+
+Drives many conversation turns through an in-process ZodiacTravelAgent on
+the fake model and fails (exit code 1) when retained memory per request
+exceeds a threshold, printing the top growth sites so the leak can be found.
+
+Retained memory is measured with tracemalloc after a warm-up phase and a
+full garbage collection on both ends, so caches that fill once do not
+count against the budget; state that grows with every request does.
+
+Usage:
+    python soak_test.py                                   # 2000 requests, 1024 bytes/request budget
+    python soak_test.py --requests 10000 --max-bytes-per-request 256
+"""
+
+import argparse
+import gc
+import sys
+import time
+
+from load_test import AgentTarget, synthesize_scenarios
+from memory_diag import MemoryDiagnostics, rss_bytes
+
+
+def soak(requests: int = 2000, warmup: int = 200, latency_ms: float = 0.0, seed: int = 0) -> dict:
+    """Run `warmup` + `requests` turns and measure retained memory per request.
+
+    Returns:
+        {"requests", "bytes_per_request", "retained_bytes", "rss_growth_bytes",
+         "seconds", "report"} where report is the MemoryDiagnostics report
+        covering the measured phase.
+    """
+    target = AgentTarget(latency_ms=latency_ms, jitter_ms=0.0, seed=seed)
+    turns = [(s["user_id"], t["message"]) for s in synthesize_scenarios(200, seed) for t in s["turns"]]
+
+    def run(count: int, offset: int) -> None:
+        for i in range(count):
+            user_id, message = turns[(offset + i) % len(turns)]
+            target.send(user_id, message, [])
+
+    diag = MemoryDiagnostics(top=10)
+    run(warmup, 0)
+    gc.collect()
+    diag.start()
+    rss_before = rss_bytes()
+    before = diag.report()["traced_bytes"]
+
+    started = time.perf_counter()
+    run(requests, warmup)
+    elapsed = time.perf_counter() - started
+
+    gc.collect()
+    report = diag.report(histories=target.agent._histories())
+    diag.stop()
+    retained = report["traced_bytes"] - before
+    return {
+        "requests": requests,
+        "bytes_per_request": retained / requests if requests else 0.0,
+        "retained_bytes": retained,
+        "rss_growth_bytes": rss_bytes() - rss_before,
+        "seconds": elapsed,
+        "report": report,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if the agent retains too much memory per request.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--max-bytes-per-request", type=float, default=1024.0)
+    parser.add_argument("--model-latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    result = soak(args.requests, args.warmup, args.model_latency_ms)
+    report = result["report"]
+    print(f"🧪 {result['requests']} requests in {result['seconds']:.1f} s")
+    print(f"🧠 retained {result['retained_bytes'] / 1024:.0f} KiB "
+          f"= {result['bytes_per_request']:.0f} bytes/request "
+          f"(RSS +{result['rss_growth_bytes'] / 1024:.0f} KiB)")
+    for session_id, size in report["histories"].items():
+        print(f"   history[{session_id}]: {size['messages']} messages, ~{size['approx_bytes'] / 1024:.0f} KiB text")
+    print(f"   live objects: {report['objects']}")
+    print("📍 top growth sites:")
+    for site in report["growth_since_start"]:
+        print(f"   +{site['size_diff_bytes'] / 1024:8.1f} KiB  {site['count_diff']:+7d} blocks  {site['site']}")
+
+    if result["bytes_per_request"] > args.max_bytes_per_request:
+        print(f"❌ FAIL: {result['bytes_per_request']:.0f} bytes/request > {args.max_bytes_per_request:.0f}")
+        sys.exit(1)
+    print(f"✅ PASS: within {args.max_bytes_per_request:.0f} bytes/request")
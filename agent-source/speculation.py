@@ -0,0 +1,157 @@
+"""
+Speculative Tool Execution
+==========================
+
+When a turn names a user (user_XXX) or a budget, the model is very likely to
+call get_user_profile / search_destinations. The speculator starts those
+calls on a thread pool while the first model request is in flight; if the
+model then asks for a prefetched call (same tool, same normalized
+arguments) the result is served at once, otherwise it is discarded.
+
+Stats: speculated calls, hits, misses (discarded) and the tool time saved.
+"""
+
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import fast_path
+
+_USER_ID_RE = re.compile(r"\buser_\d{3}\b")
+
+# Longest we block on an unfinished prefetch before running the tool ourselves
+TAKE_TIMEOUT_SECONDS = 1.0
+
+
+def normalize_args(name: str, args: dict) -> dict:
+    """Tool arguments as plain Python types (model args may be protobuf containers)."""
+    if name == "search_destinations":
+        vibes = args.get("vibes") or []
+        normalized = {"max_budget": int(args.get("max_budget", 1000)), "vibes": [str(v) for v in vibes]}
+        for field in ("cursor", "date_from", "date_to"):
+            if args.get(field):
+                normalized[field] = str(args[field])
+        return normalized
+    if name == "get_user_profile":
+        return {"user_id": str(args.get("user_id", ""))}
+    return dict(args)
+
+
+def _key(name: str, args: dict) -> str:
+    if name == "search_destinations":
+        args = {"max_budget": args["max_budget"], "vibes": sorted(v.lower() for v in args["vibes"]), "cursor": args.get("cursor"),
+                "date_from": args.get("date_from"), "date_to": args.get("date_to")}
+    return name + json.dumps(args, sort_keys=True)
+
+
+def predict(message: str, user_id: str, destinations: list) -> list:
+    """Likely tool calls for a turn, as [(name, args), ...]."""
+    text = fast_path.user_text(message)
+    calls = []
+    match = _USER_ID_RE.search(text)
+    # The caller's own profile is already in the prompt context
+    if match and match.group(0) != user_id:
+        calls.append(("get_user_profile", {"user_id": match.group(0)}))
+    budget = fast_path.parse_budget(text)
+    if budget is not None:
+        known_tags = {t.lower(): t for d in destinations for t in d["tags"]}
+        calls.append(("search_destinations", {"max_budget": budget, "vibes": fast_path.parse_vibes(text, known_tags)}))
+    return calls
+
+
+class Speculation:
+    """Prefetched results for one turn."""
+
+    def __init__(self, speculator, futures: dict):
+        self._speculator = speculator
+        self._futures = futures  # key -> future of (result, run_seconds)
+        self._used = set()
+
+    def __len__(self):
+        return len(self._futures)
+
+    def take(self, name: str, args: dict, wait: bool = True):
+        """The prefetched result for this call, or None if it was not (or not yet) prefetched."""
+        key = _key(name, args)
+        future = self._futures.get(key)
+        if future is None or key in self._used or (not wait and not future.done()):
+            return None
+        started = time.perf_counter()
+        try:
+            result, run_seconds = future.result(timeout=TAKE_TIMEOUT_SECONDS)
+        except Exception:
+            return None  # failed or too slow; the caller runs the tool itself
+        self._used.add(key)
+        self._speculator._record_hit(max(0.0, run_seconds - (time.perf_counter() - started)))
+        return result
+
+    def discard(self) -> None:
+        """Drop prefetches the model never asked for."""
+        unused = [f for k, f in self._futures.items() if k not in self._used]
+        for future in unused:
+            future.cancel()
+        self._speculator._record_misses(len(unused))
+
+
+class Speculator:
+    """Starts likely tool calls in parallel with the first model request."""
+
+    def __init__(self, max_workers: int = 4):
+        self.max_workers = max_workers
+        self.stats = {"speculated": 0, "hits": 0, "misses": 0, "saved_seconds": 0.0}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_pool=None)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def hit_rate(self) -> float:
+        return self.stats["hits"] / self.stats["speculated"] if self.stats["speculated"] else 0.0
+
+    def start(self, message: str, user_id: str, destinations: list, run_tool) -> Speculation:
+        """Kick off predicted tool calls.
+
+        Args:
+            message: Raw query message
+            user_id: Caller's user id
+            destinations: Catalog rows (for vibe parsing)
+            run_tool: (name, normalized_args) -> result string
+
+        Returns:
+            A Speculation to `take()` results from and `discard()` at the end of the turn.
+        """
+        calls = predict(message, user_id, destinations)
+        if not calls:
+            return Speculation(self, {})
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="speculate")
+
+        def timed(name, args):
+            started = time.perf_counter()
+            return run_tool(name, args), time.perf_counter() - started
+
+        futures = {_key(name, args): self._pool.submit(timed, name, args) for name, args in calls}
+        with self._lock:
+            self.stats["speculated"] += len(futures)
+        return Speculation(self, futures)
+
+    def _record_hit(self, saved_seconds: float) -> None:
+        with self._lock:
+            self.stats["hits"] += 1
+            self.stats["saved_seconds"] += saved_seconds
+
+    def _record_misses(self, count: int) -> None:
+        if count:
+            with self._lock:
+                self.stats["misses"] += count
@@ -0,0 +1,87 @@
+"""
+Startup / Import-Time Profile Report
+====================================
+
+Measures how long our entry modules take to import in a fresh interpreter
+(`python -X importtime`) and prints the slowest imports, so cold-start
+regressions show up before they reach a scaled-up replica.
+
+Usage:
+    python startup_profile.py                      # agent entry modules
+    python startup_profile.py deploy_sdk vertexai  # specific modules
+    python startup_profile.py --path ../backend app --top 15 --json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["agent", "deploy_sdk"]
+
+
+def profile_import(module: str, path: str = ".") -> dict:
+    """Import `module` in a fresh interpreter and collect -X importtime data.
+
+    Args:
+        module: Dotted module name to import
+        path: Directory prepended to PYTHONPATH
+
+    Returns:
+        {"module", "total_us", "ok", "error", "imports": [(cumulative_us, self_us, name), ...]}
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in [os.path.abspath(path), env.get("PYTHONPATH", "")] if p)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=env,
+    )
+
+    imports = []
+    error = None
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            if line.strip():
+                error = line.strip()  # keep the last traceback line
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header row
+        imports.append((int(fields[1]), int(fields[0]), fields[2].strip()))
+
+    top_level = [c for c, _, name in imports if name == module]
+    return {
+        "module": module,
+        "total_us": top_level[-1] if top_level else sum(s for _, s, _ in imports),
+        "ok": proc.returncode == 0,
+        "error": error if proc.returncode else None,
+        "imports": sorted(imports, reverse=True),
+    }
+
+
+def print_report(results: list, top: int = 10) -> None:
+    """Pretty-print profile results."""
+    for res in results:
+        status = "✅" if res["ok"] else "❌"
+        print(f"{status} {res['module']}: {res['total_us'] / 1000:.1f} ms")
+        if res["error"]:
+            print(f"   {res['error']}")
+        for cumulative, self_us, name in res["imports"][:top]:
+            print(f"   {cumulative / 1000:9.1f} ms  (self {self_us / 1000:7.1f} ms)  {name}")
+        print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import-time profile report")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES)
+    parser.add_argument("--path", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Emit machine-readable JSON")
+    args = parser.parse_args()
+
+    results = [profile_import(m, args.path) for m in args.modules]
+    if args.json:
+        print(json.dumps([{**r, "imports": r["imports"][:args.top]} for r in results], indent=2))
+    else:
+        print_report(results, args.top)
@@ -0,0 +1,182 @@
+"""
+Structured Recommendations
+==========================
+
+Optional response mode for `ZodiacTravelAgent.query` (`response_format`):
+
+1. The agent ranks catalog candidates itself from the turn's budget and vibes.
+2. One tool-free model call, constrained by RESPONSE_SCHEMA, picks 2-3 of
+   them and writes a short reason for each:
+
+       [{"city": "Paris", "price": 450, "reason": "..."}]
+
+3. The picks are validated against the catalog. The city must exist, the
+   price comes from the catalog and must fit the budget, and duplicates are
+   dropped. They are then rendered server-side in the agent's format:
+
+       ✨ **[City]** ($[Price]) — [reason]
+
+This replaces the tool loop and decorated markdown with one call that has
+compact output. The validated picks are plain data, so they can be cached.
+Turns without a budget or any candidate return None and use the normal path.
+"""
+
+import json
+import re
+import threading
+
+import catalog
+from fast_path import parse_budget, parse_vibes, user_text
+
+RESPONSE_FORMATS = ("markdown", "structured", "json")
+MAX_CANDIDATES = 8
+MAX_PICKS = 3
+MAX_REASON_CHARS = 160
+MAX_OUTPUT_TOKENS = 256
+
+RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "city": {"type": "string"},
+            "price": {"type": "integer"},
+            "reason": {"type": "string"},
+        },
+        "required": ["city", "price", "reason"],
+    },
+}
+
+SYSTEM_PROMPT = (
+    "You are the Zodiac Travel Guide. Pick the 2-3 candidates that best fit the user's "
+    "request and zodiac traits. Only pick from CANDIDATES_JSON and copy city and price exactly. "
+    "Each reason is one vivid sentence (max 25 words) linking the traits to the destination's tags. "
+    "Return only the JSON array."
+)
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def build_prompt(text: str, profile: tuple, rows: list, budget: int) -> str:
+    """Compact prompt: user context, the candidate rows and the user's text."""
+    lines = []
+    if profile:
+        name, sign, traits = profile
+        lines.append(f"USER: {name}, {sign}. Traits: {traits}")
+    compact = [{"city": d["city"], "price": d["price"], "tags": d["tags"]} for d in rows]
+    lines.append(f"BUDGET: ${budget}")
+    lines.append("CANDIDATES_JSON: " + json.dumps(compact, separators=(",", ":")))
+    lines.append(f"REQUEST: {text}")
+    return "\n".join(lines)
+
+
+def parse_picks(text: str) -> list:
+    """The model's JSON array (or {"recommendations": [...]}).
+
+    Raises:
+        ValueError: If the text is not a JSON list of objects.
+    """
+    data = json.loads(text)
+    if isinstance(data, dict):
+        data = data.get("recommendations")
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise ValueError("expected a JSON array of recommendation objects")
+    return data
+
+
+def validate(picks: list, destinations: list, budget: int) -> tuple:
+    """Check picks against the catalog.
+
+    Returns:
+        (valid picks as {"city", "price", "reason"} with catalog city/price, [problems])
+    """
+    by_city = {d["city"].lower(): d for d in destinations}
+    valid, problems, seen = [], [], set()
+    for pick in picks:
+        row = by_city.get(str(pick.get("city", "")).strip().lower())
+        if row is None:
+            problems.append("unknown_city")
+            continue
+        if row["price"] > budget:
+            problems.append("over_budget")
+            continue
+        if row["city"] in seen:
+            problems.append("duplicate")
+            continue
+        if pick.get("price") != row["price"]:
+            problems.append("price_corrected")
+        reason = _SPACE_RE.sub(" ", str(pick.get("reason") or "")).strip()[:MAX_REASON_CHARS]
+        if not reason:
+            reason = f"its {' and '.join(t.lower() for t in row['tags'])} vibes are written in your stars."
+        seen.add(row["city"])
+        valid.append({"city": row["city"], "price": row["price"], "reason": reason})
+        if len(valid) == MAX_PICKS:
+            break
+    return valid, problems
+
+
+def render(picks: list, budget: int) -> str:
+    """Render validated picks in the agent's `✨ **[City]** ($[Price]) — ...` format."""
+    lines = [f"🔮 The stars have spoken — your cosmic matches under ${budget}:", ""]
+    lines += [f"✨ **{p['city']}** (${p['price']}) — {p['reason']}" for p in picks]
+    lines += ["", "Which of these orbits calls to you? 🌠"]
+    return "\n".join(lines)
+
+
+def as_json(picks: list, text: str) -> str:
+    """The "json" response format: validated picks plus the rendered text."""
+    return json.dumps({"recommendations": picks, "text": text}, ensure_ascii=False)
+
+
+class StructuredResponder:
+    """Prepares structured turns and checks their output; tracks outcomes."""
+
+    def __init__(self):
+        self.stats = {"turns": 0, "answered": 0, "skipped": 0, "invalid_output": 0, "problems": {}}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def prepare(self, message: str, user_id: str, destinations: list, profile_lookup) -> tuple:
+        """Build the model prompt for a turn.
+
+        Returns:
+            (prompt, budget), or None when the turn needs the normal path
+            (no budget stated, or nothing in the catalog fits it).
+        """
+        text = user_text(message)
+        budget = parse_budget(text)
+        rows = []
+        if budget is not None:
+            known_tags = {t.lower(): t for d in destinations for t in d["tags"]}
+            vibes = parse_vibes(text, known_tags)
+            rows = [d for _, d in catalog.rank_destinations(destinations, budget, vibes)[:MAX_CANDIDATES]]
+        with self._lock:
+            self.stats["turns"] += 1
+            if not rows:
+                self.stats["skipped"] += 1
+        if not rows:
+            return None
+        return build_prompt(text, profile_lookup(user_id), rows, budget), budget
+
+    def finish(self, output: str, destinations: list, budget: int) -> list:
+        """Validated picks from the model output, or None if nothing usable came back."""
+        try:
+            picks, problems = validate(parse_picks(output), destinations, budget)
+        except ValueError:
+            picks, problems = [], ["unparseable"]
+        with self._lock:
+            for problem in problems:
+                self.stats["problems"][problem] = self.stats["problems"].get(problem, 0) + 1
+            if picks:
+                self.stats["answered"] += 1
+            else:
+                self.stats["invalid_output"] += 1
+        return picks or None
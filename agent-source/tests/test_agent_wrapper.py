@@ -0,0 +1,35 @@
+import time
+
+import agent
+from fake_model import FakeGenerativeModel
+from scheduler import model_scheduler
+
+
+def make_wrapper(**model_options):
+    # root_agent is the Vertex AI wrapper; the module later rebinds the class name to the ADK one
+    wrapper = type(agent.root_agent)()
+    wrapper._model = FakeGenerativeModel(**model_options)
+    wrapper._chat = wrapper._model.start_chat()
+    return wrapper
+
+
+def test_slow_model_call_is_abandoned_at_the_deadline():
+    wrapper = make_wrapper(latency_ms=2000, jitter_ms=0)
+    started = time.perf_counter()
+    reply = wrapper.query("Where should I travel next?", user_id="user_001", deadline_ms=500)
+    assert time.perf_counter() - started < 1.5
+    assert "cloudy" in reply
+    # The abandoned call still occupies the model, so it keeps its slot until it returns
+    assert model_scheduler.snapshot()["in_use"] >= 1
+    time.sleep(2)
+    assert model_scheduler.snapshot()["in_use"] == 0
+    # ...and it finished on a copy of the chat
+    assert wrapper._chat.history == []
+
+
+def test_reply_is_recorded_in_the_chat():
+    wrapper = make_wrapper(latency_ms=10, jitter_ms=0)
+    reply = wrapper.query("Hi there", deadline_ms=2000)
+    assert "cloudy" not in reply
+    assert len(wrapper._chat.history) == 2
+    assert model_scheduler.snapshot()["in_use"] == 0
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+pytest.importorskip("vertexai")
+
+import deploy_sdk
+from fake_model import FakeChatSession, FakeContent, FakeGenerativeModel, FakePart, FakeResponse
+
+
+class RejectingChat(FakeChatSession):
+    """Appends the exchange, then fails it, like a tool loop that breaks half-way."""
+
+    def _respond(self, content):
+        response = super()._respond(content)
+        if "REJECT" in str(content):
+            raise ValueError("rejected by the first tier")
+        return response
+
+
+class RejectingModel(FakeGenerativeModel):
+    def start_chat(self, history: list = None):
+        chat = RejectingChat(self)
+        chat.history.extend(history or [])
+        return chat
+
+
+def make_agent(escalation_model=None, **model_options):
+    agent = deploy_sdk.ZodiacTravelAgent()
+    model = RejectingModel(**model_options) if escalation_model is not None else FakeGenerativeModel(**model_options)
+    agent.use_model(model, escalation_model=escalation_model)
+    return agent
+
+
+def test_slow_model_call_is_abandoned_at_the_deadline():
+    agent = make_agent(latency_ms=2000, jitter_ms=0)
+    started = time.perf_counter()
+    reply = agent.query(input={"message": "Where should I travel next?", "user_id": "user_001", "deadline_ms": 500})
+    assert time.perf_counter() - started < 1.5
+    assert "timed out" in reply
+    time.sleep(2)
+    # The abandoned call finished on a copy of the chat
+    assert agent._histories()["user_001"] == []
+
+
+def _texts(history):
+    return [str(part.text or part.function_response or part.function_call.args)
+            for content in history for part in content.parts]
+
+
+def test_concurrent_sessions_do_not_share_history():
+    agent = make_agent(latency_ms=20, jitter_ms=10, seed=1)
+    users = [f"user_00{i}" for i in range(1, 6)]
+
+    async def main():
+        await asyncio.gather(*(
+            agent.async_query(input={"message": f"Hi, I am {user_id}, where should I travel?", "user_id": user_id})
+            for user_id in users
+        ))
+
+    asyncio.run(main())
+    histories = agent._histories()
+    assert sorted(histories) == users
+    for user_id, history in histories.items():
+        texts = _texts(history)
+        assert any(user_id in text for text in texts)
+        assert not any(other in text for other in users if other != user_id for text in texts)
+
+
+def test_turns_of_one_session_run_one_at_a_time():
+    agent = make_agent(latency_ms=20, jitter_ms=10, seed=2)
+
+    async def turn(i):
+        return await agent.async_query(input={"message": f"Hi, I am user_001, question {i}?", "user_id": "user_001"})
+
+    async def main():
+        await asyncio.gather(*(turn(i) for i in range(4)), asyncio.to_thread(
+            agent.query, input={"message": "Hi, I am user_001, question sync?", "user_id": "user_001"}))
+
+    asyncio.run(main())
+    history = agent._histories()["user_001"]
+    # Every turn is a complete user/model exchange, never interleaved with another turn
+    assert [content.role for content in history] == ["user", "model"] * (len(history) // 2)
+    assert len([text for text in _texts(history[::2]) if "question" in text]) == 5
+
+
+def test_rejected_turn_rolls_back_only_its_own_history():
+    agent = make_agent(escalation_model=FakeGenerativeModel(latency_ms=5, seed=4), latency_ms=20, jitter_ms=15, seed=3)
+
+    async def turn(message):
+        return await agent.async_query(input={"message": message, "user_id": "user_001", "session_id": "s1"})
+
+    async def main():
+        await asyncio.gather(*(turn(f"{verdict} where to, question {i}?") for i in range(3) for verdict in ("REJECT", "Hi")))
+
+    asyncio.run(main())
+    texts = _texts(agent._histories()["s1"])
+    for i in range(3):
+        assert sum(f"Hi where to, question {i}?" in text for text in texts) == 1
+
+
+class LowConfidenceChat(FakeChatSession):
+    """Answers like the fake model, but reports a low mean token log-probability."""
+
+    def _respond(self, content):
+        response = super()._respond(content)
+        response.candidates[0].avg_logprobs = -3.0
+        return response
+
+
+class LowConfidenceModel(FakeGenerativeModel):
+    def start_chat(self, history: list = None):
+        chat = LowConfidenceChat(self)
+        chat.history.extend(history or [])
+        return chat
+
+
+@pytest.mark.parametrize("small, reason", [
+    (RejectingModel(model_name="small", latency_ms=5, jitter_ms=0), "error"),
+    (LowConfidenceModel(model_name="small", latency_ms=5, jitter_ms=0), "low_confidence"),
+])
+def test_bad_first_tier_reply_escalates_and_leaves_no_trace(small, reason):
+    large = FakeGenerativeModel(model_name="large", latency_ms=5, jitter_ms=0)
+    agent = deploy_sdk.ZodiacTravelAgent()
+    agent.use_model(small, escalation_model=large)
+
+    reply = agent.query(input={"message": "REJECT me, where should I go?", "user_id": "user_001", "session_id": "s1"})
+    assert "Error" not in reply and "cloudy" not in reply
+    stats = agent._router.stats
+    assert stats["escalations"] == {f"small:{reason}": 1}
+    assert stats["turns"] == {"small": 0, "large": 1}
+    assert large.calls == 1
+    # The first tier's exchange was rolled back; only the recorded final turn (SDK Content) may remain
+    assert not any(isinstance(content, FakeContent) for content in agent._histories()["s1"])
+
+
+class GarbledStructuredModel(FakeGenerativeModel):
+    """Structured calls return prose instead of the JSON array."""
+
+    def _generate(self, contents):
+        self.calls += 1
+        return FakeResponse(FakePart(text="✨ Bali, obviously."))
+
+
+@pytest.mark.parametrize("model, picked", [
+    (FakeGenerativeModel(latency_ms=5, jitter_ms=0), True),
+    (GarbledStructuredModel(latency_ms=5, jitter_ms=0), False),
+])
+def test_json_mode_validates_picks_and_falls_back_on_garbage(model, picked):
+    agent = deploy_sdk.ZodiacTravelAgent()
+    agent.use_model(model)
+    reply = agent.query(input={"message": "Somewhere with sun and water under $700", "session_id": "s1",
+                               "response_format": "json"})
+    envelope = json.loads(reply)
+    assert bool(envelope["recommendations"]) is picked
+    assert envelope["text"]
+    assert all(pick["price"] <= 700 for pick in envelope["recommendations"])
+    stats = agent._structured.stats
+    assert (stats["answered"], stats["problems"].get("unparseable", 0)) == ((1, 0) if picked else (0, 1))
+
+
+def test_fully_specified_turn_bypasses_the_model():
+    model = FakeGenerativeModel(latency_ms=5, jitter_ms=0)
+    agent = deploy_sdk.ZodiacTravelAgent()
+    agent.use_model(model)
+    reply = agent.query(input={"message": "user_001, $500, romantic", "user_id": "user_001"})
+    assert "✨ **Paris** ($300)" in reply
+    assert model.calls == 0
+    assert agent._fast_path.stats["hits"] == 1
+
+
+def test_prefetched_search_serves_the_models_tool_call():
+    agent = make_agent(latency_ms=50, jitter_ms=0)
+    # A question skips the fast path. Anonymous, so no profile context (whose trait
+    # words the fake model would read as extra vibes); it asks straight for the search.
+    reply = agent.query(input={"message": "Where is there sun under $500?", "session_id": "s1"})
+    assert "✨" in reply
+    assert agent._speculator.stats["speculated"] == 1
+    assert agent._speculator.stats["hits"] == 1
+    assert agent._speculator.stats["misses"] == 0
@@ -0,0 +1,38 @@
+import catalog
+from fast_path import FastPath, user_text
+
+DESTINATIONS = catalog.default_catalog()["destinations"]
+PROFILES = {"user_001": ("Alice Sky", "Libra", "Artistic, Harmonious, Social")}
+
+
+def answer(fast_path, message, user_id="user_001"):
+    return fast_path.try_answer(message, user_id, DESTINATIONS, PROFILES.get)
+
+
+def test_fully_specified_turn_is_answered_from_the_catalog():
+    fast_path = FastPath()
+    reply = answer(fast_path, "user_001, $500, romantic")
+    assert reply is not None
+    assert "✨ **Paris** ($300)" in reply
+    assert "Tokyo" not in reply  # over budget
+    assert fast_path.stats == {"attempts": 1, "hits": 1}
+
+
+def test_ambiguous_turns_go_to_the_model():
+    fast_path = FastPath()
+    for message in (
+        "$500, romantic?",                        # a question
+        "Plan a 3 day itinerary, $500, romantic",  # needs reasoning
+        "romantic please",                        # no budget
+        "$500 somewhere nice",                     # no catalog vibe
+        "$100, romantic",                         # nothing fits the budget
+    ):
+        assert answer(fast_path, message) is None, message
+    assert answer(fast_path, "$500, romantic", user_id="user_999") is None  # unknown user
+    assert fast_path.stats == {"attempts": 6, "hits": 0}
+
+
+def test_backend_wrapper_text_is_ignored():
+    wrapped = "You are a travel agent. Be brief. Why not?\nUser Message: user_001, $500, romantic"
+    assert user_text(wrapped) == "user_001, $500, romantic"
+    assert answer(FastPath(), wrapped) is not None
@@ -0,0 +1,58 @@
+import threading
+
+import catalog
+from speculation import Speculator, predict
+
+DESTINATIONS = catalog.DEFAULT_DESTINATIONS
+
+
+def recording_tool(calls):
+    lock = threading.Lock()
+
+    def run_tool(name, args):
+        with lock:
+            calls.append((name, args))
+        return f"{name} result"
+    return run_tool
+
+
+def test_predicts_profile_and_search_but_not_the_callers_own_profile():
+    assert predict("I am user_002, $400 for sun and water", "user_001", DESTINATIONS) == [
+        ("get_user_profile", {"user_id": "user_002"}),
+        ("search_destinations", {"max_budget": 400, "vibes": ["Sun", "Water"]}),
+    ]
+    assert predict("user_001 here, $400 for sun", "user_001", DESTINATIONS) == [
+        ("search_destinations", {"max_budget": 400, "vibes": ["Sun"]}),
+    ]
+    assert predict("Where should I go?", "user_001", DESTINATIONS) == []
+
+
+def test_matching_call_is_a_hit_and_the_rest_are_misses():
+    calls = []
+    speculator = Speculator()
+    speculation = speculator.start("user_002 wants $400 of sun and water", "user_001", DESTINATIONS, recording_tool(calls))
+    assert len(speculation) == 2
+
+    # Same tool, same arguments (vibe order and case do not matter): served from the prefetch
+    assert speculation.take("search_destinations", {"max_budget": 400, "vibes": ["water", "Sun"]}) == "search_destinations result"
+    # Taken once only; different arguments are not served
+    assert speculation.take("search_destinations", {"max_budget": 400, "vibes": ["Sun", "Water"]}) is None
+    assert speculation.take("search_destinations", {"max_budget": 500, "vibes": ["Sun", "Water"]}) is None
+    speculation.discard()
+
+    assert speculator.stats["speculated"] == 2
+    assert speculator.stats["hits"] == 1
+    assert speculator.stats["misses"] == 1  # the unused profile prefetch
+    assert speculator.hit_rate() == 0.5
+    assert sorted(name for name, _ in calls) == ["get_user_profile", "search_destinations"]
+
+
+def test_failed_prefetch_falls_back_to_the_real_call():
+    def broken_tool(name, args):
+        raise RuntimeError("catalog unavailable")
+
+    speculator = Speculator()
+    speculation = speculator.start("$400 for sun", "user_001", DESTINATIONS, broken_tool)
+    assert speculation.take("search_destinations", {"max_budget": 400, "vibes": ["Sun"]}) is None
+    speculation.discard()
+    assert speculator.stats["hits"] == 0 and speculator.stats["misses"] == 1
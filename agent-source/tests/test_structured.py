@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+import catalog
+import structured
+from fake_model import FakeGenerativeModel
+from structured import StructuredResponder
+
+DESTINATIONS = catalog.default_catalog()["destinations"]
+MESSAGE = "Somewhere with sun and water under $700 please"
+
+
+def _prepare(responder):
+    prepared = responder.prepare(MESSAGE, "user_001", DESTINATIONS, lambda user_id: ("Alice Sky", "Libra", "Artistic"))
+    assert prepared is not None
+    return prepared
+
+
+def test_fake_candidates_json_reply_is_validated_and_rendered():
+    responder = StructuredResponder()
+    prompt, budget = _prepare(responder)
+    assert budget == 700 and "CANDIDATES_JSON: " in prompt
+    output = FakeGenerativeModel(latency_ms=0, jitter_ms=0).generate_content(prompt).text
+
+    picks = responder.finish(output, DESTINATIONS, budget)
+    assert 1 <= len(picks) <= structured.MAX_PICKS
+    assert all(p["price"] <= budget for p in picks)
+    rendered = structured.render(picks, budget)
+    assert all(f"✨ **{p['city']}** (${p['price']})" in rendered for p in picks)
+    envelope = json.loads(structured.as_json(picks, rendered))
+    assert envelope["recommendations"] == picks
+    assert responder.stats["answered"] == 1
+
+
+@pytest.mark.parametrize("output", ["✨ the stars say Bali", '{"city": "Bali"}', "[1, 2]", ""])
+def test_unparseable_output_gives_no_picks(output):
+    responder = StructuredResponder()
+    _, budget = _prepare(responder)
+    assert responder.finish(output, DESTINATIONS, budget) is None
+    assert responder.stats["problems"] == {"unparseable": 1}
+    assert responder.stats["invalid_output"] == 1
+
+
+def test_picks_are_checked_against_the_catalog():
+    picks = [
+        {"city": "Atlantis", "price": 1, "reason": "myth"},
+        {"city": "tokyo", "price": 900, "reason": "too pricey"},
+        {"city": "paris", "price": 1, "reason": "  art   and love "},
+        {"city": "Paris", "price": 300, "reason": "again"},
+    ]
+    valid, problems = structured.validate(picks, DESTINATIONS, 700)
+    assert valid == [{"city": "Paris", "price": 300, "reason": "art and love"}]
+    assert problems == ["unknown_city", "over_budget", "price_corrected", "duplicate"]
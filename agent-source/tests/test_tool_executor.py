@@ -0,0 +1,31 @@
+import pytest
+
+from tool_executor import ToolExecutor
+
+DESTINATIONS = [
+    {"city": f"City{i}", "price": 100 + i, "tags": ["Sun", "City"] if i % 2 else ["Nature"]} for i in range(50)
+]
+ARGS = {"max_budget": 1000, "vibes": ["Sun"]}
+
+
+def test_pooled_call_matches_inline():
+    executor = ToolExecutor(DESTINATIONS, max_workers=1, inline_threshold=0)
+    executor.start()
+    try:
+        pooled = executor.run("search_destinations", ARGS)
+        assert executor.metrics()["pool_calls"] == 1
+    finally:
+        executor.shutdown()
+    assert pooled == ToolExecutor(DESTINATIONS).run("search_destinations", ARGS)
+
+
+def test_pooled_call_times_out():
+    executor = ToolExecutor(DESTINATIONS, max_workers=1, inline_threshold=0)
+    executor.start()
+    try:
+        # Starting the worker process alone takes longer than this
+        with pytest.raises(TimeoutError):
+            executor.run("search_destinations", ARGS, timeout=0.0001)
+        assert executor.metrics()["pool_timeouts"] == 1
+    finally:
+        executor.shutdown()
@@ -0,0 +1,253 @@
+"""
+Request-Scoped Tracing
+======================
+
+Minimal OpenTelemetry-compatible tracer: W3C `traceparent` propagation,
+spans carrying OTel field names (trace_id, span_id, parent_span_id,
+start/end_time_unix_nano, attributes, status), and a JSONL exporter that
+stands in for a collector.
+
+The backend opens a trace and the agent joins it through traceparent, so
+both deploy units ship this module; backend/tests/test_shared_modules.py
+fails if the two copies differ. Stdlib only.
+
+Tracing is off unless ZODIAC_TRACE_FILE is set (a path, or "-" for stdout,
+which lands in Cloud Logging on Agent Engine / Cloud Run).
+
+Usage:
+    tracer = Tracer("backend")
+    with tracer.span("POST /chat", traceparent=incoming) as span:
+        with tracer.span("auth"):
+            ...
+        payload["traceparent"] = span.traceparent()
+
+CLI (latency waterfall, merging spans from several files):
+    python tracing.py list backend_spans.jsonl
+    python tracing.py waterfall <trace_id> backend_spans.jsonl agent_spans.jsonl
+"""
+
+import contextvars
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+
+_current_span = contextvars.ContextVar("zodiac_current_span", default=None)
+
+
+def parse_traceparent(value: str):
+    """Parse a W3C traceparent header into (trace_id, parent_span_id), or None."""
+    try:
+        version, trace_id, span_id, flags = value.strip().split("-")
+        if len(trace_id) == 32 and len(span_id) == 16 and int(trace_id, 16) and int(span_id, 16):
+            return trace_id, span_id
+    except (AttributeError, ValueError):
+        pass
+    return None
+
+
+class JsonlExporter:
+    """Appends finished spans as JSON lines to a file (or stdout for "-")."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: dict) -> None:
+        line = json.dumps(span, default=str)
+        with self._lock:
+            if self.path == "-":
+                print(line, flush=True)
+                return
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class Span:
+    """A timed operation. Use via `Tracer.span()`."""
+
+    def __init__(self, tracer, name: str, trace_id: str, parent_span_id: str, attributes: dict):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.attributes = dict(attributes or {})
+        self.status = "OK"
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._token = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, exc: BaseException) -> None:
+        self.status = "ERROR"
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)[:500]
+
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_error(exc)
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "service": self.tracer.service,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class _NoopSpan:
+    """Returned when tracing is disabled; keeps call sites branch-free."""
+
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def record_error(self, exc):
+        pass
+
+    def traceparent(self):
+        return None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """Creates spans for one service and hands finished spans to an exporter."""
+
+    def __init__(self, service: str, exporter=None):
+        self.service = service
+        if exporter is None and os.environ.get("ZODIAC_TRACE_FILE"):
+            exporter = JsonlExporter(os.environ["ZODIAC_TRACE_FILE"])
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def span(self, name: str, attributes: dict = None, traceparent: str = None):
+        """Start a span under the current span, or under `traceparent` if given.
+
+        With neither, a new trace is started.
+        """
+        if self.exporter is None:
+            return _NOOP
+        parent = _current_span.get()
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if remote:
+            trace_id, parent_id = remote
+        elif isinstance(parent, Span):
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_id = secrets.token_hex(16), None
+        return Span(self, name, trace_id, parent_id, attributes)
+
+    def _finish(self, span: Span) -> None:
+        try:
+            self.exporter.export(span.to_dict())
+        except Exception:
+            pass  # tracing must never break a request
+
+
+def current_span():
+    return _current_span.get() or _NOOP
+
+
+# --- CLI ---
+def load_spans(paths: list) -> list:
+    spans = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("{"):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if "trace_id" in record and "span_id" in record:
+                        spans.append(record)
+    return spans
+
+
+def print_waterfall(spans: list, trace_id: str, width: int = 40) -> None:
+    spans = [s for s in spans if s["trace_id"].startswith(trace_id)]
+    if not spans:
+        print(f"No spans found for trace {trace_id}")
+        return
+    start = min(s["start_time_unix_nano"] for s in spans)
+    end = max(s["end_time_unix_nano"] or s["start_time_unix_nano"] for s in spans)
+    total = max(1, end - start)
+
+    children = {}
+    ids = {s["span_id"] for s in spans}
+    for s in sorted(spans, key=lambda s: s["start_time_unix_nano"]):
+        parent = s["parent_span_id"] if s["parent_span_id"] in ids else None
+        children.setdefault(parent, []).append(s)
+
+    print(f"trace {spans[0]['trace_id']}  {total / 1e6:.1f} ms  {len(spans)} spans")
+    label_width = 44
+
+    def walk(parent, depth):
+        for s in children.get(parent, []):
+            offset = int((s["start_time_unix_nano"] - start) / total * width)
+            span_end = s["end_time_unix_nano"] or s["start_time_unix_nano"]
+            length = max(1, int((span_end - s["start_time_unix_nano"]) / total * width))
+            bar = " " * offset + "█" * min(length, width - offset)
+            label = f"{'  ' * depth}{s['name']} [{s.get('service', '?')}]"
+            flag = " ❌" if s.get("status") == "ERROR" else ""
+            print(f"{label[:label_width]:<{label_width}} |{bar:<{width}}| "
+                  f"{(s['start_time_unix_nano'] - start) / 1e6:8.1f} +{(span_end - s['start_time_unix_nano']) / 1e6:8.1f} ms{flag}")
+            walk(s["span_id"], depth + 1)
+
+    walk(None, 0)
+
+
+def print_trace_list(spans: list, limit: int = 20) -> None:
+    roots = [s for s in spans if not s["parent_span_id"]]
+    roots.sort(key=lambda s: s["start_time_unix_nano"], reverse=True)
+    for s in roots[:limit]:
+        duration = ((s["end_time_unix_nano"] or s["start_time_unix_nano"]) - s["start_time_unix_nano"]) / 1e6
+        print(f"{s['trace_id']}  {duration:9.1f} ms  {s['name']} [{s.get('service', '?')}]")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == "list":
+        print_trace_list(load_spans(sys.argv[2:]))
+    elif len(sys.argv) >= 4 and sys.argv[1] == "waterfall":
+        print_waterfall(load_spans(sys.argv[3:]), sys.argv[2])
+    else:
+        print(__doc__)
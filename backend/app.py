@@ -1,6 +1,14 @@
 import os
+import secrets
+import time
+import threading
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from datetime import timezone
+from typing import Optional
+from fastapi import FastAPI, HTTPException, Header, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import requests
@@ -8,12 +16,46 @@ import json
 import sys
 import google.auth
 from google.auth.transport.requests import Request
+from retry_policy import Deadline, RetryPolicy
+from scheduler import model_scheduler
+from model_router import ESCALATION_MODEL_NAME, ModelRouter, avg_logprob, validate_reply
+from shared_state import store
+from fast_json import chat_response, dumps, extract_output
+import catalog
+import compression
+import conversation_log
+import rate_limit
+import memory_diag
+import engine_router
+import health
+import idempotency
+from tracing import Tracer, current_span
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Zodiac Travel Agent API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up before accepting traffic so the first user after a scale-up
+    # does not pay for imports, auth and model construction.
+    await asyncio.to_thread(warm_up)
+    if memory_diag.ENABLED:
+        memory_diagnostics.start()
+    transcripts.start()
+    upstream_probe.start()
+    purger = asyncio.create_task(purge_expired_state()) if STATE_PURGE_INTERVAL_SECONDS > 0 else None
+    yield
+    if purger is not None:
+        purger.cancel()
+    await upstream_probe.close()
+    # Flush queued transcripts before the worker exits
+    await transcripts.close()
+
+app = FastAPI(title="Zodiac Travel Agent API", lifespan=lifespan)
+
+# Negotiated gzip/br/zstd for request and response bodies (long histories, mobile clients)
+app.add_middleware(compression.CompressionMiddleware)
 
 # Allow CORS for frontend
 app.add_middleware(
@@ -33,10 +75,166 @@ AGENT_ID = "3538706705741250560"
 # Using IAM Auth instead of API Key
 REASONING_ENGINE_URL = f"https://us-central1-aiplatform.googleapis.com/v1beta1/projects/{PROJECT_ID}/locations/{LOCATION}/reasoningEngines/{AGENT_ID}:query"
 
+# Upstream retry budget: never wait longer than the client (or this cap) allows
+ENGINE_DEADLINE_SECONDS = float(os.environ.get("ZODIAC_ENGINE_DEADLINE", "45"))
+ENGINE_RETRY_POLICY = RetryPolicy(
+    attempts=3,
+    base_delay=0.25,
+    max_delay=2.0,
+    attempt_timeout=40.0,
+    # Hedging duplicates the query upstream; only enable for idempotent engines
+    hedge=os.environ.get("ZODIAC_ENGINE_HEDGE", "0") == "1",
+)
+
+# Upstream engines (ZODIAC_ENGINES, default: the engine above); affinity is shared across workers
+engines = engine_router.from_env(REASONING_ENGINE_URL, store=store)
+# Google auth for upstream calls (disable only for local fake engines)
+ENGINE_AUTH = os.environ.get("ZODIAC_ENGINE_AUTH", "1") == "1"
+
+# Gzip query payloads sent to Agent Engine (opt-in: enable once the endpoint is verified to accept them)
+ENGINE_GZIP = os.environ.get("ZODIAC_ENGINE_GZIP", "0") == "1"
+
+# Request-scoped spans (enabled by ZODIAC_TRACE_FILE); propagated to the agent via traceparent
+tracer = Tracer("backend")
+
+# Expired shared-state keys are swept this often (MemoryStore otherwise only drops a key when it is read again)
+STATE_PURGE_INTERVAL_SECONDS = float(os.environ.get("ZODIAC_STATE_PURGE_INTERVAL", "60"))
+
+# Per-user and global quotas, charged in expected model calls per turn
+rate_limiter = rate_limit.from_env()
+
+# Retried /chat requests (same Idempotency-Key) replay the original reply instead of re-running it
+idempotency_cache = idempotency.IdempotencyCache(store)
+
+# Chat transcripts: queued per turn, written in compressed batches off the request path (ZODIAC_CONVERSATION_LOG_DIR)
+transcripts = conversation_log.from_env()
+
+# Leak hunting: tracemalloc snapshots served at /debug/memory (ZODIAC_MEMORY_DIAG=1)
+memory_diagnostics = memory_diag.MemoryDiagnostics()
+
+FALLBACK_MODEL_NAME = "gemini-2.5-flash-lite"
+# Fallback cascade: simple turns on the lite model, hard or failed ones escalate (ZODIAC_CASCADE)
+fallback_router = ModelRouter([FALLBACK_MODEL_NAME, ESCALATION_MODEL_NAME])
+# Fire a one-token priming request at startup (costs one model call per instance)
+WARMUP_PRIME = os.environ.get("ZODIAC_WARMUP_PRIME", "0") == "1"
+
+_credentials = None
+_auth_lock = threading.Lock()
+_fallback_models = {}
+startup_report = {}
+
+# Refresh this long before expiry so in-flight requests never carry a dead token
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+
 def get_auth_token():
-    creds, _ = google.auth.default()
-    creds.refresh(Request())
-    return creds.token
+    # Kept in this process only: a bearer token must never land in the shared
+    # store (a tmpfs file or Redis other local processes can read). Each worker
+    # refreshes once per expiry window.
+    global _credentials
+    with _auth_lock:
+        if _credentials is None:
+            _credentials, _ = google.auth.default()
+        expiry = _credentials.expiry
+        # google-auth reports expiry as a naive UTC datetime
+        expiring = expiry is not None and \
+            expiry.replace(tzinfo=timezone.utc).timestamp() - time.time() <= TOKEN_REFRESH_MARGIN_SECONDS
+        if not _credentials.valid or expiring:
+            _credentials.refresh(Request())
+        return _credentials.token
+
+async def purge_expired_state():
+    """Delete expired shared-state keys every STATE_PURGE_INTERVAL_SECONDS (lifespan task)."""
+    while True:
+        await asyncio.sleep(STATE_PURGE_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(store.purge_expired)
+        except Exception as e:
+            # The store may be busy (SQLite lock timeout); try again next round
+            logger.warning(f"Purging expired state failed: {e}")
+
+def get_fallback_model(name: str = FALLBACK_MODEL_NAME):
+    if name not in _fallback_models:
+        from vertexai.generative_models import GenerativeModel
+        import vertexai
+        vertexai.init(project=PROJECT_ID, location=LOCATION)
+        _fallback_models[name] = GenerativeModel(name)
+    return _fallback_models[name]
+
+def _warm_auth():
+    phase = time.perf_counter()
+    try:
+        get_auth_token()
+        startup_report["auth_seconds"] = time.perf_counter() - phase
+        startup_report.pop("auth_error", None)
+    except Exception as e:
+        startup_report["auth_error"] = str(e)
+
+def _warm_model():
+    phase = time.perf_counter()
+    try:
+        model = get_fallback_model()
+        startup_report["model_seconds"] = time.perf_counter() - phase
+        startup_report.pop("model_error", None)
+        if WARMUP_PRIME:
+            phase = time.perf_counter()
+            model.generate_content("Hi", generation_config={"max_output_tokens": 1})
+            startup_report["prime_seconds"] = time.perf_counter() - phase
+    except Exception as e:
+        startup_report["model_error"] = str(e)
+
+def _warm_catalog():
+    phase = time.perf_counter()
+    catalog.search_index(CATALOG_DESTINATIONS)
+    catalog.fare_calendar(CATALOG_DESTINATIONS)
+    startup_report["catalog_seconds"] = time.perf_counter() - phase
+
+# Warm-up phases, keyed by the readiness check each one satisfies
+WARM_UP_PHASES = {"auth_token": _warm_auth, "fallback_model": _warm_model, "catalog": _warm_catalog}
+
+def warm_up():
+    """Pre-import, pre-authenticate and build the fallback model; records phase timings."""
+    started = time.perf_counter()
+    for phase in WARM_UP_PHASES.values():
+        phase()
+    startup_report["total_seconds"] = time.perf_counter() - started
+    logger.info(f"Warm-up complete: {startup_report}")
+    return startup_report
+
+# --- Health ---
+# Warm state a replica needs before it should take traffic (GET /health/ready)
+readiness = health.Readiness()
+
+def _auth_ready():
+    if not ENGINE_AUTH:
+        return True, "engine auth disabled"
+    if _credentials is not None and _credentials.valid:
+        return True, "credentials valid"
+    return False, startup_report.get("auth_error", "no token yet")
+
+readiness.add_check("auth_token", _auth_ready)
+readiness.add_check("fallback_model", lambda: (FALLBACK_MODEL_NAME in _fallback_models,
+                                               startup_report.get("model_error", FALLBACK_MODEL_NAME)))
+readiness.add_check("catalog", lambda: ("catalog_seconds" in startup_report, f"{len(CATALOG_DESTINATIONS)} destinations"))
+
+def probe_headers() -> dict:
+    """Headers for one probe round; fetching the token here also keeps it fresh."""
+    return {"Authorization": f"Bearer {get_auth_token()}"} if ENGINE_AUTH else {}
+
+def probe_engine(url: str, timeout: float, headers: dict) -> int:
+    """GET the engine resource (metadata only, no model call)."""
+    resource_url = url[:-len(":query")] if url.endswith(":query") else url
+    return requests.get(resource_url, headers=headers, timeout=timeout).status_code
+
+def rewarm():
+    """Rerun the warm-up phases whose readiness checks fail (runs after each probe round)."""
+    for name, check in readiness.report()["checks"].items():
+        if not check["ok"] and name in WARM_UP_PHASES:
+            WARM_UP_PHASES[name]()
+
+upstream_probe = health.UpstreamProbe(
+    lambda: [(e.name, e.url) for e in engines.endpoints.values()], probe_engine,
+    headers=probe_headers, on_tick=rewarm,
+)
 
 class ChatRequest(BaseModel):
     user_id: str
@@ -48,84 +246,388 @@ class ChatResponse(BaseModel):
     response: str
     session_id: str
 
+def post_to_engine(payload: dict, headers: dict, deadline: Deadline, session_key: str = None):
+    body = dumps(payload)
+    compression.upstream_raw_bytes.observe(len(body))
+    if ENGINE_GZIP:
+        body, extra_headers = compression.gzip_body(body)
+        headers = {**headers, **extra_headers}
+    compression.upstream_wire_bytes.observe(len(body))
+    tried = []
+    
+    def attempt(timeout):
+        # Retries fail over to the next-best endpoint
+        endpoint = engines.choose(session_key, exclude=tried)
+        tried.append(endpoint.name)
+        with tracer.span("engine.attempt", {"timeout_s": round(timeout, 3), "engine": endpoint.name}) as span:
+            started = time.perf_counter()
+            try:
+                response = requests.post(endpoint.url, data=body, headers=headers, timeout=timeout)
+            except Exception:
+                engines.record(endpoint, time.perf_counter() - started, ok=False)
+                raise
+            ok = response.status_code < 500 and response.status_code != 429
+            engines.record(endpoint, time.perf_counter() - started, ok=ok, session_key=session_key)
+            span.set_attribute("http.status_code", response.status_code)
+            return response
+    
+    with tracer.span("engine.query", {"bytes": len(body)}):
+        return ENGINE_RETRY_POLICY.call(attempt, deadline)
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, x_client_timeout_ms: Optional[int] = Header(None),
+               traceparent: Optional[str] = Header(None), idempotency_key: Optional[str] = Header(None)):
+    attributes = {"user_id": request.user_id, "history_len": len(request.history)}
+    with tracer.span("POST /chat", attributes, traceparent=traceparent) as span:
+        if idempotency_key:
+            response = await idempotent_chat(request, idempotency_key, x_client_timeout_ms)
+        else:
+            response = await handle_chat(request, x_client_timeout_ms)
+        span.set_attribute("http.status_code", response.status_code)
+        if span.trace_id:
+            response.headers["X-Trace-Id"] = span.trace_id
+        return response
+
+async def idempotent_chat(request: ChatRequest, key: str, x_client_timeout_ms: Optional[int] = None):
+    """`handle_chat()` at most once per Idempotency-Key; duplicates get the original reply."""
+    executed = {}
+    
+    async def compute():
+        response = await handle_chat(request, x_client_timeout_ms)
+        executed["response"] = response
+        storable = response.status_code == 200 and "no-store" not in response.headers.get("cache-control", "")
+        return response.status_code, response.body, storable
+    
     try:
-        # Determine strict message to send
-        # We rely on the Agent's handling of 'history' now for memory.
-        # But we still send CRITICAL instructions in the message to ensure adherence.
-        
-        final_input_message = (
-            "CRITICAL INSTRUCTIONS:\n"
-            "- **TONE**: Be exciting, cosmic, and engaging! Use emojis (e.g., ✨, 🌌, ✈️) to make the response feel magical.\n"
-            "- **FORMAT**: Your itineraries MUST be presented as a simple list of single-line items. Do NOT use complex markdown or paragraphs for the itinerary list. \n"
-            "  - Example: `• Day 1: Arrive in Paris and visit the Eiffel Tower`\n"
-            "- **CONTEXT**: Do NOT explicitly state the user's star sign as a fact (e.g., 'You are a Leo'). Instead, subtly weave it in.\n"
-            "- **BUDGET**: If budget is not known, ASK for it.\n"
-            f"\nUser Message: {request.message}"
+        status, body, replayed = await idempotency_cache.run(
+            request.user_id, key, idempotency.fingerprint(request.message, request.session_id or ""),
+            compute, wait_seconds=ENGINE_DEADLINE_SECONDS,
+        )
+    except idempotency.IdempotencyConflict as e:
+        return JSONResponse(status_code=422, content={"detail": str(e)})
+    except idempotency.RequestInProgress as e:
+        return JSONResponse(status_code=409, content={"detail": str(e)}, headers={"Retry-After": "1"})
+    if not replayed:
+        return executed["response"]
+    current_span().set_attribute("idempotent_replay", True)
+    return Response(content=body, status_code=status, media_type="application/json", headers={"Idempotent-Replayed": "true"})
+
+async def handle_chat(request: ChatRequest, x_client_timeout_ms: Optional[int] = None):
+    try:
+        await asyncio.to_thread(
+            rate_limiter.acquire, request.user_id, rate_limit.estimate_cost(request.message, request.history),
         )
+    except rate_limit.RateLimitExceeded as e:
+        retry_after = max(1, int(e.retry_after + 0.999))
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(e), "scope": e.scope, "retry_after": retry_after},
+            headers={"Retry-After": str(retry_after)},
+        )
+    
+    started = time.perf_counter()
+    try:
+        budget = ENGINE_DEADLINE_SECONDS
+        if x_client_timeout_ms:
+            budget = min(budget, x_client_timeout_ms / 1000.0)
+        reply = await generate_reply(request, Deadline(budget))
+        await log_turn("http", request, reply, started)
+        # Trusted internal data: pre-serialized, skipping response_model validation
+        return chat_response(reply, request.user_id)
+
+    except Exception as e:
+        logger.error(f"Error during chat: {e}")
+        current_span().record_error(e)
+        await log_turn("http", request, None, started, error=str(e))
+        response = chat_response(error_reply(e), "error")
+        # Never replay an error to a retry (idempotency) or from any cache
+        response.headers["Cache-Control"] = "no-store"
+        return response
+
+async def log_turn(channel: str, request: ChatRequest, reply: Optional[str], started: float, error: str = None):
+    """Queue one turn's transcript record (never waits on disk)."""
+    if not transcripts.enabled:
+        return
+    await transcripts.log_async({
+        "channel": channel,
+        "session_id": request.session_id or request.user_id,
+        "user_id": request.user_id,
+        "message": request.message,
+        "reply": reply,
+        "error": error,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+        "trace_id": current_span().trace_id,
+    })
+
+def error_reply(e: Exception) -> str:
+    return (
+        "✨ **Cosmic Connection Issue** ✨\n\n"
+        "The stars are a bit cloudy (Agent functionality is limited). \n"
+        f"Error: {str(e)}\n\n"
+        "Try again later! 🌌"
+    )
 
-        query_payload = {
-            "class_method": "query",
+async def generate_reply(request: ChatRequest, deadline: Deadline) -> str:
+    """Run one chat turn upstream (Agent Engine, else the fallback model) and return the reply text."""
+    # Determine strict message to send
+    # We rely on the Agent's handling of 'history' now for memory.
+    # But we still send CRITICAL instructions in the message to ensure adherence.
+    
+    final_input_message = (
+        "CRITICAL INSTRUCTIONS:\n"
+        "- **TONE**: Be exciting, cosmic, and engaging! Use emojis (e.g., ✨, 🌌, ✈️) to make the response feel magical.\n"
+        "- **FORMAT**: Your itineraries MUST be presented as a simple list of single-line items. Do NOT use complex markdown or paragraphs for the itinerary list. \n"
+        "  - Example: `• Day 1: Arrive in Paris and visit the Eiffel Tower`\n"
+        "- **CONTEXT**: Do NOT explicitly state the user's star sign as a fact (e.g., 'You are a Leo'). Instead, subtly weave it in.\n"
+        "- **BUDGET**: If budget is not known, ASK for it.\n"
+        f"\nUser Message: {request.message}"
+    )
+
+    query_payload = {
+        "class_method": "query",
+        "input": {
             "input": {
-                "input": {
-                    "message": final_input_message, 
-                    "user_id": request.user_id,
-                    "history": request.history # Pass the full history!
-                }
+                "message": final_input_message, 
+                "user_id": request.user_id,
+                # The agent keeps one chat per session (its model-side memory)
+                "session_id": request.session_id or request.user_id,
+                "history": request.history, # Pass the full history!
+                "deadline_ms": int(deadline.remaining() * 1000),
+                "traceparent": current_span().traceparent(),
             }
         }
+    }
+    
+    headers = {"Content-Type": "application/json"}
+    if ENGINE_AUTH:
+        with tracer.span("auth"):
+            # May hit the shared store (SQLite) or refresh credentials: both block
+            headers["Authorization"] = f"Bearer {await asyncio.to_thread(get_auth_token)}"
+    
+    session_key = request.session_id or request.user_id
+    logger.info(f"Sending contextualized query to Cloud Agent (session {session_key})")
+    response = await asyncio.to_thread(post_to_engine, query_payload, headers, deadline, session_key)
+    
+    if response.status_code != 200:
+        logger.warning(f"Agent Engine failed params ({response.status_code}), switching to Fallback Gemini: {response.text}")
+        # Fallback: Use generic Gemini model directly for the demo
+        try:
+            return await fallback_reply(request, deadline, session_key)
+        except Exception as e2:
+            raise Exception(f"Fallback failed too: {str(e2)}")
         
-        token = get_auth_token()
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Content-Type": "application/json"
-        }
-        
-        logger.info(f"Sending contextualized query to Cloud Agent: {AGENT_ID}")
-        response = requests.post(REASONING_ENGINE_URL, json=query_payload, headers=headers)
-        
-        if response.status_code != 200:
-            logger.warning(f"Agent Engine failed params ({response.status_code}), switching to Fallback Gemini: {response.text}")
-            # Fallback: Use generic Gemini model directly for the demo
-            from vertexai.generative_models import GenerativeModel
-            import vertexai
+    # Parse Response
+    # The agent returns {"output": ...}; only that field is decoded, and
+    # nested output (common with reasoning engines) is unwrapped.
+    with tracer.span("parse", {"bytes": len(response.content)}):
+        return extract_output(response.content)
+
+async def fallback_reply(request: ChatRequest, deadline: Deadline, session_key: str) -> str:
+    """Answer directly from the fallback model cascade, escalating replies that fail validation."""
+    tier = fallback_router.choose(request.message)
+    while True:
+        name = fallback_router.tiers[tier]
+        with tracer.span("fallback.model", {"model": name}):
+            # Send the clean message (without critical instruction overhead for raw model)
+            fallback_chat = get_fallback_model(name).start_chat()
+            # /chat is interactive: it takes the next free slot ahead of queued batch work
+            async with model_scheduler.slot_async(deadline, priority="interactive", tenant=request.user_id or session_key):
+                started = time.perf_counter()
+                fallback_resp = await asyncio.to_thread(fallback_chat.send_message, request.message)
+        fallback_router.record_call(name, time.perf_counter() - started, fallback_resp, len(request.message))
+        problem = validate_reply(request.message, fallback_resp.text, avg_logprob(fallback_resp))
+        if problem is None or not fallback_router.can_escalate(tier):
+            fallback_router.record_turn(tier)
+            return fallback_resp.text
+        fallback_router.record_escalation(tier, problem)
+        tier += 1
+
+# --- WebSocket chat ---
+# Replies are streamed in chunks of about this many characters
+STREAM_CHUNK_CHARS = 120
+# History messages kept per connection (the oldest are dropped first)
+WS_HISTORY_MESSAGES = int(os.environ.get("ZODIAC_WS_HISTORY", "40"))
+
+def reply_chunks(text: str, size: int = STREAM_CHUNK_CHARS) -> list:
+    """Split a reply into line-aligned chunks for streaming (concatenation gives the text back)."""
+    chunks = []
+    for line in text.splitlines(keepends=True):
+        while len(line) > size:
+            cut = line.rfind(" ", 0, size) + 1 or size
+            chunks.append(line[:cut])
+            line = line[cut:]
+        if chunks and len(chunks[-1]) + len(line) <= size:
+            chunks[-1] += line
+        else:
+            chunks.append(line)
+    return chunks
+
+@app.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    """Persistent chat: one session per connection, streamed replies, cancel-on-new-message.
+    
+    Client frames: {"type": "message", "message": "...", "user_id": "..."} or {"type": "cancel"}.
+    Server frames: start, delta (text chunk), done (full reply), cancelled, error.
+    A message sent while a reply is still generating cancels that turn first.
+    """
+    await websocket.accept()
+    session = {"session_id": secrets.token_hex(8), "user_id": None, "history": []}
+    turn = {"id": 0, "task": None, "deadline": None}
+    
+    async def run_turn(turn_id: int, request: ChatRequest, deadline: Deadline):
+        with tracer.span("WS turn", {"user_id": request.user_id, "turn": turn_id}) as span:
             try:
-                vertexai.init(project=PROJECT_ID, location=LOCATION)
-                model = GenerativeModel("gemini-2.5-flash-lite")
-                # Send the clean message (without critical instruction overhead for raw model)
-                fallback_chat = model.start_chat()
-                fallback_resp = fallback_chat.send_message(request.message)
-                return ChatResponse(response=fallback_resp.text, session_id=request.user_id)
-            except Exception as e2:
-                raise Exception(f"Fallback failed too: {str(e2)}")
-            
-        resp_json = response.json()
-        
-        # Parse Response
-        # The agent returns {"output": ...}
-        agent_output = resp_json.get('output', "No response.")
-        
-        # If output is nested (common with reasoning engines), try to extract text
-        if isinstance(agent_output, dict):
-             agent_output = agent_output.get('output', str(agent_output))
-             
-        return ChatResponse(response=str(agent_output), session_id=request.user_id)
+                await asyncio.to_thread(
+                    rate_limiter.acquire, request.user_id, rate_limit.estimate_cost(request.message, request.history),
+                )
+            except rate_limit.RateLimitExceeded as e:
+                await websocket.send_json({"type": "error", "turn": turn_id, "detail": str(e), "retry_after": e.retry_after})
+                return
+            await websocket.send_json({"type": "start", "turn": turn_id, "trace_id": span.trace_id})
+            started = time.perf_counter()
+            failed = False
+            try:
+                reply = await generate_reply(request, deadline)
+                await log_turn("ws", request, reply, started)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error during websocket chat: {e}")
+                span.record_error(e)
+                await log_turn("ws", request, None, started, error=str(e))
+                reply, failed = error_reply(e), True
+            for chunk in reply_chunks(reply):
+                await websocket.send_json({"type": "delta", "turn": turn_id, "text": chunk})
+            if not failed:
+                # Error text is for the user, not context for the next turn
+                history = session["history"] + [{"role": "user", "content": request.message}, {"role": "agent", "content": reply}]
+                session["history"] = history[-WS_HISTORY_MESSAGES:]
+            await websocket.send_json({"type": "done", "turn": turn_id, "response": reply})
+    
+    async def cancel_current():
+        task = turn["task"]
+        if task is None or task.done():
+            return
+        # Stop retries upstream, then abandon the turn (a running HTTP attempt is discarded)
+        turn["deadline"].cancel()
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
+        await websocket.send_json({"type": "cancelled", "turn": turn["id"]})
+    
+    try:
+        while True:
+            frame = await websocket.receive_json()
+            if not isinstance(frame, dict) or not all(isinstance(frame.get(k) or "", str) for k in ("message", "user_id")):
+                await websocket.send_json({"type": "error", "detail": 'Frames must be JSON objects like {"type": "message", "message": "..."}'})
+                continue
+            await cancel_current()
+            if frame.get("type") == "cancel" or not frame.get("message"):
+                continue
+            session["user_id"] = frame.get("user_id") or session["user_id"] or "anonymous"
+            request = ChatRequest(
+                user_id=session["user_id"],
+                message=frame["message"],
+                session_id=session["session_id"],
+                history=session["history"] + [{"role": "user", "content": frame["message"]}],
+            )
+            turn["id"] += 1
+            turn["deadline"] = Deadline(ENGINE_DEADLINE_SECONDS)
+            turn["task"] = asyncio.create_task(run_turn(turn["id"], request, turn["deadline"]))
+    except (WebSocketDisconnect, ValueError):
+        # ValueError: a non-JSON frame; close like a disconnect
+        pass
+    finally:
+        task = turn["task"]
+        if task is not None and not task.done():
+            turn["deadline"].cancel()
+            task.cancel()
 
-    except Exception as e:
-        logger.error(f"Error during chat: {e}")
-        mock_response = (
-            "✨ **Cosmic Connection Issue** ✨\n\n"
-            "The stars are a bit cloudy (Agent functionality is limited). \n"
-            f"Error: {str(e)}\n\n"
-            "Try again later! 🌌"
+# Built-in destination catalog (same rows the agent searches)
+CATALOG_DESTINATIONS = catalog.default_catalog()["destinations"]
+
+def _csv(value: Optional[str]) -> list:
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
+@app.get("/destinations")
+def destinations(
+    max_price: Optional[int] = None,
+    min_price: Optional[int] = None,
+    vibes: Optional[str] = None,
+    tags: Optional[str] = None,
+    any_tags: Optional[str] = None,
+    matches_only: bool = False,
+    limit: int = catalog.DEFAULT_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+):
+    """Ranked destination search; pass `next_cursor` back as `cursor` for the next page.
+
+    vibes, tags (all required) and any_tags (at least one) are comma-separated.
+    With date_from/date_to (YYYY-MM-DD) each row is priced at its cheapest fare in that window.
+    """
+    try:
+        return catalog.search(
+            CATALOG_DESTINATIONS, max_price=max_price, min_price=min_price, vibes=_csv(vibes),
+            tags_all=_csv(tags), tags_any=_csv(any_tags), matches_only=matches_only,
+            limit=limit, cursor=cursor, date_from=date_from, date_to=date_to,
         )
-        return ChatResponse(response=mock_response, session_id="error")
+    except ValueError as e:
+        # Includes catalog.InvalidCursor and malformed dates
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/fares")
+def fares(max_price: int, date_from: str, date_to: Optional[str] = None, cities: Optional[str] = None, limit: int = 10):
+    """Cheapest departures at most max_price between date_from and date_to (date_from alone = that day)."""
+    try:
+        return {"fares": catalog.cheapest_fares(CATALOG_DESTINATIONS, max_price, date_from, date_to, _csv(cities), limit)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/health/live")
+def health_live():
+    """Liveness: the worker's event loop answers (no dependency checks)."""
+    return {"status": "alive", "uptime_s": round(time.time() - readiness.started_at, 1)}
+
+@app.get("/health/ready")
+def health_ready():
+    """Readiness: 200 once this worker is warm, else 503 with the missing pieces."""
+    report = readiness.report()
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
 
 @app.get("/health")
-def health():
-    return {"status": "ok"}
+def health_status():
+    """Overall status ("starting", "degraded" or "ok") with warm state, circuits and probe latencies."""
+    report = readiness.report()
+    summary = health.overall_status(report, engines.snapshot(), upstream_probe)
+    body = dict(summary, checks=report["checks"], upstream=upstream_probe.snapshot())
+    # Degraded replicas still answer (fallback model); only cold ones are taken out of rotation
+    return JSONResponse(status_code=503 if summary["status"] == "starting" else 200, content=body)
+
+@app.get("/metrics")
+def metrics():
+    return {
+        "transport": compression.stats(),
+        "engine_retries": ENGINE_RETRY_POLICY.stats,
+        "rate_limit": rate_limiter.stats,
+        "idempotency": idempotency_cache.snapshot(),
+        "engines": engines.snapshot(),
+        "model_queue": model_scheduler.snapshot(),
+        "fallback_models": fallback_router.snapshot(),
+        "conversation_log": transcripts.snapshot(),
+    }
+
+@app.get("/debug/memory")
+def debug_memory():
+    """tracemalloc growth sites, RSS and object counts for this worker (ZODIAC_MEMORY_DIAG=1 only)."""
+    if not memory_diag.ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return memory_diagnostics.report(extra={"shared_state_keys": store.size()})
 
 if __name__ == "__main__":
+    # Development server (single process). For production use serve.py.
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
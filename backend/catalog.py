@@ -0,0 +1,809 @@
+"""
+Destination Catalog
+===================
+
+Built-in catalog data (users, destinations, zodiac traits) and the pure
+lookup functions used by the agent's tools.
+
+Vibe matching is fuzzy: model-supplied vibes like "beach", "nightlife" or
+"relaxing" are resolved to catalog tags through a stemmed synonym index
+(`VibeIndex`), built once per loaded catalog.
+
+The lookups live at module level (not as ZodiacTravelAgent methods) so they can be
+shipped to worker processes by `tool_executor.ToolExecutor`.
+
+`search()` is the one ranked search behind every caller (the agents' tools and
+the backend's GET /destinations). Ordering is stable: vibe score, then
+catalog position. Pages are cursor-paginated, rows can be filtered by price
+range and tags, and a result count is estimated from a price/tag index. The
+backend's /destinations and /fares read the same rows as the agent's tools,
+so both ship this file (compared by backend/tests/test_shared_modules.py).
+
+Prices vary by departure date. Each destination row carries a daily fare
+series, `"fares": {"start": "YYYY-MM-DD", "prices": [...]}` (null = no
+fare that day). `fare_calendar()` holds those as int arrays on one shared
+day axis. It answers "cheapest dates under budget in a window" with a
+sparse-table range-minimum index and "destinations under budget on date X"
+with a per-day price-sorted column. Both indexes are built lazily. `search()`
+takes an optional date range and then prices each row at its cheapest fare
+in that window. Without a date range the static `price` applies.
+
+The catalog can also be packaged as a versioned, gzip-compressed JSON artifact
+so the deployed agent pickle only carries a thin loader (see deploy_sdk.py):
+
+    python catalog.py build            # writes zodiac_catalog-v<N>.json.gz
+    python catalog.py inspect <path>
+
+Built-in fare series are not stored in the artifact. They are rebuilt from
+the current day whenever a catalog is built or loaded, so a replica keeps a
+full year of fares however old its deployment is.
+
+Environment:
+    ZODIAC_FARES_START  First day of the built-in fare series, YYYY-MM-DD (default: the day it is built)
+"""
+
+import array
+import base64
+import bisect
+import gzip
+import heapq
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+from datetime import date, timedelta
+
+# Bump whenever the catalog data or artifact layout changes
+CATALOG_VERSION = 3
+ARTIFACT_NAME = f"zodiac_catalog-v{CATALOG_VERSION}.json.gz"
+
+
+# User database (one user per zodiac sign)
+DEFAULT_USER_DATA = {
+    "user_001": {"name": "Alice Sky", "dob": "1995-10-15"},       # Libra
+    "user_002": {"name": "Bob Voyager", "dob": "1988-08-10"},     # Leo
+    "user_003": {"name": "Carol Star", "dob": "1990-03-25"},      # Aries
+    "user_004": {"name": "Diana Moon", "dob": "1992-04-28"},      # Taurus
+    "user_005": {"name": "Ethan Breeze", "dob": "1985-06-15"},    # Gemini
+    "user_006": {"name": "Fiona Tide", "dob": "1993-07-04"},      # Cancer
+    "user_007": {"name": "George Blaze", "dob": "1987-08-22"},    # Leo
+    "user_008": {"name": "Hannah Ivy", "dob": "1991-09-10"},      # Virgo
+    "user_009": {"name": "Ivan Storm", "dob": "1989-11-15"},      # Scorpio
+    "user_010": {"name": "Julia Arrow", "dob": "1994-12-05"},     # Sagittarius
+    "user_011": {"name": "Kevin Peak", "dob": "1986-01-10"},      # Capricorn
+    "user_012": {"name": "Luna Wave", "dob": "1995-02-14"},       # Aquarius
+    "user_013": {"name": "Maya Dream", "dob": "1990-03-05"},      # Pisces
+}
+
+# Destination database
+DEFAULT_DESTINATIONS = [
+    {"city": "Santorini", "price": 450, "tags": ["Luxury", "Sun", "Romantic", "Water"]},
+    {"city": "Bali", "price": 850, "tags": ["Nature", "Spiritual", "Sun", "Water"]},
+    {"city": "Paris", "price": 300, "tags": ["Romantic", "Shopping", "Art", "City"]},
+    {"city": "Tokyo", "price": 900, "tags": ["City", "Foodie", "Tech", "Future"]},
+    {"city": "Tulum", "price": 600, "tags": ["Party", "Sun", "Trendy", "Water"]},
+    {"city": "Lisbon", "price": 250, "tags": ["City", "Sun", "Foodie", "History"]},
+    {"city": "Budapest", "price": 150, "tags": ["City", "Party", "Budget", "History"]},
+    {"city": "Prague", "price": 180, "tags": ["City", "History", "Budget", "Romantic"]},
+    {"city": "Barcelona", "price": 350, "tags": ["City", "Sun", "Art", "Party"]},
+]
+
+# Zodiac traits
+DEFAULT_ZODIAC_TRAITS = {
+    "Aries": "Adventurous, Bold, Energetic",
+    "Taurus": "Luxurious, Sensual, Grounded",
+    "Gemini": "Curious, Social, Versatile",
+    "Cancer": "Nurturing, Emotional, Home-loving",
+    "Leo": "Dramatic, Confident, Creative",
+    "Virgo": "Analytical, Practical, Health-conscious",
+    "Libra": "Artistic, Harmonious, Social",
+    "Scorpio": "Intense, Mysterious, Passionate",
+    "Sagittarius": "Adventurous, Philosophical, Free-spirited",
+    "Capricorn": "Ambitious, Disciplined, Traditional",
+    "Aquarius": "Innovative, Independent, Humanitarian",
+    "Pisces": "Dreamy, Intuitive, Artistic",
+}
+
+# Words that mean a catalog tag. Only tags present in the loaded catalog are indexed.
+VIBE_SYNONYMS = {
+    "Sun": ["sunny", "sunshine", "warm", "hot", "tropical", "summer", "beach"],
+    "Water": ["beach", "sea", "ocean", "coast", "coastal", "island", "swim", "surf", "diving", "snorkeling", "lake"],
+    "Romantic": ["romance", "honeymoon", "couple", "love", "anniversary", "intimate"],
+    "Luxury": ["luxurious", "upscale", "premium", "lavish", "fancy", "spa", "resort", "five star"],
+    "Nature": ["outdoors", "outdoor", "hiking", "jungle", "mountain", "forest", "wildlife", "green", "adventure"],
+    "Spiritual": ["zen", "yoga", "meditation", "wellness", "retreat", "temple", "mindful", "relaxing", "peaceful", "calm"],
+    "Shopping": ["shop", "boutique", "fashion", "market", "mall"],
+    "Art": ["arts", "museum", "gallery", "culture", "cultural", "architecture", "creative"],
+    "City": ["urban", "metropolis", "downtown", "cosmopolitan", "city break"],
+    "Foodie": ["food", "cuisine", "culinary", "gastronomy", "restaurant", "dining", "eat", "wine", "street food"],
+    "Tech": ["technology", "gadget", "innovation", "anime", "gaming"],
+    "Future": ["futuristic", "modern", "innovative"],
+    "Party": ["nightlife", "night life", "clubbing", "club", "bar", "festival", "dance", "dancing", "fun"],
+    "Trendy": ["hip", "hipster", "instagrammable", "stylish", "chic", "cool"],
+    "History": ["historic", "historical", "ancient", "heritage", "castle", "old town", "medieval"],
+    "Budget": ["cheap", "affordable", "inexpensive", "backpacking", "backpacker", "low cost", "economical"],
+}
+
+# Match weights: the tag itself, a listed synonym, a prefix of an indexed word
+EXACT_WEIGHT = 1.0
+SYNONYM_WEIGHT = 0.7
+PREFIX_WEIGHT = 0.5
+# Shorter prefixes match too much ("ro" -> romantic, romance, ...)
+MIN_PREFIX_LENGTH = 4
+
+NO_RESULTS = "No destinations found within that budget."
+NO_VIBE_MATCH = "No destinations match those vibes"
+NO_MORE_RESULTS = "No more destinations for that search."
+
+DEFAULT_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 50
+
+# Built-in fare series: one fare per departure day from today (or ZODIAC_FARES_START),
+# derived from each row's base price
+DEFAULT_FARE_DAYS = 365
+# Stored for days without a fare; larger than any real price, so range minimums skip it
+NO_FARE = 2 ** 31 - 1
+MAX_FARE_RESULTS = 50
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def default_catalog() -> dict:
+    """The built-in catalog as a fresh, mutable dict."""
+    return {
+        "version": CATALOG_VERSION,
+        "user_data": json.loads(json.dumps(DEFAULT_USER_DATA)),
+        "destinations": with_default_fares(json.loads(json.dumps(DEFAULT_DESTINATIONS))),
+        "zodiac_traits": dict(DEFAULT_ZODIAC_TRAITS),
+    }
+
+
+def write_artifact(path: str = ARTIFACT_NAME, data: dict = None) -> dict:
+    """Write a compressed catalog artifact (built-in fare series left out; `load_artifact` rebuilds them).
+
+    Args:
+        path: Output file path
+        data: Catalog dict (defaults to the built-in catalog)
+
+    Returns:
+        {"path", "version", "sha256", "raw_bytes", "compressed_bytes"}
+    """
+    data = dict(data or default_catalog())
+    data["destinations"] = [
+        {k: v for k, v in dest.items() if k != "fares" or not v.get("builtin")} for dest in data["destinations"]
+    ]
+    raw = json.dumps(data, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    compressed = gzip.compress(raw, compresslevel=9, mtime=0)  # mtime=0 keeps builds reproducible
+    with open(path, "wb") as f:
+        f.write(compressed)
+    return {
+        "path": path,
+        "version": data["version"],
+        "sha256": hashlib.sha256(compressed).hexdigest(),
+        "raw_bytes": len(raw),
+        "compressed_bytes": len(compressed),
+    }
+
+
+def load_artifact(path: str = ARTIFACT_NAME) -> dict:
+    """Load a catalog artifact, falling back to this module's directory.
+
+    Raises:
+        FileNotFoundError: If the artifact is in neither location
+        ValueError: If the artifact version does not match CATALOG_VERSION
+    """
+    if not os.path.exists(path):
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.path.basename(path))
+    with gzip.open(path, "rb") as f:
+        data = json.loads(f.read().decode("utf-8"))
+    if data.get("version") != CATALOG_VERSION:
+        raise ValueError(f"Catalog artifact {path} is version {data.get('version')}, expected {CATALOG_VERSION}")
+    with_default_fares(data["destinations"])
+    return data
+
+
+# --- Vibe matching ---
+def stem(word: str) -> str:
+    """Light suffix stripping so "beaches", "relaxing" and "historical" meet their roots."""
+    word = word.lower()
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 7 and word.endswith("al"):
+        return word[:-2]
+    if len(word) > 4 and word.endswith(("ches", "shes", "xes", "sses")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _normalize(phrase: str) -> str:
+    return " ".join(stem(w) for w in _WORD_RE.findall(phrase.lower()))
+
+
+class VibeIndex:
+    """Hash index from stemmed words/phrases to {tag: weight}, plus sorted keys for prefix lookups."""
+
+    def __init__(self, tags, synonyms: dict = None):
+        self._exact = {}
+        synonyms = VIBE_SYNONYMS if synonyms is None else synonyms
+        for tag in tags:
+            self._add(tag, tag, EXACT_WEIGHT)
+            for synonym in synonyms.get(tag, ()):
+                self._add(synonym, tag, SYNONYM_WEIGHT)
+        self._keys = sorted(self._exact)
+        self._cache = {}
+
+    def _add(self, phrase: str, tag: str, weight: float) -> None:
+        key = _normalize(phrase)
+        if key:
+            matches = self._exact.setdefault(key, {})
+            matches[tag] = max(weight, matches.get(tag, 0.0))
+
+    def _prefix(self, key: str) -> dict:
+        matches = {}
+        i = bisect.bisect_left(self._keys, key)
+        while i < len(self._keys) and self._keys[i].startswith(key):
+            for tag in self._exact[self._keys[i]]:
+                matches[tag] = PREFIX_WEIGHT
+            i += 1
+        return matches
+
+    def match(self, vibe: str) -> dict:
+        """Catalog tags a free-text vibe refers to, as {tag: weight} (empty if none)."""
+        key = _normalize(vibe)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        matches = dict(self._exact.get(key, {}))
+        if not matches:
+            # Multi-word vibes ("quiet beach town"): best weight per tag over the words
+            for word in key.split():
+                found = self._exact.get(word) or (self._prefix(word) if len(word) >= MIN_PREFIX_LENGTH else {})
+                for tag, weight in found.items():
+                    matches[tag] = max(weight, matches.get(tag, 0.0))
+        if len(self._cache) < 4096:
+            self._cache[key] = matches
+        return matches
+
+
+_index_lock = threading.Lock()
+_index_slot = (None, None)  # (destinations list, its VibeIndex)
+
+
+def vibe_index(destinations: list) -> VibeIndex:
+    """The VibeIndex for a destinations list, built once per list object."""
+    global _index_slot
+    rows, index = _index_slot
+    if rows is destinations:
+        return index
+    with _index_lock:
+        if _index_slot[0] is not destinations:
+            _index_slot = (destinations, VibeIndex({t for d in destinations for t in d["tags"]}))
+        return _index_slot[1]
+
+
+def rank_destinations(destinations: list, max_budget: int, vibes: list) -> list:
+    """Destinations within budget as (vibe_score, row), best matches first.
+
+    A destination scores, per requested vibe, the best weight of any of its
+    tags for that vibe (exact tag 1.0, synonym 0.7, prefix 0.5). The sort is
+    stable, so equal scores keep catalog order.
+    """
+    # Filter destinations by budget
+    results = [d for d in destinations if d["price"] <= max_budget]
+    if not vibes:
+        return [(0, d) for d in results]
+
+    index = vibe_index(destinations)
+    wanted = [index.match(v) for v in vibes]
+    scored = [(_vibe_score(dest, wanted), dest) for dest in results]
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored
+
+
+def _vibe_score(dest: dict, wanted: list) -> float:
+    return round(sum(max((matches.get(t, 0.0) for t in dest["tags"]), default=0.0) for matches in wanted), 2)
+
+
+# --- Fares by date ---
+def fares_start() -> str:
+    """First day of built-in fare series built now: ZODIAC_FARES_START, else today."""
+    return os.environ.get("ZODIAC_FARES_START") or date.today().isoformat()
+
+
+def default_fares(city: str, price: int, start: str = None, days: int = DEFAULT_FARE_DAYS) -> dict:
+    """A deterministic daily fare series around a base price (season, weekend and per-day noise).
+
+    A date's fare depends only on the city and the date, not on `start`, so
+    replicas started on different days agree on every day they share.
+    The series is marked `builtin` so artifacts do not store it.
+    """
+    start = start or fares_start()
+    first = date.fromisoformat(start)
+    phase = int(hashlib.sha256(city.encode("utf-8")).hexdigest()[:4], 16) % 365
+    prices = []
+    for day in range(days):
+        current = first + timedelta(days=day)
+        season = 1.0 + 0.2 * math.sin(2 * math.pi * (current.timetuple().tm_yday + phase) / 365)
+        weekend = 1.12 if current.weekday() >= 4 else 1.0
+        noise = 0.92 + (hashlib.sha256(f"{city}:{current.isoformat()}".encode("utf-8")).digest()[0] / 255) * 0.16
+        prices.append(int(round(price * season * weekend * noise)))
+    return {"start": start, "prices": prices, "builtin": True}
+
+
+def with_default_fares(destinations: list) -> list:
+    """Give rows without a fare series the built-in one (in place); returns the list."""
+    for dest in destinations:
+        if "fares" not in dest:
+            dest["fares"] = default_fares(dest["city"], dest["price"])
+    return destinations
+
+
+def parse_date(value: str) -> date:
+    """A YYYY-MM-DD date.
+
+    Raises:
+        ValueError: With a message suitable for the caller.
+    """
+    try:
+        return date.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"Invalid date {value!r}; use YYYY-MM-DD")
+
+
+class FareCalendar:
+    """Daily fares for every row on one day axis, with range-minimum and per-day indexes.
+
+    Row fares are `array("i")` (4 bytes per day). Each row's sparse table is
+    built on first use. Level k holds, for every day i, the day with the
+    lowest fare in [i, i + 2**k), so the cheapest day in any window is two
+    lookups. Per-day columns (fares sorted with their row positions) are
+    built on first use too and answer "under budget on date X" by bisection.
+    """
+
+    def __init__(self, destinations: list):
+        series = [(parse_date(d["fares"]["start"]), d["fares"]["prices"]) for d in destinations if d.get("fares")]
+        self.start = min((start for start, _ in series), default=date.today())
+        self.days = max(((start - self.start).days + len(prices) for start, prices in series), default=0)
+        self.fares = []
+        for dest in destinations:
+            row = array.array("i", [NO_FARE]) * self.days
+            if dest.get("fares"):
+                offset = (parse_date(dest["fares"]["start"]) - self.start).days
+                for day, price in enumerate(dest["fares"]["prices"]):
+                    if price is not None:
+                        row[offset + day] = int(price)
+            self.fares.append(row)
+        self._tables = [None] * len(self.fares)
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    def day(self, value) -> int:
+        """Day offset of a date on this calendar (may fall outside [0, days))."""
+        return ((value if isinstance(value, date) else parse_date(value)) - self.start).days
+
+    def date_of(self, day: int) -> str:
+        return (self.start + timedelta(days=day)).isoformat()
+
+    def window(self, date_from, date_to=None) -> tuple:
+        """Inclusive day range for a date window, clipped to the calendar (None if disjoint).
+
+        Raises:
+            ValueError: On a malformed date or a window that ends before it starts.
+        """
+        lo = self.day(date_from)
+        hi = lo if date_to is None else self.day(date_to)
+        if hi < lo:
+            raise ValueError("date_to is before date_from")
+        lo, hi = max(lo, 0), min(hi, self.days - 1)
+        return (lo, hi) if lo <= hi else None
+
+    def _table(self, position: int) -> list:
+        table = self._tables[position]
+        if table is None:
+            fares = self.fares[position]
+            table = [array.array("i", range(self.days))]
+            width = 1
+            while width * 2 <= self.days:
+                prev = table[-1]
+                level = array.array("i", prev[:self.days - width * 2 + 1])
+                for i in range(len(level)):
+                    right = prev[i + width]
+                    if fares[right] < fares[level[i]]:
+                        level[i] = right
+                table.append(level)
+                width *= 2
+            self._tables[position] = table  # concurrent builders produce the same table
+        return table
+
+    def cheapest(self, position: int, lo: int, hi: int) -> tuple:
+        """(fare, day) of a row's cheapest day in [lo, hi]; fare is NO_FARE if it has none."""
+        table = self._table(position)
+        level = (hi - lo + 1).bit_length() - 1
+        left, right = table[level][lo], table[level][hi - (1 << level) + 1]
+        fares = self.fares[position]
+        day = right if fares[right] < fares[left] else left
+        return fares[day], day
+
+    def column(self, day: int) -> tuple:
+        """(fares ascending, row positions) for one day; rows without a fare are left out."""
+        column = self._columns.get(day)
+        if column is None:
+            pairs = sorted((fares[day], position) for position, fares in enumerate(self.fares) if fares[day] != NO_FARE)
+            column = (array.array("i", [p for p, _ in pairs]), array.array("i", [i for _, i in pairs]))
+            with self._lock:
+                self._columns[day] = column
+        return column
+
+    def under_budget_on(self, day: int, max_price: int) -> list:
+        """[(fare, position)] for rows with a fare at most max_price on a day, cheapest first."""
+        prices, positions = self.column(day)
+        end = bisect.bisect_right(prices, max_price)
+        return list(zip(prices[:end], positions[:end]))
+
+    def cheapest_dates(self, max_price: int, lo: int, hi: int, positions=None, limit: int = 10) -> list:
+        """The `limit` cheapest (fare, day, position) at most max_price in [lo, hi], cheapest first.
+
+        Each heap entry is a sub-window with its cheapest day. Popping one
+        splits the rest of its window around that day, so the work is
+        O(limit * log) rather than a scan of every day.
+        """
+        if positions is None:
+            positions = range(len(self.fares))
+        heap = []
+        for position in positions:
+            fare, day = self.cheapest(position, lo, hi)
+            if fare <= max_price:
+                heap.append((fare, day, position, lo, hi))
+        heapq.heapify(heap)
+        found = []
+        while heap and len(found) < limit:
+            fare, day, position, left, right = heapq.heappop(heap)
+            found.append((fare, day, position))
+            for a, b in ((left, day - 1), (day + 1, right)):
+                if a <= b:
+                    next_fare, next_day = self.cheapest(position, a, b)
+                    if next_fare <= max_price:
+                        heapq.heappush(heap, (next_fare, next_day, position, a, b))
+        return found
+
+
+_fares_lock = threading.Lock()
+_fares_slot = (None, None)  # (destinations list, its FareCalendar)
+
+
+def fare_calendar(destinations: list) -> FareCalendar:
+    """The FareCalendar for a destinations list, built once per list object."""
+    global _fares_slot
+    rows, calendar = _fares_slot
+    if rows is destinations:
+        return calendar
+    with _fares_lock:
+        if _fares_slot[0] is not destinations:
+            _fares_slot = (destinations, FareCalendar(destinations))
+        return _fares_slot[1]
+
+
+def cheapest_fares(destinations: list, max_price: int, date_from: str, date_to: str = None, cities=(),
+                   limit: int = 10) -> list:
+    """Cheapest departures at most max_price in a date window, cheapest first.
+
+    Args:
+        destinations: Catalog rows with fare series
+        max_price: Budget per fare
+        date_from, date_to: Inclusive window; date_from alone means that one day
+        cities: Only these cities (case-insensitive; empty = all)
+        limit: Departures to return (capped at MAX_FARE_RESULTS)
+
+    Returns:
+        [{"city", "price", "date"}]
+
+    Raises:
+        ValueError: On a malformed date or an inverted window.
+    """
+    calendar = fare_calendar(destinations)
+    limit = max(1, min(int(limit), MAX_FARE_RESULTS))
+    window = calendar.window(date_from, date_to)
+    if window is None:
+        return []
+    wanted = {c.lower() for c in cities or ()}
+    positions = [i for i, d in enumerate(destinations) if not wanted or d["city"].lower() in wanted]
+    lo, hi = window
+    if lo == hi and not wanted:
+        found = [(fare, lo, position) for fare, position in calendar.under_budget_on(lo, max_price)[:limit]]
+    else:
+        found = calendar.cheapest_dates(max_price, lo, hi, positions, limit)
+    return [{"city": destinations[position]["city"], "price": fare, "date": calendar.date_of(day)}
+            for fare, day, position in found]
+
+
+# --- Ranked search ---
+class InvalidCursor(ValueError):
+    """The cursor is malformed, or belongs to another query or catalog version."""
+
+
+class SearchIndex:
+    """Price-sorted row positions and per-tag posting sets for one destinations list."""
+
+    def __init__(self, destinations: list):
+        self.size = len(destinations)
+        self.by_price = sorted(range(self.size), key=lambda i: destinations[i]["price"])
+        self.prices = [destinations[i]["price"] for i in self.by_price]
+        postings = {}
+        for i, dest in enumerate(destinations):
+            for tag in dest["tags"]:
+                postings.setdefault(tag.lower(), set()).add(i)
+        self.postings = {tag: frozenset(rows) for tag, rows in postings.items()}
+        # Cursors from a different catalog (or version of it) are rejected
+        raw = json.dumps([[d["city"], d["price"], d["tags"]] for d in destinations], separators=(",", ":"))
+        self.fingerprint = hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+    def _price_slice(self, min_price, max_price) -> tuple:
+        lo = 0 if min_price is None else bisect.bisect_left(self.prices, min_price)
+        hi = self.size if max_price is None else bisect.bisect_right(self.prices, max_price)
+        return lo, max(lo, hi)
+
+    def candidates(self, min_price, max_price, tags_all, tags_any) -> list:
+        """Positions passing the price range and tag predicates (only those rows are touched)."""
+        lo, hi = self._price_slice(min_price, max_price)
+        return self.filter_tags(self.by_price[lo:hi], tags_all, tags_any)
+
+    def filter_tags(self, rows: list, tags_all, tags_any) -> list:
+        """Positions among rows that pass the tag predicates."""
+        if tags_all:
+            required = frozenset.intersection(*(self.postings.get(t, frozenset()) for t in tags_all))
+            rows = [i for i in rows if i in required]
+        if tags_any:
+            allowed = frozenset().union(*(self.postings.get(t, frozenset()) for t in tags_any))
+            rows = [i for i in rows if i in allowed]
+        return rows
+
+    def estimate(self, min_price, max_price, tags_all, tags_any, vibe_tags=None) -> tuple:
+        """Result count from index sizes alone, assuming independent predicates.
+
+        Returns:
+            (estimated_count, exact) - exact when only the price range applies.
+        """
+        if not self.size:
+            return 0, True
+        lo, hi = self._price_slice(min_price, max_price)
+        count, exact = float(hi - lo), True
+        for tag in tags_all:
+            count *= len(self.postings.get(tag, ())) / self.size
+            exact = False
+        for group in ([tags_any] if tags_any else []) + ([vibe_tags] if vibe_tags is not None else []):
+            missing = 1.0
+            for tag in group:
+                missing *= 1.0 - len(self.postings.get(tag, ())) / self.size
+            count *= 1.0 - missing
+            exact = False
+        return int(round(count)), exact
+
+
+_search_lock = threading.Lock()
+_search_slot = (None, None)  # (destinations list, its SearchIndex)
+
+
+def search_index(destinations: list) -> SearchIndex:
+    """The SearchIndex for a destinations list, built once per list object."""
+    global _search_slot
+    rows, index = _search_slot
+    if rows is destinations:
+        return index
+    with _search_lock:
+        if _search_slot[0] is not destinations:
+            _search_slot = (destinations, SearchIndex(destinations))
+        return _search_slot[1]
+
+
+def _query_key(min_price, max_price, vibes, tags_all, tags_any, matches_only, window=None) -> str:
+    raw = json.dumps([min_price, max_price, sorted(v.lower() for v in vibes), tags_all, tags_any, matches_only, window])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:8]
+
+
+def _encode_cursor(score: float, position: int, query_key: str, fingerprint: str) -> str:
+    raw = json.dumps([score, position, query_key, fingerprint], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str, query_key: str, fingerprint: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, position, cursor_query, cursor_catalog = json.loads(raw)
+        score, position = float(score), int(position)
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if cursor_query != query_key:
+        raise InvalidCursor("Cursor belongs to a different search")
+    if cursor_catalog != fingerprint:
+        raise InvalidCursor("Catalog changed since this cursor was issued; search again")
+    return score, position
+
+
+def _normalize_filters(vibes, tags_all, tags_any) -> tuple:
+    return ([str(v) for v in vibes or ()], sorted({t.lower() for t in tags_all or ()}),
+            sorted({t.lower() for t in tags_any or ()}))
+
+
+def estimate_count(destinations: list, max_price: int = None, min_price: int = None, vibes=(), tags_all=(),
+                   tags_any=(), matches_only: bool = False) -> tuple:
+    """(estimated_count, exact) for a search, from the price and tag indexes only (no row scan)."""
+    vibes, tags_all, tags_any = _normalize_filters(vibes, tags_all, tags_any)
+    vibe_tags = None
+    if matches_only and vibes:
+        vibe_tags = {t.lower() for v in vibes for t in vibe_index(destinations).match(v)}
+    return search_index(destinations).estimate(min_price, max_price, tags_all, tags_any, vibe_tags)
+
+
+def search(destinations: list, max_price: int = None, min_price: int = None, vibes=(), tags_all=(), tags_any=(),
+           matches_only: bool = False, limit: int = DEFAULT_PAGE_SIZE, cursor: str = None, date_from: str = None,
+           date_to: str = None) -> dict:
+    """Ranked, filtered, cursor-paginated destination search.
+
+    Args:
+        destinations: Catalog rows
+        max_price, min_price: Inclusive price range (None = unbounded)
+        vibes: Free-text vibes that rank rows (fuzzy, see VibeIndex)
+        tags_all: Catalog tags a row must all have (case-insensitive)
+        tags_any: Catalog tags a row must have at least one of
+        matches_only: Drop rows that match none of the vibes
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        cursor: `next_cursor` from the previous page of the same search
+        date_from, date_to: Departure window (YYYY-MM-DD, inclusive; date_from
+            alone is one day). Rows are then priced, filtered and reported at
+            their cheapest fare in the window, with its "date".
+
+    Returns:
+        {"results": [{"city", "price", "tags", "score"[, "date"]}], "next_cursor",
+         "estimated_total", "total_exact"}. The total is exact on the first
+        page (and for dated searches); later pages report the index estimate
+        (see estimate_count).
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or from another search/catalog.
+        ValueError: On a malformed date or an inverted date window.
+    """
+    vibes, tags_all, tags_any = _normalize_filters(vibes, tags_all, tags_any)
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    index = search_index(destinations)
+    dated = date_from is not None or date_to is not None
+    window = None
+    if dated:
+        calendar = fare_calendar(destinations)
+        window = calendar.window(date_from if date_from is not None else date_to, date_to)
+    query_key = _query_key(min_price, max_price, vibes, tags_all, tags_any, matches_only,
+                           [date_from, date_to] if dated else None)
+    after = _decode_cursor(cursor, query_key, index.fingerprint) if cursor else None
+
+    if not dated:
+        positions = index.candidates(min_price, max_price, tags_all, tags_any)
+    elif window is None:
+        positions = []  # the window is outside the fare calendar
+    else:
+        # One O(1) range-minimum lookup per row, then the same tag filter
+        fares = {}
+        for position in range(index.size):
+            fare, day = calendar.cheapest(position, *window)
+            if fare != NO_FARE and (max_price is None or fare <= max_price) and (min_price is None or fare >= min_price):
+                fares[position] = (fare, calendar.date_of(day))
+        positions = index.filter_tags(list(fares), tags_all, tags_any)
+
+    wanted = [vibe_index(destinations).match(v) for v in vibes]
+    # Sort key (-score, position) is a total order, so pages never overlap or skip
+    keys, matched = [], 0
+    for position in positions:
+        score = _vibe_score(destinations[position], wanted) if wanted else 0.0
+        if matches_only and vibes and score <= 0:
+            continue
+        matched += 1
+        key = (-score, position)
+        if after is None or key > (-after[0], after[1]):
+            keys.append(key)
+    page = heapq.nsmallest(limit + 1, keys)
+
+    results = []
+    for neg_score, position in page[:limit]:
+        dest = destinations[position]
+        row = {"city": dest["city"], "price": dest["price"], "tags": dest["tags"], "score": -neg_score}
+        if dated:
+            row["price"], row["date"] = fares[position]
+        results.append(row)
+    next_cursor = None
+    if len(page) > limit:
+        neg_score, position = page[limit - 1]
+        next_cursor = _encode_cursor(-neg_score, position, query_key, index.fingerprint)
+    if after is None or dated:
+        estimated, exact = matched, True
+    else:
+        estimated, exact = estimate_count(destinations, max_price, min_price, vibes, tags_all, tags_any, matches_only)
+    return {"results": results, "next_cursor": next_cursor, "estimated_total": estimated, "total_exact": exact}
+
+
+class SearchStats:
+    """Counts searches that came back empty or matched none of the requested vibes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {"searches": 0, "zero_results": 0, "no_vibe_match": 0, "unknown_vibes": 0}
+
+    def observe(self, destinations: list, vibes: list, result: str) -> None:
+        """Record one search_destinations result (works for inline and pooled calls)."""
+        index = vibe_index(destinations)
+        unknown = sum(1 for v in vibes if not index.match(v))
+        with self._lock:
+            self.counts["searches"] += 1
+            self.counts["unknown_vibes"] += unknown
+            if result.startswith(NO_RESULTS):
+                self.counts["zero_results"] += 1
+            elif result.startswith(NO_VIBE_MATCH):
+                self.counts["no_vibe_match"] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self.counts)
+        searches = counts["searches"]
+        counts["empty_rate"] = (counts["zero_results"] + counts["no_vibe_match"]) / searches if searches else 0.0
+        return counts
+
+
+search_stats = SearchStats()
+
+
+def search_destinations(destinations: list, max_budget: int, vibes: list, cursor: str = None,
+                        limit: int = DEFAULT_PAGE_SIZE, date_from: str = None, date_to: str = None) -> str:
+    """Search destinations within budget, ranking vibe matches first.
+
+    Args:
+        destinations: Catalog rows like {"city": ..., "price": ..., "tags": [...]}
+        max_budget: Maximum budget in USD
+        vibes: Desired vibes/tags (case-insensitive)
+        cursor: Continue a previous search (from its "More results" line)
+        limit: Destinations per page
+        date_from, date_to: Optional departure window (YYYY-MM-DD); prices are
+            then each destination's cheapest fare in it
+
+    Returns:
+        Formatted tool result for the model.
+    """
+    try:
+        page = search(destinations, max_price=max_budget, vibes=vibes, limit=limit, cursor=cursor,
+                      date_from=date_from, date_to=date_to)
+    except InvalidCursor as e:
+        return f"{e}. Search again without a cursor."
+    except ValueError as e:
+        return f"{e}."
+    results = page["results"]
+    dates = ""
+    if date_from or date_to:
+        dates = f" departing {date_from or date_to}" + (f" to {date_to}" if date_from and date_to else "")
+    if not results:
+        return NO_MORE_RESULTS if cursor else NO_RESULTS[:-1] + dates + "."
+
+    # Format results
+    formatted = [f"{d['city']} (${d['price']}" + (f" on {d['date']}" if "date" in d else "") + f"): {', '.join(d['tags'])}"
+                 for d in results]
+    if page["next_cursor"]:
+        formatted.append(f'More results: call search_destinations again with cursor="{page["next_cursor"]}"')
+    if vibes and results[0]["score"] == 0 and not cursor:
+        # Say so, rather than passing off unrelated places as matches
+        return f"{NO_VIBE_MATCH} ({', '.join(vibes)}); closest within ${max_budget} budget{dates}:\n" + "\n".join(formatted)
+    return f"Found {page['estimated_total']} destinations within ${max_budget} budget{dates}:\n" + "\n".join(formatted)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        info = write_artifact(sys.argv[2] if len(sys.argv) > 2 else ARTIFACT_NAME)
+        print(f"📦 Wrote {info['path']} (v{info['version']}, {info['raw_bytes']} -> {info['compressed_bytes']} bytes)")
+        print(f"   sha256: {info['sha256']}")
+    elif len(sys.argv) > 2 and sys.argv[1] == "inspect":
+        data = load_artifact(sys.argv[2])
+        print(f"📦 Catalog v{data['version']}: {len(data['destinations'])} destinations, "
+              f"{len(data['user_data'])} users, {len(data['zodiac_traits'])} signs")
+    else:
+        print(__doc__)
@@ -0,0 +1,266 @@
+"""
+Transport Compression
+=====================
+
+ASGI middleware that negotiates compressed request and response bodies for
+the FastAPI app, plus a payload-size histogram.
+
+- Requests with `Content-Encoding: gzip | deflate | br | zstd` are inflated
+  before they reach the app. Wire and inflated sizes are capped at
+  MAX_INFLATED_BYTES to guard against decompression bombs (413); unknown
+  encodings get 415 and corrupt bodies 400.
+- Responses are compressed with the best encoding the client accepts:
+  zstd, then br, then gzip. The `zstandard` and `brotli` packages are
+  optional; without them only gzip is offered. Small or already-encoded
+  bodies and streamed responses pass through untouched.
+
+Also provides `gzip_body()` for compressing upstream Agent Engine payloads.
+"""
+
+import gzip
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional
+    zstandard = None
+
+# Bodies smaller than this are not worth a compression frame
+MIN_COMPRESS_BYTES = 512
+# Largest request body we are willing to inflate
+MAX_INFLATED_BYTES = 8 * 1024 * 1024
+
+
+def _compressors() -> dict:
+    table = {"gzip": lambda data: gzip.compress(data, compresslevel=5, mtime=0)}
+    if brotli is not None:
+        table["br"] = lambda data: brotli.compress(data, quality=4)
+    if zstandard is not None:
+        table["zstd"] = lambda data: zstandard.ZstdCompressor(level=3).compress(data)
+    return table
+
+
+COMPRESSORS = _compressors()
+PREFERENCE = ("zstd", "br", "gzip")
+
+
+class UnsupportedEncoding(ValueError):
+    """The request's Content-Encoding is not one we can inflate."""
+
+
+class BodyTooLarge(ValueError):
+    """The request body exceeds MAX_INFLATED_BYTES (on the wire or inflated)."""
+
+
+def _inflate(encoding: str, data: bytes) -> bytes:
+    if encoding in ("gzip", "x-gzip"):
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    elif encoding == "deflate":
+        decoder = zlib.decompressobj()
+    elif encoding == "br" and brotli is not None:
+        out = brotli.decompress(data)
+        if len(out) > MAX_INFLATED_BYTES:
+            raise BodyTooLarge("Request body too large after decompression")
+        return out
+    elif encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=MAX_INFLATED_BYTES)
+    else:
+        raise UnsupportedEncoding(f"Unsupported Content-Encoding: {encoding}")
+    out = decoder.decompress(data, MAX_INFLATED_BYTES + 1)
+    if len(out) > MAX_INFLATED_BYTES or decoder.unconsumed_tail:
+        raise BodyTooLarge("Request body too large after decompression")
+    return out
+
+
+def negotiate(accept_encoding: str) -> str:
+    """Pick the best supported encoding from an Accept-Encoding header (or None)."""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        name = parts[0].strip().lower()
+        q = 1.0
+        for param in parts[1:]:
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name:
+            accepted[name] = q
+    for name in PREFERENCE:
+        if name in COMPRESSORS and accepted.get(name, accepted.get("*", 0.0)) > 0:
+            return name
+    return None
+
+
+def gzip_body(data: bytes) -> tuple:
+    """Gzip an upstream request body. Returns (body, headers_to_add)."""
+    if len(data) < MIN_COMPRESS_BYTES:
+        return data, {}
+    return gzip.compress(data, compresslevel=5, mtime=0), {"Content-Encoding": "gzip"}
+
+
+class SizeHistogram:
+    """Power-of-two byte-size histogram (bucket = upper bound in bytes)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self.count = 0
+        self.total_bytes = 0
+
+    def observe(self, size: int) -> None:
+        bucket = 1 << max(6, (size - 1).bit_length()) if size > 0 else 64
+        with self._lock:
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+            self.count += 1
+            self.total_bytes += size
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "total_bytes": self.total_bytes,
+                "buckets": {f"le_{k}": v for k, v in sorted(self._buckets.items())},
+            }
+
+
+# Wire (as sent) vs. raw (as the app sees it) sizes
+request_wire_bytes = SizeHistogram()
+request_raw_bytes = SizeHistogram()
+response_raw_bytes = SizeHistogram()
+response_wire_bytes = SizeHistogram()
+upstream_raw_bytes = SizeHistogram()
+upstream_wire_bytes = SizeHistogram()
+
+
+def stats() -> dict:
+    return {
+        "encodings": sorted(COMPRESSORS),
+        "request_wire": request_wire_bytes.snapshot(),
+        "request_raw": request_raw_bytes.snapshot(),
+        "response_raw": response_raw_bytes.snapshot(),
+        "response_wire": response_wire_bytes.snapshot(),
+        "upstream_raw": upstream_raw_bytes.snapshot(),
+        "upstream_wire": upstream_wire_bytes.snapshot(),
+    }
+
+
+class CompressionMiddleware:
+    """Inflate compressed requests and compress responses (zstd/br/gzip)."""
+
+    def __init__(self, app, minimum_size: int = MIN_COMPRESS_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        content_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if content_encoding not in ("", "identity"):
+            body = b""
+            more = True
+            while more:
+                message = await receive()
+                body += message.get("body", b"")
+                more = message.get("more_body", False)
+                if len(body) > MAX_INFLATED_BYTES:
+                    await _plain_response(send, 413, "Request body too large")
+                    return
+            try:
+                inflated = _inflate(content_encoding, body)
+            except BodyTooLarge as e:
+                await _plain_response(send, 413, str(e))
+                return
+            except UnsupportedEncoding as e:
+                await _plain_response(send, 415, str(e))
+                return
+            except Exception as e:
+                await _plain_response(send, 400, f"Could not decode {content_encoding} request body: {e}")
+                return
+            request_wire_bytes.observe(len(body))
+            request_raw_bytes.observe(len(inflated))
+            scope = dict(scope)
+            scope["headers"] = [
+                (k, str(len(inflated)).encode() if k.lower() == b"content-length" else v)
+                for k, v in scope["headers"] if k.lower() != b"content-encoding"
+            ]
+            sent = False
+            receive_wire = receive
+
+            async def receive():
+                nonlocal sent
+                if sent:
+                    # Body delivered: later calls wait for the real disconnect
+                    return await receive_wire()
+                sent = True
+                return {"type": "http.request", "body": inflated, "more_body": False}
+
+        encoding = negotiate(headers.get("accept-encoding", ""))
+        start_message = None
+
+        async def send_wrapper(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            response_headers = list(start.get("headers", []))
+            already_encoded = any(k.lower() == b"content-encoding" for k, _ in response_headers)
+            if message.get("more_body", False) or already_encoded or encoding is None or len(body) < self.minimum_size:
+                # Streamed, pre-encoded, tiny, or client accepts nothing we offer
+                response_raw_bytes.observe(len(body))
+                response_wire_bytes.observe(len(body))
+                await send(start)
+                await send(message)
+                return
+
+            compressed = COMPRESSORS[encoding](body)
+            response_raw_bytes.observe(len(body))
+            response_wire_bytes.observe(len(compressed))
+            response_headers = [(k, v) for k, v in response_headers if k.lower() not in (b"content-length", b"vary")]
+            response_headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", _vary_with_accept_encoding(start.get("headers", []))),
+            ]
+            await send({**start, "headers": response_headers})
+            await send({"type": "http.response.body", "body": compressed, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def _vary_with_accept_encoding(headers) -> bytes:
+    """Merge Accept-Encoding into the response's existing Vary values (one header)."""
+    values = []
+    for key, value in headers:
+        if key.lower() == b"vary":
+            values += [v.strip() for v in value.split(b",") if v.strip()]
+    if not any(v == b"*" or v.lower() == b"accept-encoding" for v in values):
+        values.append(b"Accept-Encoding")
+    return b", ".join(values)
+
+
+async def _plain_response(send, status: int, text: str) -> None:
+    body = text.encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,212 @@
+"""
+Latency-Aware Engine Router
+===========================
+
+Routes each chat to one of several reasoning-engine endpoints (regions or
+versions):
+
+1. Session affinity: a session sticks to the endpoint that last served it
+   (kept in the shared-state store so all workers agree), while it stays
+   healthy and not much slower than the best primary.
+2. Weighted canaries: a canary endpoint gets a fixed share of sessions,
+   picked by a stable hash of the session key.
+3. Otherwise the fastest healthy primary wins. The score is EWMA latency
+   inflated by the EWMA error rate. A small share of picks explores other
+   endpoints so their latency estimates stay fresh.
+
+Endpoints that fail repeatedly are ejected for a cooldown that doubles on
+each ejection, up to a cap.
+
+Environment:
+    ZODIAC_ENGINES  Comma-separated `name=url` entries; `name=url@0.05` marks a
+                    canary receiving 5% of sessions. Defaults to the single
+                    configured engine.
+"""
+
+import hashlib
+import os
+import random
+import threading
+import time
+
+# Smoothing factor for latency / error EWMAs (higher reacts faster)
+EWMA_ALPHA = 0.2
+# Share of routing decisions that try a random healthy primary
+EXPLORE_FRACTION = 0.05
+# Consecutive failures that eject an endpoint, and the cooldown bounds
+EJECT_AFTER_FAILURES = 3
+EJECT_BASE_SECONDS = 15.0
+EJECT_MAX_SECONDS = 300.0
+# Endpoints above this error EWMA are avoided while alternatives exist
+MAX_HEALTHY_ERROR_RATE = 0.5
+AFFINITY_TTL_SECONDS = 1800
+# A session leaves its endpoint once that is this many times slower than the best
+AFFINITY_BREAK_RATIO = 2.0
+
+
+class Endpoint:
+    """One upstream engine and its running health statistics."""
+
+    def __init__(self, name: str, url: str, canary_weight: float = 0.0):
+        self.name = name
+        self.url = url
+        self.canary_weight = canary_weight
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    @property
+    def canary(self) -> bool:
+        return self.canary_weight > 0
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until and self.error_ewma <= MAX_HEALTHY_ERROR_RATE
+
+    def score(self) -> float:
+        """Lower is better. Unmeasured endpoints score 0 so they get tried."""
+        if self.latency_ewma is None:
+            return 0.0
+        return self.latency_ewma * (1 + self.in_flight * 0.1) / max(0.05, 1.0 - self.error_ewma)
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "url": self.url,
+            "canary_weight": self.canary_weight,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "error_ewma": round(self.error_ewma, 4),
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "healthy": self.healthy(now),
+            "ejected_for_s": round(max(0.0, self.ejected_until - now), 1),
+        }
+
+
+def parse_endpoints(value: str) -> list:
+    """Parse ZODIAC_ENGINES (`name=url[@canary_weight],...`)."""
+    endpoints = []
+    for entry in (value or "").split(","):
+        entry = entry.strip()
+        if not entry or "=" not in entry:
+            continue
+        name, url = entry.split("=", 1)
+        weight = 0.0
+        if "@" in url.rsplit("/", 1)[-1]:
+            url, raw_weight = url.rsplit("@", 1)
+            try:
+                weight = min(1.0, max(0.0, float(raw_weight)))
+            except ValueError:
+                weight = 0.0
+        endpoints.append(Endpoint(name.strip(), url.strip(), weight))
+    return endpoints
+
+
+def _session_fraction(session_key: str) -> float:
+    """Stable position of a session in [0, 1) for canary assignment."""
+    digest = hashlib.sha256(session_key.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64
+
+
+class EngineRouter:
+    """Picks an endpoint per request and learns from the outcomes."""
+
+    def __init__(self, endpoints: list, store=None, rng: random.Random = None):
+        if not endpoints:
+            raise ValueError("EngineRouter needs at least one endpoint")
+        self.endpoints = {e.name: e for e in endpoints}
+        self.store = store
+        self.rng = rng or random.Random()
+        self.stats = {"affinity": 0, "canary": 0, "fastest": 0, "explore": 0, "fallback": 0}
+        self._lock = threading.Lock()
+
+    def _affinity_key(self, session_key: str) -> str:
+        return f"route:{session_key}"
+
+    def choose(self, session_key: str = None, exclude=()) -> Endpoint:
+        """Pick the endpoint for a request.
+
+        Args:
+            session_key: Session (or user) id for affinity and canary assignment
+            exclude: Endpoint names already tried for this request (retries fail over)
+
+        Returns:
+            The chosen Endpoint (its in-flight count is incremented; pass it to `record()`).
+        """
+        now = time.time()
+        candidates = [e for e in self.endpoints.values() if e.name not in exclude]
+        healthy = [e for e in candidates if e.healthy(now)]
+
+        endpoint, reason = None, None
+        if session_key and self.store is not None and not exclude:
+            bound = self.endpoints.get(self.store.get(self._affinity_key(session_key)))
+            if bound is not None and bound in healthy:
+                best = min((e.score() for e in healthy if not e.canary), default=0.0)
+                # Stick unless the session is pinned to a much slower primary
+                if bound.canary or best <= 0 or bound.score() <= best * AFFINITY_BREAK_RATIO:
+                    endpoint, reason = bound, "affinity"
+
+        if endpoint is None and session_key:
+            position = _session_fraction(session_key)
+            for canary in (e for e in healthy if e.canary):
+                if position < canary.canary_weight:
+                    endpoint, reason = canary, "canary"
+                    break
+                position -= canary.canary_weight
+
+        if endpoint is None:
+            primaries = [e for e in healthy if not e.canary]
+            if primaries:
+                if len(primaries) > 1 and self.rng.random() < EXPLORE_FRACTION:
+                    endpoint, reason = self.rng.choice(primaries), "explore"
+                else:
+                    endpoint, reason = min(primaries, key=Endpoint.score), "fastest"
+            else:
+                # Nothing healthy: least-bad of what is left (or of everything)
+                pool = candidates or list(self.endpoints.values())
+                endpoint, reason = min(pool, key=lambda e: (e.ejected_until > now, e.error_ewma, e.score())), "fallback"
+
+        with self._lock:
+            self.stats[reason] += 1
+            endpoint.in_flight += 1
+        return endpoint
+
+    def record(self, endpoint: Endpoint, latency: float, ok: bool, session_key: str = None) -> None:
+        """Feed back one attempt's outcome; successful sessions stick to the endpoint."""
+        now = time.time()
+        with self._lock:
+            endpoint.in_flight = max(0, endpoint.in_flight - 1)
+            endpoint.requests += 1
+            endpoint.error_ewma += EWMA_ALPHA * ((0.0 if ok else 1.0) - endpoint.error_ewma)
+            if ok:
+                endpoint.consecutive_failures = 0
+                endpoint.latency_ewma = latency if endpoint.latency_ewma is None else \
+                    endpoint.latency_ewma + EWMA_ALPHA * (latency - endpoint.latency_ewma)
+            else:
+                endpoint.errors += 1
+                endpoint.consecutive_failures += 1
+                if endpoint.consecutive_failures >= EJECT_AFTER_FAILURES:
+                    cooldown = min(EJECT_MAX_SECONDS, EJECT_BASE_SECONDS * 2 ** endpoint.ejections)
+                    endpoint.ejected_until = now + cooldown
+                    endpoint.ejections += 1
+                    endpoint.consecutive_failures = 0
+                    # Give it a clean slate when the cooldown ends
+                    endpoint.error_ewma = 0.0
+        if ok and session_key and self.store is not None:
+            self.store.set(self._affinity_key(session_key), endpoint.name, ttl=AFFINITY_TTL_SECONDS)
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        return {
+            "decisions": dict(self.stats),
+            "endpoints": {name: e.snapshot(now) for name, e in self.endpoints.items()},
+        }
+
+
+def from_env(default_url: str, store=None) -> EngineRouter:
+    endpoints = parse_endpoints(os.environ.get("ZODIAC_ENGINES", ""))
+    return EngineRouter(endpoints or [Endpoint("default", default_url)], store=store)
@@ -0,0 +1,83 @@
+"""
+Local Fake Reasoning Engines
+============================
+
+Stand-in Agent Engine `:query` endpoints for exercising the engine router
+locally. Each port answers POSTs with `{"output": ...}` after a configurable
+latency, failing a configurable share of requests with 503. GETs answer at
+once with engine metadata, like the real resource (the backend's upstream
+probe).
+
+Usage:
+    python fake_engine.py --ports 9001 9002 9003 --latency-ms 80 250 120 --error-rate 0 0 0.3
+
+    ZODIAC_ENGINES="fast=http://127.0.0.1:9001/query,slow=http://127.0.0.1:9002/query,canary=http://127.0.0.1:9003/query@0.1" \\
+    ZODIAC_ENGINE_AUTH=0 python app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(name: str, latency_ms: float, error_rate: float, jitter_ms: float = 20.0):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length)
+            time.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000.0)
+            if random.random() < error_rate:
+                self._reply(503, {"error": f"{name} unavailable"})
+                return
+            try:
+                message = json.loads(body)["input"]["input"]["message"]
+            except (ValueError, KeyError, TypeError):
+                message = ""
+            self._reply(200, {"output": f"✨ [{name}] The stars heard: {message[-60:]}"})
+
+        def do_GET(self):
+            self._reply(200, {"name": name, "displayName": "fake reasoning engine"})
+
+        def _reply(self, status: int, payload: dict):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass  # keep load tests quiet
+
+    return Handler
+
+
+def serve(ports: list, latencies: list, error_rates: list, host: str = "127.0.0.1") -> list:
+    """Start one fake engine per port on daemon threads. Returns the servers."""
+    servers = []
+    for i, port in enumerate(ports):
+        latency = latencies[min(i, len(latencies) - 1)] if latencies else 100.0
+        error_rate = error_rates[min(i, len(error_rates) - 1)] if error_rates else 0.0
+        server = ThreadingHTTPServer((host, port), make_handler(f"engine-{port}", latency, error_rate))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        print(f"🛰️  engine-{port}: http://{host}:{port}/query  latency {latency} ms, errors {error_rate:.0%}")
+    return servers
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run local fake reasoning engines.")
+    parser.add_argument("--ports", type=int, nargs="+", default=[9001, 9002])
+    parser.add_argument("--latency-ms", type=float, nargs="+", default=[100.0])
+    parser.add_argument("--error-rate", type=float, nargs="+", default=[0.0])
+    args = parser.parse_args()
+
+    serve(args.ports, args.latency_ms, args.error_rate)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,145 @@
+"""
+Fast JSON Helpers for /chat
+===========================
+
+Allocation-light parsing of Agent Engine responses and pre-serialized chat
+responses that skip Pydantic re-validation for trusted internal data.
+
+- `extract_output(body)` pulls only the `output` field. With orjson installed
+  it parses in C; otherwise, for the usual `{"output": ...}` shape, it decodes
+  just that value and never builds objects for the rest of the body.
+- `chat_response(text, session_id)` returns a ready `Response`, so FastAPI
+  does not validate and re-encode through the `ChatResponse` model.
+
+Usage (benchmark, parse + serialize time per KB):
+    python fast_json.py
+    python fast_json.py --sizes 1 16 256 --repeats 200
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # optional speed-up
+    orjson = None
+
+_decoder = json.JSONDecoder()
+_OUTPUT_KEY = b'"output"'
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _output_value(body: bytes, default):
+    if orjson is not None:
+        parsed = orjson.loads(body)
+        return parsed.get("output", default) if isinstance(parsed, dict) else default
+
+    stripped = body.lstrip()
+    if stripped[:1] == b"{" and stripped[1:].lstrip().startswith(_OUTPUT_KEY):
+        # `output` is the first top-level key: decode only its value
+        text = stripped.decode("utf-8")
+        idx = text.index(":", text.index('"output"') + len('"output"')) + 1
+        while text[idx] in " \t\r\n":
+            idx += 1
+        value, _ = _decoder.raw_decode(text, idx)
+        return value
+
+    parsed = json.loads(body)
+    return parsed.get("output", default) if isinstance(parsed, dict) else default
+
+
+def extract_output(body: bytes, default: str = "No response.") -> str:
+    """Extract the agent's reply text from a raw Agent Engine response body.
+
+    Mirrors the original handling: a nested dict yields its own `output`
+    (or its repr), anything else is stringified.
+    """
+    value = _output_value(body, default)
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        value = value.get("output", str(value))
+    return str(value)
+
+
+def chat_response(text: str, session_id: str):
+    """Pre-serialized /chat response (same JSON shape as ChatResponse)."""
+    from fastapi import Response
+
+    return Response(content=dumps({"response": text, "session_id": session_id}), media_type="application/json")
+
+
+# --- Benchmark ---
+def _make_baseline():
+    """The original path: full parse, walk, then model validation + encoding."""
+    from pydantic import BaseModel
+
+    class ChatResponse(BaseModel):
+        response: str
+        session_id: str
+
+    def baseline(body: bytes) -> bytes:
+        agent_output = json.loads(body).get("output", "No response.")
+        if isinstance(agent_output, dict):
+            agent_output = agent_output.get("output", str(agent_output))
+        return ChatResponse(response=str(agent_output), session_id="user_001").model_dump_json().encode("utf-8")
+
+    return baseline
+
+
+def _fast(body: bytes) -> bytes:
+    return dumps({"response": extract_output(body), "session_id": "user_001"})
+
+
+def _payload(kb: int) -> bytes:
+    turn = {"role": "agent", "content": "✨ **Paris** ($300) — the stars align for art and romance. " * 4}
+    history = [turn] * max(1, kb * 1024 // len(json.dumps(turn)))
+    return json.dumps({"output": turn["content"] * 2, "history": history, "metadata": {"engine": "zodiac"}}).encode("utf-8")
+
+
+def benchmark(sizes=(1, 16, 128, 1024), repeats: int = 100) -> list:
+    """Time parse + serialize for both paths. Returns rows of microseconds per KB."""
+    import time
+
+    paths = [("fast", _fast)]
+    try:
+        paths.append(("baseline", _make_baseline()))
+    except ImportError:
+        pass  # pydantic not installed: report the fast path only
+
+    rows = []
+    for kb in sizes:
+        body = _payload(kb)
+        row = {"kb": len(body) / 1024}
+        for label, fn in paths:
+            started = time.perf_counter()
+            for _ in range(repeats):
+                fn(body)
+            row[f"{label}_us_per_kb"] = (time.perf_counter() - started) / repeats * 1e6 / row["kb"]
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark /chat response parsing")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 16, 128, 1024], help="Body sizes in KB")
+    parser.add_argument("--repeats", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"orjson: {'yes' if orjson else 'no (stdlib fallback)'}")
+    for row in benchmark(args.sizes, args.repeats):
+        baseline = row.get("baseline_us_per_kb")
+        extra = f"   baseline {baseline:8.2f} µs/KB ({baseline / row['fast_us_per_kb']:.1f}x)" if baseline else ""
+        print(f"{row['kb']:8.1f} KB   fast {row['fast_us_per_kb']:8.2f} µs/KB{extra}")
@@ -0,0 +1,220 @@
+"""
+Health Checks
+=============
+
+Separates "is this process alive" from "should it get traffic":
+
+- Liveness (`GET /health/live`) only proves the event loop answers. It
+  never looks at dependencies, so a slow upstream cannot get a healthy
+  worker restarted.
+- Readiness (`GET /health/ready`) is 200 only once the worker is warm. Each
+  registered check must pass: auth credentials valid, fallback model built,
+  catalog indexes loaded. Otherwise it is 503 and lists what is missing, so
+  load balancers skip cold replicas.
+- Status (`GET /health`) rolls readiness, the engine router's circuits and
+  the upstream probes into "starting", "degraded" or "ok":
+  - "starting": the worker is not warm yet.
+  - "degraded": an engine's circuit is open (ejected after repeated
+    failures) or its probes keep failing. The worker still serves, but
+    replies may come from the fallback model.
+  - "ok": everything else.
+
+`UpstreamProbe` sends a lightweight request (no model call) to every engine
+endpoint each interval and keeps recent latency percentiles per endpoint.
+Request headers (the auth token) are built once per round, not once per
+endpoint. Its tick also reruns the warm-up phases whose checks fail, so a
+transient auth error at startup does not leave the worker unready forever.
+
+Environment:
+    ZODIAC_PROBE_INTERVAL  Seconds between upstream probes (default 15, 0 = off)
+    ZODIAC_PROBE_TIMEOUT   Per-probe timeout in seconds (default 5)
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+PROBE_INTERVAL_SECONDS = float(os.environ.get("ZODIAC_PROBE_INTERVAL", "15"))
+PROBE_TIMEOUT_SECONDS = float(os.environ.get("ZODIAC_PROBE_TIMEOUT", "5"))
+# Probe latencies kept per endpoint for the percentiles
+PROBE_WINDOW = 60
+# Consecutive failed probes before an endpoint counts as degraded
+PROBE_FAILURES_DEGRADED = 2
+
+
+def _percentile(samples, pct: float):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+class Readiness:
+    """Named warm-state checks; the worker is ready when all of them pass."""
+
+    def __init__(self):
+        self._checks = {}
+        self.started_at = time.time()
+
+    def add_check(self, name: str, check) -> None:
+        """Register `check() -> (ok, detail)`; it must be cheap (called per request)."""
+        self._checks[name] = check
+
+    def report(self) -> dict:
+        checks = {}
+        for name, check in self._checks.items():
+            try:
+                ok, detail = check()
+            except Exception as e:
+                ok, detail = False, f"check failed: {e}"
+            checks[name] = {"ok": bool(ok), "detail": detail}
+        return {"ready": all(c["ok"] for c in checks.values()), "checks": checks}
+
+
+class UpstreamProbe:
+    """Periodic lightweight requests to each engine endpoint, with recent latency percentiles.
+
+    Args:
+        targets: Callable returning [(name, url)] to probe
+        send: Blocking `send(url, timeout, headers) -> status_code`; run on a worker thread
+        headers: Optional blocking callable returning the headers for a round (e.g. auth)
+        interval: Seconds between rounds (0 disables the loop)
+        timeout: Per-probe timeout in seconds
+        on_tick: Optional blocking callable run after each round (e.g. re-warm)
+    """
+
+    def __init__(self, targets, send, headers=None, interval: float = PROBE_INTERVAL_SECONDS,
+                 timeout: float = PROBE_TIMEOUT_SECONDS, on_tick=None):
+        self.targets = targets
+        self.send = send
+        self.headers = headers
+        self.interval = interval
+        self.timeout = timeout
+        self.on_tick = on_tick
+        self._task = None
+        self._endpoints = {}
+        self.last_tick_error = None
+
+    def _entry(self, name: str) -> dict:
+        return self._endpoints.setdefault(name, {
+            "latencies": deque(maxlen=PROBE_WINDOW), "probes": 0, "failures": 0,
+            "consecutive_failures": 0, "last_status": None, "last_error": None, "last_ok_at": None,
+        })
+
+    def probe_one(self, name: str, url: str, headers: dict = None) -> None:
+        """Probe one endpoint and record the outcome (blocking)."""
+        started = time.perf_counter()
+        try:
+            status = self.send(url, self.timeout, headers or {})
+            error = None if status < 400 else f"HTTP {status}"
+        except Exception as e:
+            status, error = None, f"{type(e).__name__}: {e}"
+        self._record(name, status, error, time.perf_counter() - started)
+
+    def _record(self, name: str, status, error, elapsed: float) -> None:
+        entry = self._entry(name)
+        entry["probes"] += 1
+        entry["last_status"] = status
+        entry["last_error"] = error
+        if error is None:
+            entry["latencies"].append(elapsed)
+            entry["consecutive_failures"] = 0
+            entry["last_ok_at"] = time.time()
+        else:
+            entry["failures"] += 1
+            entry["consecutive_failures"] += 1
+
+    async def probe_all(self) -> None:
+        targets = list(self.targets())
+        for name, _ in targets:
+            self._entry(name)  # created here, not on worker threads, so snapshot() can iterate safely
+        headers = {}
+        if self.headers is not None:
+            try:
+                headers = await asyncio.to_thread(self.headers)
+            except Exception as e:
+                # Without headers (no auth token) every probe would fail anyway
+                for name, _ in targets:
+                    self._record(name, None, f"headers: {type(e).__name__}: {e}", 0.0)
+                return
+        await asyncio.gather(*(asyncio.to_thread(self.probe_one, name, url, headers) for name, url in targets))
+
+    async def _run(self) -> None:
+        while True:
+            await self.probe_all()
+            if self.on_tick is not None:
+                try:
+                    await asyncio.to_thread(self.on_tick)
+                    self.last_tick_error = None
+                except Exception as e:
+                    # Keep probing; the error shows up in snapshot()
+                    self.last_tick_error = f"{type(e).__name__}: {e}"
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def failing(self) -> list:
+        """Endpoints whose recent probes keep failing."""
+        return [name for name, e in self._endpoints.items() if e["consecutive_failures"] >= PROBE_FAILURES_DEGRADED]
+
+    def snapshot(self) -> dict:
+        endpoints = {}
+        for name, entry in self._endpoints.items():
+            samples = list(entry["latencies"])
+            p50, p95, p99 = (_percentile(samples, pct) for pct in (50, 95, 99))
+            endpoints[name] = {
+                "probes": entry["probes"],
+                "failures": entry["failures"],
+                "consecutive_failures": entry["consecutive_failures"],
+                "last_status": entry["last_status"],
+                "last_error": entry["last_error"],
+                "last_ok_age_s": round(time.time() - entry["last_ok_at"], 1) if entry["last_ok_at"] else None,
+                "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "latency_p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            }
+        return {"interval_s": self.interval, "running": self._task is not None,
+                "last_tick_error": self.last_tick_error, "endpoints": endpoints}
+
+
+def overall_status(readiness: dict, engines: dict, probe: UpstreamProbe) -> dict:
+    """Roll readiness, engine circuits and probe results into one status.
+
+    Args:
+        readiness: `Readiness.report()`
+        engines: `EngineRouter.snapshot()`
+        probe: The worker's UpstreamProbe
+
+    Returns:
+        {"status": "starting" | "degraded" | "ok", "reasons": [...], "circuits": {name: "open" | "closed"}}
+    """
+    reasons = []
+    if not readiness["ready"]:
+        reasons += [f"{name}: {c['detail']}" for name, c in readiness["checks"].items() if not c["ok"]]
+    circuits = {}
+    for name, endpoint in engines["endpoints"].items():
+        circuits[name] = "open" if endpoint["ejected_for_s"] > 0 else "closed"
+        if circuits[name] == "open":
+            reasons.append(f"engine {name}: circuit open for {endpoint['ejected_for_s']}s")
+    if circuits and all(state == "open" for state in circuits.values()):
+        reasons.append("all engines unavailable: serving from the fallback model")
+    reasons += [f"engine {name}: upstream probes failing" for name in probe.failing()]
+    if not readiness["ready"]:
+        status = "starting"
+    elif reasons:
+        status = "degraded"
+    else:
+        status = "ok"
+    return {"status": status, "reasons": reasons, "circuits": circuits}
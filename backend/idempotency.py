@@ -0,0 +1,181 @@
+"""
+Idempotent Chat Requests
+========================
+
+Clients send an `Idempotency-Key` header, new per user message and reused on
+retries. A retried POST /chat then never reaches Agent Engine twice:
+
+- A duplicate that arrives while the original is still running on this
+  worker awaits the same result.
+- A duplicate on another worker sees the original's pending claim in the
+  shared-state store and polls until the result is stored.
+- A duplicate that arrives after completion is served the stored reply for
+  ZODIAC_IDEMPOTENCY_TTL seconds.
+- Reusing a key with a different message is rejected as a client error.
+
+Only successful replies are stored. On errors and 429s the claim is released
+so the retry runs again.
+
+Memory is bounded. Results expire by TTL, replies larger than
+MAX_RESULT_BYTES are not stored, and each worker evicts its oldest stored
+results beyond MAX_TRACKED_KEYS.
+
+Store calls run in a worker thread: the SQLite and Redis stores block on file
+locks and sockets, which must not stall the event loop.
+
+Environment:
+    ZODIAC_IDEMPOTENCY_TTL  Seconds a completed reply is replayable (default 600)
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+
+RESULT_TTL_SECONDS = float(os.environ.get("ZODIAC_IDEMPOTENCY_TTL", "600"))
+# A pending claim outlives the longest request, then frees the key if its worker died
+PENDING_TTL_SECONDS = 120.0
+MAX_RESULT_BYTES = 64 * 1024
+MAX_TRACKED_KEYS = 5000
+# Polling for a result being computed on another worker
+POLL_INITIAL_SECONDS = 0.05
+POLL_MAX_SECONDS = 0.5
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request."""
+
+
+class RequestInProgress(Exception):
+    """The original request is still running elsewhere and did not finish in time."""
+
+
+def fingerprint(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+class IdempotencyCache:
+    """Runs each (scope, key) at most once and replays its result to duplicates."""
+
+    def __init__(self, store, result_ttl: float = RESULT_TTL_SECONDS, max_keys: int = MAX_TRACKED_KEYS):
+        self.store = store
+        self.result_ttl = result_ttl
+        self.max_keys = max_keys
+        self._inflight = {}  # store key -> (fingerprint, future) on this worker
+        self._recent = OrderedDict()  # store keys this worker saved results for, oldest first
+        self.stats = {"executed": 0, "joined": 0, "replayed": 0, "conflicts": 0, "evicted": 0, "not_stored": 0}
+
+    async def _store(self, method: str, *args, **kwargs):
+        """Call a (blocking) store method off the event loop."""
+        return await asyncio.to_thread(getattr(self.store, method), *args, **kwargs)
+
+    def _store_key(self, scope: str, key: str) -> str:
+        # Scoped per user so one client cannot read another's replies; hashed to bound key size
+        return "idem:" + fingerprint(scope, key)
+
+    async def run(self, scope: str, key: str, request_fingerprint: str, compute, wait_seconds: float) -> tuple:
+        """Execute `compute` once per key, or return the original execution's result.
+
+        Args:
+            scope: Who owns the key (user id)
+            key: Client-supplied Idempotency-Key
+            request_fingerprint: Hash of the request body the key is bound to
+            compute: Coroutine function returning (status, body_bytes, storable)
+            wait_seconds: How long a duplicate waits for a result running elsewhere
+
+        Returns:
+            (status, body_bytes, replayed)
+
+        Raises:
+            IdempotencyConflict: The key was used with a different request.
+            RequestInProgress: The original is still running after wait_seconds.
+        """
+        store_key = self._store_key(scope, key)
+        deadline = time.monotonic() + wait_seconds
+        delay = POLL_INITIAL_SECONDS
+        while True:
+            inflight = self._inflight.get(store_key)
+            if inflight is not None:
+                self._check(inflight[0], request_fingerprint)
+                self.stats["joined"] += 1
+                try:
+                    status, body = await asyncio.shield(inflight[1])
+                except asyncio.CancelledError:
+                    if not inflight[1].cancelled():
+                        raise  # this caller was cancelled, not the original
+                    continue  # the original was abandoned; its claim is free again
+                return status, body, True
+
+            record = await self._store("get", store_key)
+            if record is not None:
+                self._check(record["fp"], request_fingerprint)
+                if record["state"] == "done":
+                    self.stats["replayed"] += 1
+                    return record["status"], record["body"].encode("utf-8"), True
+                # Pending on another worker: wait for it to finish or give up its claim
+                if time.monotonic() + delay > deadline:
+                    raise RequestInProgress("A request with this Idempotency-Key is still in progress")
+                await asyncio.sleep(delay)
+                delay = min(POLL_MAX_SECONDS, delay * 2)
+                continue
+
+            pending = {"state": "pending", "fp": request_fingerprint}
+            if await self._store("set_if_absent", store_key, pending, ttl=PENDING_TTL_SECONDS):
+                return await self._execute(store_key, request_fingerprint, compute)
+
+    def _check(self, stored_fingerprint: str, request_fingerprint: str) -> None:
+        if stored_fingerprint != request_fingerprint:
+            self.stats["conflicts"] += 1
+            raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+
+    async def _execute(self, store_key: str, request_fingerprint: str, compute) -> tuple:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[store_key] = (request_fingerprint, future)
+        self.stats["executed"] += 1
+        try:
+            status, body, storable = await compute()
+        except asyncio.CancelledError:
+            # Unregister before awaiting, or joiners would keep finding the cancelled future
+            self._inflight.pop(store_key, None)
+            future.cancel()
+            # Shielded: a second cancel must not leave the claim behind
+            await asyncio.shield(self._store("delete", store_key))
+            raise
+        except Exception as e:
+            self._inflight.pop(store_key, None)
+            future.set_exception(e)
+            future.exception()  # joiners re-raise it; do not warn when there are none
+            await asyncio.shield(self._store("delete", store_key))
+            raise
+        finally:
+            self._inflight.pop(store_key, None)
+
+        future.set_result((status, body))
+        if storable and len(body) <= MAX_RESULT_BYTES:
+            record = {"state": "done", "fp": request_fingerprint, "status": status, "body": body.decode("utf-8")}
+            await self._store("set", store_key, record, ttl=self.result_ttl)
+            await self._remember(store_key)
+        else:
+            # Errors and throttled replies are not replayed: let the retry run again
+            await self._store("delete", store_key)
+            self.stats["not_stored"] += 1
+        return status, body, False
+
+    async def _remember(self, store_key: str) -> None:
+        now = time.monotonic()
+        self._recent[store_key] = now + self.result_ttl
+        self._recent.move_to_end(store_key)
+        # Drop expired entries, then cap what is left. Expired keys are deleted
+        # too: MemoryStore only expires a key when it is read again.
+        while self._recent:
+            oldest, expires_at = next(iter(self._recent.items()))
+            if expires_at > now and len(self._recent) <= self.max_keys:
+                break
+            self._recent.popitem(last=False)
+            await self._store("delete", oldest)
+            if expires_at > now:
+                self.stats["evicted"] += 1
+
+    def snapshot(self) -> dict:
+        return dict(self.stats, inflight=len(self._inflight), stored=len(self._recent))
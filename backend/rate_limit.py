@@ -0,0 +1,143 @@
+"""
+Rate Limiting and Per-User Quotas
+=================================
+
+Token buckets denominated in *model calls*: each /chat request is charged its
+expected number of model round trips (initial call plus likely tool
+iterations), so a turn that will fan out into several calls costs more than
+a simple follow-up.
+
+Two buckets are checked per request: one per `user_id` and one global. State
+lives in an in-process store by default. With ZODIAC_RATE_LIMIT_SHARED=1 it
+uses the shared-state layer instead, so all workers enforce one quota.
+
+Environment:
+    ZODIAC_USER_BUCKET      capacity:refill_per_second (default 30:0.5)
+    ZODIAC_GLOBAL_BUCKET    capacity:refill_per_second (default 600:10)
+    ZODIAC_RATE_LIMIT_SHARED  1 to share buckets across workers
+"""
+
+import os
+import re
+import time
+
+import shared_state
+
+# ZodiacTravelAgent.query: initial call + up to 5 tool iterations
+MAX_MODEL_CALLS_PER_TURN = 6
+# Longest retry hint handed to clients (Retry-After header, JSON bodies)
+MAX_RETRY_AFTER_SECONDS = 3600.0
+
+_BUDGET_RE = re.compile(r"\$\s?\d+|\b\d{2,5}\s?(?:usd|dollars?|bucks)\b", re.IGNORECASE)
+_ITINERARY_RE = re.compile(r"\b(itinerary|plan|days?|schedule)\b", re.IGNORECASE)
+
+
+def estimate_cost(message: str, history: list = None) -> int:
+    """Estimate model calls a chat turn will trigger (1..MAX_MODEL_CALLS_PER_TURN)."""
+    cost = 1  # the initial send_message
+    if _BUDGET_RE.search(message or ""):
+        cost += 1  # search_destinations round trip
+    if not history or len(history) <= 2:
+        cost += 1  # first turns usually look up the user profile
+    if _ITINERARY_RE.search(message or ""):
+        cost += 1  # itineraries tend to chain extra lookups
+    return min(cost, MAX_MODEL_CALLS_PER_TURN)
+
+
+def _parse_bucket(value: str, default: tuple) -> tuple:
+    """`capacity:rate` as floats; the default if malformed or not both positive."""
+    try:
+        capacity, rate = (float(part) for part in value.split(":"))
+    except (AttributeError, ValueError):
+        return default
+    # A zero rate never refills: the bucket would lock its users out for good
+    if capacity <= 0 or rate <= 0:
+        return default
+    return capacity, rate
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a bucket cannot cover a request's cost."""
+
+    def __init__(self, scope: str, retry_after: float):
+        # Always finite, so it survives int() and JSON encoding
+        retry_after = min(retry_after, MAX_RETRY_AFTER_SECONDS)
+        super().__init__(f"Rate limit exceeded ({scope}); retry in {retry_after:.1f}s")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class RateLimiter:
+    """Per-user and global token buckets over a shared_state-style store."""
+
+    def __init__(self, store=None, user_bucket=(30.0, 0.5), global_bucket=(600.0, 10.0)):
+        self.store = store or shared_state.MemoryStore()
+        self.user_capacity, self.user_rate = user_bucket
+        self.global_capacity, self.global_rate = global_bucket
+        self.stats = {"allowed": 0, "limited_user": 0, "limited_global": 0}
+
+    @staticmethod
+    def _ttl(capacity: float, rate: float):
+        # Keep idle buckets only until they would be full again
+        return capacity / rate + 60 if rate > 0 else None
+
+    def _take(self, key: str, cost: float, capacity: float, rate: float) -> float:
+        """Try to take `cost` tokens. Returns 0.0 on success, else seconds until it would fit.
+
+        A cost above `capacity` is charged as a full bucket; it could never
+        fit otherwise, and the caller would be rate limited forever.
+        """
+        cost = min(cost, capacity)
+        wait = 0.0
+
+        def refill_and_take(state):
+            nonlocal wait
+            now = time.time()
+            tokens, updated = (capacity, now) if state is None else (state["tokens"], state["ts"])
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / rate if rate > 0 else MAX_RETRY_AFTER_SECONDS
+            return {"tokens": tokens, "ts": now}
+
+        self.store.update(key, refill_and_take, ttl=self._ttl(capacity, rate))
+        return wait
+
+    def _refund(self, key: str, cost: float, capacity: float, rate: float) -> None:
+        cost = min(cost, capacity)
+        self.store.update(
+            key,
+            lambda state: None if state is None else {"tokens": min(capacity, state["tokens"] + cost), "ts": state["ts"]},
+            ttl=self._ttl(capacity, rate),
+        )
+
+    def acquire(self, user_id: str, cost: float = 1.0) -> None:
+        """Charge `cost` model calls to the user and global buckets.
+
+        Raises:
+            RateLimitExceeded: With the scope that ran out and a retry hint.
+        """
+        user_key = f"ratelimit:user:{user_id}"
+        wait = self._take(user_key, cost, self.user_capacity, self.user_rate)
+        if wait > 0:
+            self.stats["limited_user"] += 1
+            raise RateLimitExceeded("user", wait)
+
+        wait = self._take("ratelimit:global", cost, self.global_capacity, self.global_rate)
+        if wait > 0:
+            self._refund(user_key, cost, self.user_capacity, self.user_rate)
+            self.stats["limited_global"] += 1
+            raise RateLimitExceeded("global", wait)
+
+        self.stats["allowed"] += 1
+
+
+def from_env() -> RateLimiter:
+    shared = os.environ.get("ZODIAC_RATE_LIMIT_SHARED", "0") == "1"
+    return RateLimiter(
+        store=shared_state.store if shared else None,
+        user_bucket=_parse_bucket(os.environ.get("ZODIAC_USER_BUCKET"), (30.0, 0.5)),
+        global_bucket=_parse_bucket(os.environ.get("ZODIAC_GLOBAL_BUCKET"), (600.0, 10.0)),
+    )
@@ -0,0 +1,273 @@
+"""
+Shared Retry Policy
+===================
+
+Deadline-aware retries with full-jitter backoff, Retry-After support and
+optional hedging, used by the backend (Agent Engine HTTP call) and the agent
+(model calls).
+
+Backend engine calls and agent model calls retry through it. The two
+deploy units ship separately, each with a copy; see
+backend/tests/test_shared_modules.py for the check that they agree.
+Stdlib only.
+
+Usage:
+    policy = RetryPolicy(attempts=4, base_delay=0.25, max_delay=4.0)
+    deadline = Deadline(20.0)
+    response = policy.call(lambda timeout: requests.post(url, timeout=timeout), deadline)
+    reply = await policy.call_async(lambda timeout: chat.send_message_async(msg), deadline)
+"""
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+
+DEFAULT_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when there is no time budget left for another attempt."""
+
+
+class Deadline:
+    """Absolute point in time a caller is willing to wait until."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + max(0.0, seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def cancel(self) -> None:
+        """Expire now: no further attempts start (one already in flight runs to its timeout)."""
+        self.expires_at = time.monotonic()
+
+
+def parse_retry_after(value) -> float:
+    """Parse a Retry-After header (delta-seconds or HTTP date) into seconds.
+
+    Returns:
+        Seconds to wait, or None if the header is missing/unparseable.
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class LatencyTracker:
+    """Ring buffer of recent call latencies, used to pick the hedge delay."""
+
+    def __init__(self, size: int = 200):
+        self._samples = []
+        self._size = size
+        self._next = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            if len(self._samples) < self._size:
+                self._samples.append(seconds)
+            else:
+                self._samples[self._next] = seconds
+                self._next = (self._next + 1) % self._size
+
+    def percentile(self, pct: float) -> float:
+        """Return the pct-th percentile (0-100), or None with fewer than 20 samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < 20:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+class RetryPolicy:
+    """Retry policy with full-jitter exponential backoff bounded by a deadline.
+
+    Args:
+        attempts: Maximum number of attempts (including the first)
+        base_delay: Backoff base in seconds
+        max_delay: Cap for a single backoff sleep
+        attempt_timeout: Per-attempt timeout cap (still clipped to the deadline)
+        retry_statuses: HTTP status codes worth retrying
+        hedge: Send a second, concurrent attempt once the first is slower than
+            the observed p95. Only safe for idempotent calls.
+        hedge_percentile: Latency percentile that triggers the hedge
+    """
+
+    def __init__(self, attempts: int = 4, base_delay: float = 0.25, max_delay: float = 4.0,
+                 attempt_timeout: float = 30.0, retry_statuses=DEFAULT_RETRY_STATUSES,
+                 hedge: bool = False, hedge_percentile: float = 95.0):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempt_timeout = attempt_timeout
+        self.retry_statuses = set(retry_statuses)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.latency = LatencyTracker()
+        self.stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+        self._pool = None
+
+    # --- Classification ---
+    def _status_of(self, result_or_exc):
+        status = getattr(result_or_exc, "status_code", None)
+        if status is None:
+            status = getattr(result_or_exc, "code", None)  # google.api_core exceptions
+        return status if isinstance(status, int) else None
+
+    def is_retryable(self, result=None, exc=None) -> bool:
+        """True for retryable statuses, connection errors and timeouts."""
+        if exc is not None:
+            if isinstance(exc, DeadlineExceeded):
+                return False
+            if isinstance(exc, (ConnectionError, TimeoutError)):
+                return True
+            # requests.ConnectionError / Timeout subclass IOError, not the builtins
+            if type(exc).__name__ in ("ConnectionError", "Timeout", "ReadTimeout", "ConnectTimeout"):
+                return True
+            return self._status_of(exc) in self.retry_statuses
+        return self._status_of(result) in self.retry_statuses
+
+    def backoff(self, attempt: int, retry_after: float = None) -> float:
+        """Full-jitter delay before retry number `attempt` (0-based)."""
+        if retry_after is not None:
+            return min(retry_after, self.max_delay * 4)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    # --- Execution ---
+    def _timed(self, fn, timeout: float):
+        started = time.monotonic()
+        result = fn(timeout)
+        self.latency.record(time.monotonic() - started)
+        return result
+
+    def _attempt(self, fn, timeout: float):
+        """One logical attempt, optionally hedged with a second concurrent call."""
+        hedge_after = self.latency.percentile(self.hedge_percentile) if self.hedge else None
+        if hedge_after is None or hedge_after >= timeout:
+            return self._timed(fn, timeout)
+
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+        started = time.monotonic()
+        first = self._pool.submit(self._timed, fn, timeout)
+        done, _ = wait([first], timeout=hedge_after)
+        if done:
+            return first.result()
+
+        self.stats["hedges"] += 1
+        second = self._pool.submit(self._timed, fn, max(0.001, timeout - (time.monotonic() - started)))
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is second:
+                    self.stats["hedge_wins"] += 1
+                return result
+        raise error
+
+    def call(self, fn, deadline: Deadline = None):
+        """Call `fn(timeout)` with retries until success, exhaustion or deadline.
+
+        `fn` receives the per-attempt timeout in seconds and returns a result
+        (HTTP responses are inspected via `status_code`) or raises.
+
+        Returns:
+            The last result (which may be a non-retryable or final error response).
+
+        Raises:
+            DeadlineExceeded: If the deadline expires before an attempt can start.
+            Exception: The last exception when attempts are exhausted.
+        """
+        deadline = deadline or Deadline(self.attempt_timeout * self.attempts)
+        self.stats["calls"] += 1
+
+        for attempt in range(self.attempts):
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                self.stats["deadline_exceeded"] += 1
+                raise DeadlineExceeded("No time left for another attempt")
+
+            result, exc, retry_after = None, None, None
+            try:
+                result = self._attempt(fn, min(self.attempt_timeout, remaining))
+            except Exception as e:
+                exc = e
+            if not self.is_retryable(result, exc) or attempt == self.attempts - 1:
+                if exc is not None:
+                    raise exc
+                return result
+
+            headers = getattr(result, "headers", None) or {}
+            retry_after = parse_retry_after(headers.get("Retry-After"))
+            delay = self.backoff(attempt, retry_after)
+            if delay >= deadline.remaining():
+                # Sleeping would blow the caller's budget - surface what we have
+                if exc is not None:
+                    raise exc
+                return result
+            self.stats["retries"] += 1
+            time.sleep(delay)
+
+        raise DeadlineExceeded("Retry attempts exhausted")
+
+    async def call_async(self, fn, deadline: Deadline = None):
+        """Async `call()`: `fn(timeout)` returns an awaitable; backoff sleeps do not block the loop.
+
+        Each attempt is cancelled at its timeout. Hedging is not applied.
+        """
+        deadline = deadline or Deadline(self.attempt_timeout * self.attempts)
+        self.stats["calls"] += 1
+
+        for attempt in range(self.attempts):
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                self.stats["deadline_exceeded"] += 1
+                raise DeadlineExceeded("No time left for another attempt")
+
+            timeout = min(self.attempt_timeout, remaining)
+            result, exc = None, None
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(fn(timeout), timeout)
+                self.latency.record(time.monotonic() - started)
+            except asyncio.TimeoutError:
+                exc = TimeoutError(f"Attempt timed out after {timeout:.1f}s")
+            except Exception as e:
+                exc = e
+            if not self.is_retryable(result, exc) or attempt == self.attempts - 1:
+                if exc is not None:
+                    raise exc
+                return result
+
+            headers = getattr(result, "headers", None) or {}
+            delay = self.backoff(attempt, parse_retry_after(headers.get("Retry-After")))
+            if delay >= deadline.remaining():
+                if exc is not None:
+                    raise exc
+                return result
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+        raise DeadlineExceeded("Retry attempts exhausted")
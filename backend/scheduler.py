@@ -0,0 +1,306 @@
+"""
+Model Call Scheduler
+====================
+
+Admission control in front of model calls: a fixed number of concurrent
+slots (this process's share of the model quota), handed out by priority
+class and then by weighted fair queuing across tenants.
+
+- Classes are served in strict priority order (interactive before batch),
+  so batch work only runs on capacity that interactive traffic leaves idle.
+- Within a class, tenants (users, batch jobs) get start-time fair queuing.
+  Each request is tagged `finish = max(virtual_time, tenant's last finish)
+  + cost / weight` and the smallest tag goes first, so one heavy tenant
+  cannot starve the rest.
+- A request whose deadline passes while it is queued is dropped
+  (DeadlineExceeded) instead of taking a slot it can no longer use.
+
+Model calls are gated by it in the agent and in the backend's fallback
+path, so the module lives in both deploy units; a test
+(backend/tests/test_shared_modules.py) keeps the copies equal. Stdlib only
+(plus retry_policy).
+
+Usage:
+    with scheduling("batch", tenant="job-42"):
+        with model_scheduler.slot(deadline):
+            model.generate_content(...)
+
+    # Blocking SDK call without a timeout of its own: abandoned after 30 s,
+    # but its slot is held until it actually returns
+    model_scheduler.call(lambda: model.generate_content(...), 30.0, deadline)
+
+Environment:
+    ZODIAC_MODEL_CONCURRENCY  concurrent model calls per process (default 16)
+    ZODIAC_TENANT_WEIGHTS     tenant:weight,... (default weight 1)
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from retry_policy import DeadlineExceeded, LatencyTracker
+
+# Highest priority first; unknown classes are treated as the last one
+PRIORITIES = ("interactive", "batch")
+# Finish tags kept per class before idle tenants are forgotten
+MAX_TRACKED_TENANTS = 10000
+
+_context = contextvars.ContextVar("zodiac_scheduling", default=("interactive", "anonymous"))
+
+
+@contextlib.contextmanager
+def scheduling(priority: str = "interactive", tenant: str = "anonymous"):
+    """Set the priority class and tenant for model calls made inside the block."""
+    token = _context.set((priority or "interactive", tenant or "anonymous"))
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("priority", "start", "deadline", "notify", "state", "enqueued_at")
+
+    def __init__(self, priority, start, deadline, notify):
+        self.priority = priority
+        self.start = start
+        self.deadline = deadline
+        self.notify = notify
+        self.state = "waiting"  # -> granted | dropped | abandoned
+        self.enqueued_at = time.monotonic()
+
+
+class ModelScheduler:
+    """Concurrency slots for model calls, by priority class then per-tenant fair share."""
+
+    def __init__(self, concurrency: int = 16, priorities=PRIORITIES, tenant_weights: dict = None):
+        self.concurrency = max(1, concurrency)
+        self.priorities = list(priorities)
+        self.tenant_weights = dict(tenant_weights or {})
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._pool = None
+        self._seq = itertools.count()
+        self._queues = {p: [] for p in self.priorities}
+        self._virtual = dict.fromkeys(self.priorities, 0.0)
+        self._last_finish = {p: {} for p in self.priorities}
+        self._waits = {p: LatencyTracker() for p in self.priorities}
+        self._stats = {
+            p: {"granted": 0, "queued": 0, "dropped_expired": 0, "abandoned": 0, "max_depth": 0}
+            for p in self.priorities
+        }
+
+    # --- Queueing (all under self._lock) ---
+    def _enqueue(self, priority: str, tenant: str, cost: float, deadline, notify):
+        """Tag and queue a request. Returns None when it was granted a slot at once."""
+        if priority not in self._queues:
+            priority = self.priorities[-1]
+        last = self._last_finish[priority]
+        start = max(self._virtual[priority], last.get(tenant, 0.0))
+        last[tenant] = start + cost / self.tenant_weights.get(tenant, 1.0)
+        if len(last) > MAX_TRACKED_TENANTS:
+            virtual = self._virtual[priority]
+            for key in [k for k, finish in last.items() if finish <= virtual]:
+                del last[key]
+
+        if self._in_use < self.concurrency and not any(self._queues.values()):
+            self._in_use += 1
+            self._virtual[priority] = max(self._virtual[priority], start)
+            self._stats[priority]["granted"] += 1
+            self._waits[priority].record(0.0)
+            return None
+
+        waiter = _Waiter(priority, start, deadline, notify)
+        queue = self._queues[priority]
+        heapq.heappush(queue, (last[tenant], next(self._seq), waiter))
+        stats = self._stats[priority]
+        stats["queued"] += 1
+        stats["max_depth"] = max(stats["max_depth"], len(queue))
+        return waiter
+
+    def _next(self):
+        for priority in self.priorities:
+            queue = self._queues[priority]
+            while queue:
+                _, _, waiter = heapq.heappop(queue)
+                if waiter.state != "waiting":
+                    continue
+                if waiter.deadline is not None and waiter.deadline.expired():
+                    waiter.state = "dropped"
+                    self._stats[priority]["dropped_expired"] += 1
+                    waiter.notify()
+                    continue
+                self._virtual[priority] = max(self._virtual[priority], waiter.start)
+                return waiter
+        return None
+
+    def _dispatch(self) -> None:
+        while self._in_use < self.concurrency:
+            waiter = self._next()
+            if waiter is None:
+                return
+            self._in_use += 1
+            waiter.state = "granted"
+            self._stats[waiter.priority]["granted"] += 1
+            self._waits[waiter.priority].record(time.monotonic() - waiter.enqueued_at)
+            waiter.notify()
+
+    def _give_up(self, waiter: _Waiter) -> None:
+        """A waiter stopped waiting (timeout or cancellation) before being granted."""
+        if waiter.state == "waiting":
+            waiter.state = "abandoned"
+            expired = waiter.deadline is not None and waiter.deadline.expired()
+            self._stats[waiter.priority]["dropped_expired" if expired else "abandoned"] += 1
+
+    # --- Public API ---
+    def acquire(self, deadline=None, cost: float = 1.0, priority: str = None, tenant: str = None) -> None:
+        """Block until a slot is granted.
+
+        Args:
+            deadline: retry_policy.Deadline; the request is dropped once it passes
+            cost: Relative size of the call (fair-share accounting)
+            priority, tenant: Override the values set by `scheduling()`
+
+        Raises:
+            DeadlineExceeded: If the deadline passed while queued.
+        """
+        default_priority, default_tenant = _context.get()
+        event = threading.Event()
+        with self._lock:
+            waiter = self._enqueue(priority or default_priority, tenant or default_tenant, cost, deadline, event.set)
+        if waiter is None:
+            return
+        event.wait(deadline.remaining() if deadline is not None else None)
+        with self._lock:
+            if waiter.state == "granted":
+                return
+            self._give_up(waiter)
+        raise DeadlineExceeded("Deadline passed while queued for a model slot")
+
+    async def acquire_async(self, deadline=None, cost: float = 1.0, priority: str = None, tenant: str = None) -> None:
+        """Awaitable `acquire()`; the event loop keeps running while queued."""
+        default_priority, default_tenant = _context.get()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        with self._lock:
+            waiter = self._enqueue(priority or default_priority, tenant or default_tenant, cost, deadline, notify)
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(granted), deadline.remaining() if deadline is not None else None)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.state == "granted":
+                    self._in_use -= 1
+                    self._dispatch()
+                else:
+                    self._give_up(waiter)
+            raise
+        with self._lock:
+            if waiter.state == "granted":
+                return
+            self._give_up(waiter)
+        raise DeadlineExceeded("Deadline passed while queued for a model slot")
+
+    def release(self) -> None:
+        with self._lock:
+            self._in_use = max(0, self._in_use - 1)
+            self._dispatch()
+
+    def call(self, fn, timeout: float, deadline=None, cost: float = 1.0, priority: str = None, tenant: str = None):
+        """Run blocking `fn` in a slot, giving up on it after `timeout` seconds.
+
+        The call itself cannot be interrupted: it finishes in the background
+        and its result is discarded. It keeps its slot until it returns, so
+        abandoned calls still count against the model concurrency.
+
+        Args:
+            fn: Zero-argument callable (the model call)
+            timeout: Seconds to wait for the result
+            deadline, cost, priority, tenant: As for `acquire()`
+
+        Raises:
+            DeadlineExceeded: If the deadline passed while queued.
+            TimeoutError: If `fn` did not return within `timeout`.
+        """
+        self.acquire(deadline, cost, priority, tenant)
+        try:
+            with self._lock:
+                if self._pool is None:
+                    # Never queues: every running call holds one of the slots
+                    self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="model-call")
+            future = self._pool.submit(fn)
+        except BaseException:
+            self.release()
+            raise
+        future.add_done_callback(lambda _: self.release())
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            raise TimeoutError(f"Attempt timed out after {timeout:.1f}s") from None
+
+    @contextlib.contextmanager
+    def slot(self, deadline=None, cost: float = 1.0, priority: str = None, tenant: str = None):
+        """Hold a model-call slot for the duration of the block."""
+        self.acquire(deadline, cost, priority, tenant)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self, deadline=None, cost: float = 1.0, priority: str = None, tenant: str = None):
+        await self.acquire_async(deadline, cost, priority, tenant)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def snapshot(self) -> dict:
+        """Queue depth, outcomes and queue-wait percentiles per class."""
+        with self._lock:
+            classes = {}
+            for priority in self.priorities:
+                p50 = self._waits[priority].percentile(50)
+                p99 = self._waits[priority].percentile(99)
+                classes[priority] = dict(
+                    self._stats[priority],
+                    depth=sum(1 for _, _, w in self._queues[priority] if w.state == "waiting"),
+                    wait_p50_ms=round(p50 * 1000, 1) if p50 is not None else None,
+                    wait_p99_ms=round(p99 * 1000, 1) if p99 is not None else None,
+                )
+            return {"concurrency": self.concurrency, "in_use": self._in_use, "classes": classes}
+
+
+def _parse_weights(value: str) -> dict:
+    weights = {}
+    for entry in (value or "").split(","):
+        tenant, _, weight = entry.strip().partition(":")
+        try:
+            weights[tenant] = max(0.01, float(weight))
+        except ValueError:
+            continue
+    return weights
+
+
+def from_env() -> ModelScheduler:
+    return ModelScheduler(
+        concurrency=int(os.environ.get("ZODIAC_MODEL_CONCURRENCY", "16")),
+        tenant_weights=_parse_weights(os.environ.get("ZODIAC_TENANT_WEIGHTS")),
+    )
+
+
+# Process-wide scheduler shared by every model call site
+model_scheduler = from_env()
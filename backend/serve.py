@@ -0,0 +1,51 @@
+"""
+Production Launcher
+===================
+
+Runs the FastAPI backend with multiple worker processes, keep-alive tuned for
+a load balancer in front, and a graceful drain on SIGTERM.
+
+With more than one worker the shared-state layer defaults to an owner-only
+SQLite file in /dev/shm, so caches and rate limits are shared instead of
+multiplied per worker (override with ZODIAC_STATE_URL, e.g. redis://...).
+Auth tokens stay in each worker's memory.
+
+Usage:
+    python serve.py                       # WEB_CONCURRENCY workers on $PORT
+    WEB_CONCURRENCY=4 python serve.py
+
+Environment:
+    PORT                      Listen port (default 8000, set by Cloud Run)
+    WEB_CONCURRENCY           Worker processes (default: CPU count)
+    ZODIAC_KEEPALIVE_SECONDS  Idle keep-alive; keep above the LB's idle timeout (default 650)
+    ZODIAC_DRAIN_SECONDS      Time to finish in-flight requests on shutdown (default 8)
+"""
+
+import os
+
+import uvicorn
+
+import shared_state
+
+
+def main():
+    workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+    if workers > 1 and "ZODIAC_STATE_URL" not in os.environ:
+        # Inherited by the worker processes before they import app.py
+        os.environ["ZODIAC_STATE_URL"] = f"sqlite://{shared_state.DEFAULT_SHARED_PATH}"
+
+    uvicorn.run(
+        "app:app",
+        host="0.0.0.0",
+        port=int(os.environ.get("PORT", "8000")),
+        workers=workers,
+        timeout_keep_alive=int(os.environ.get("ZODIAC_KEEPALIVE_SECONDS", "650")),
+        timeout_graceful_shutdown=int(os.environ.get("ZODIAC_DRAIN_SECONDS", "8")),
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+        access_log=False,
+    )
+
+
+if __name__ == "__main__":
+    main()
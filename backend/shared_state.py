@@ -0,0 +1,246 @@
+"""
+Shared State Layer
+==================
+
+Small key/value store with TTLs so caches (sessions, responses, rate-limit
+buckets) behave the same whether the backend runs one worker or
+many. The backend is picked with ZODIAC_STATE_URL:
+
+    memory://                    per-process dict (default, single worker)
+    sqlite:///dev/shm/zodiac.db  file in shared memory, shared by all local workers
+    redis://host:6379/0          Redis (requires the optional `redis` package)
+
+`serve.py` defaults to the sqlite stand-in when it starts more than one worker.
+Values must be JSON-serializable.
+
+Anything written here is readable by whoever can open the file or reach the
+Redis instance, so secrets (auth tokens, credentials) stay in process memory.
+The SQLite file is created owner-only (0600) inside an owner-only (0700)
+per-user directory; point ZODIAC_STATE_URL elsewhere only with the same care.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+_SHARED_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else "/tmp"
+DEFAULT_SHARED_PATH = os.path.join(_SHARED_ROOT, f"zodiac-{os.getuid()}", "state.db")
+
+
+class MemoryStore:
+    """Per-process store. Fast, but not shared between workers."""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key)
+            return None if item is None else json.loads(item[0])
+
+    def set(self, key, value, ttl: float = None) -> None:
+        with self._lock:
+            self._data[key] = (json.dumps(value), time.time() + ttl if ttl else None)
+
+    def set_if_absent(self, key, value, ttl: float = None) -> bool:
+        with self._lock:
+            if self._live(key) is not None:
+                return False
+            self._data[key] = (json.dumps(value), time.time() + ttl if ttl else None)
+            return True
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def update(self, key, fn, ttl: float = None):
+        """Atomically replace the value with fn(current_or_None); returns the new value."""
+        with self._lock:
+            item = self._live(key)
+            value = fn(json.loads(item[0]) if item else None)
+            self._data[key] = (json.dumps(value), time.time() + ttl if ttl else None)
+            return value
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            now = time.time()
+            expired = [k for k, (_, exp) in self._data.items() if exp is not None and exp <= now]
+            for k in expired:
+                del self._data[k]
+            return len(expired)
+
+    def size(self) -> int:
+        """Number of live (unexpired) keys."""
+        with self._lock:
+            now = time.time()
+            return sum(1 for _, exp in self._data.values() if exp is None or exp > now)
+
+
+class SqliteStore:
+    """Store backed by a SQLite file (on tmpfs) shared by all local worker processes."""
+
+    def __init__(self, path: str = DEFAULT_SHARED_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._create_private(path)
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)")
+
+    @staticmethod
+    def _create_private(path: str) -> None:
+        """Create the db file (0600) and a missing parent directory (0700) before SQLite opens it.
+
+        SQLite gives its -wal/-shm side files the db file's permissions, so they stay private too.
+        """
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(path, 0o600)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # tmpfs; durability is not a goal
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key, value, ttl: float = None) -> None:
+        self._conn().execute(
+            "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time() + ttl if ttl else None),
+        )
+
+    def set_if_absent(self, key, value, ttl: float = None) -> bool:
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM kv WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, now))
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def delete(self, key) -> None:
+        self._conn().execute("DELETE FROM kv WHERE key = ?", (key,))
+
+    def update(self, key, fn, ttl: float = None):
+        """Atomically replace the value with fn(current_or_None); returns the new value."""
+        conn = self._conn()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, now),
+            ).fetchone()
+            value = fn(json.loads(row[0]) if row else None)
+            conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value), now + ttl if ttl else None),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def purge_expired(self) -> int:
+        cur = self._conn().execute("DELETE FROM kv WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+        return cur.rowcount
+
+    def size(self) -> int:
+        """Number of live (unexpired) keys."""
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM kv WHERE expires_at IS NULL OR expires_at > ?", (time.time(),)
+        ).fetchone()
+        return row[0]
+
+
+class RedisStore:
+    """Store backed by Redis (or any Redis-protocol server)."""
+
+    def __init__(self, url: str):
+        import redis  # optional dependency
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self._redis.get(key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl: float = None) -> None:
+        self._redis.set(key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def set_if_absent(self, key, value, ttl: float = None) -> bool:
+        return bool(self._redis.set(key, json.dumps(value), px=int(ttl * 1000) if ttl else None, nx=True))
+
+    def delete(self, key) -> None:
+        self._redis.delete(key)
+
+    def update(self, key, fn, ttl: float = None):
+        """Atomically replace the value with fn(current_or_None) (optimistic WATCH/MULTI)."""
+        import redis
+
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(key)
+                    raw = pipe.get(key)
+                    value = fn(None if raw is None else json.loads(raw))
+                    pipe.multi()
+                    pipe.set(key, json.dumps(value), px=int(ttl * 1000) if ttl else None)
+                    pipe.execute()
+                    return value
+                except redis.WatchError:
+                    continue
+
+    def purge_expired(self) -> int:
+        return 0  # Redis expires keys itself
+
+    def size(self) -> int:
+        """Number of keys in the Redis database (shared with anything else using it)."""
+        return self._redis.dbsize()
+
+
+def create_store(url: str = None):
+    """Create a store from a ZODIAC_STATE_URL-style URL."""
+    url = url or os.environ.get("ZODIAC_STATE_URL", "memory://")
+    if url.startswith("memory://"):
+        return MemoryStore()
+    if url.startswith("sqlite://"):
+        return SqliteStore(url[len("sqlite://"):] or DEFAULT_SHARED_PATH)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(url)
+    raise ValueError(f"Unsupported ZODIAC_STATE_URL: {url}")
+
+
+# Process-wide store used by app.py and its helpers
+store = create_store()
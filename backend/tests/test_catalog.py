@@ -0,0 +1,102 @@
+import random
+
+import catalog
+from catalog import NO_FARE, FareCalendar
+
+
+def random_rows(rng, count=12, days=90):
+    rows = []
+    for i in range(count):
+        start = f"2030-01-{rng.randint(1, 20):02d}"
+        prices = [None if rng.random() < 0.1 else rng.randint(50, 90) for _ in range(rng.randint(days // 2, days))]
+        rows.append({"city": f"City{i}", "price": 70, "tags": ["Sun"], "fares": {"start": start, "prices": prices}})
+    return rows
+
+
+def test_range_minimum_matches_brute_force():
+    rng = random.Random(7)
+    calendar = FareCalendar(random_rows(rng))
+    for _ in range(2000):
+        position = rng.randrange(len(calendar.fares))
+        lo = rng.randrange(calendar.days)
+        hi = rng.randrange(lo, calendar.days)
+        fares = calendar.fares[position]
+        expected = min(fares[lo:hi + 1])
+        fare, day = calendar.cheapest(position, lo, hi)
+        assert fare == expected
+        # Ties resolve to the earliest day
+        assert day == lo + list(fares[lo:hi + 1]).index(expected)
+
+
+def test_cheapest_dates_match_brute_force():
+    rng = random.Random(11)
+    calendar = FareCalendar(random_rows(rng))
+    for _ in range(200):
+        lo = rng.randrange(calendar.days)
+        hi = rng.randrange(lo, calendar.days)
+        max_price, limit = rng.randint(45, 95), rng.randint(1, 30)
+        expected = sorted(
+            (fares[day], day, position)
+            for position, fares in enumerate(calendar.fares)
+            for day in range(lo, hi + 1)
+            if fares[day] != NO_FARE and fares[day] <= max_price
+        )[:limit]
+        assert calendar.cheapest_dates(max_price, lo, hi, limit=limit) == expected
+
+
+def rows_with_tied_scores():
+    rng = random.Random(3)
+    tags = ["Sun", "City", "Romantic", "Nature", "Foodie"]
+    rows = [{"city": f"City{i}", "price": rng.choice([100, 200, 300]), "tags": rng.sample(tags, 2)} for i in range(40)]
+    return catalog.with_default_fares(rows)
+
+
+def paginate(rows, limit, **query):
+    pages, cursor = [], None
+    while True:
+        page = catalog.search(rows, limit=limit, cursor=cursor, **query)
+        pages.append([r["city"] for r in page["results"]])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_cursor_pages_are_stable():
+    rows = rows_with_tied_scores()
+    for query in ({"vibes": ["sun", "city"]}, {"max_price": 250, "vibes": ["romance"]},
+                  {"vibes": ["sunny"], "date_from": catalog.fares_start()}):
+        everything = [r["city"] for r in catalog.search(rows, limit=catalog.MAX_PAGE_SIZE, **query)["results"]]
+        for limit in (1, 3, 7):
+            pages = paginate(rows, limit, **query)
+            flat = [city for page in pages for city in page]
+            # No overlap, no gaps, same order as one big page
+            assert flat == everything
+            assert all(len(page) == limit for page in pages[:-1])
+            # Replaying the same cursor gives the same page
+            assert paginate(rows, limit, **query) == pages
+
+
+def test_vibe_index_maps_free_text_to_catalog_tags():
+    index = catalog.VibeIndex({t for d in catalog.DEFAULT_DESTINATIONS for t in d["tags"]})
+    assert index.match("beach") == {"Sun": catalog.SYNONYM_WEIGHT, "Water": catalog.SYNONYM_WEIGHT}
+    assert index.match("beaches") == index.match("beach")
+    assert index.match("nightlife") == {"Party": catalog.SYNONYM_WEIGHT}
+    assert index.match("relaxing") == {"Spiritual": catalog.SYNONYM_WEIGHT}
+    assert index.match("Romantic") == {"Romantic": catalog.EXACT_WEIGHT}
+    assert index.match("quiet beach town") == {"Sun": catalog.SYNONYM_WEIGHT, "Water": catalog.SYNONYM_WEIGHT}
+    assert index.match("xylophone") == {}
+    assert index.match("") == {}
+
+
+def test_unindexed_tags_never_match():
+    # Spiritual is not in this catalog, so its synonyms are not indexed either
+    index = catalog.VibeIndex({"Sun", "Water"})
+    assert index.match("relaxing") == {}
+    assert index.match("beach") == {"Sun": catalog.SYNONYM_WEIGHT, "Water": catalog.SYNONYM_WEIGHT}
+
+
+def test_vibes_rank_matching_destinations_first():
+    destinations = catalog.default_catalog()["destinations"]
+    ranked = catalog.rank_destinations(destinations, 1000, ["beach"])
+    assert {d["city"] for score, d in ranked if score > 0} == {"Santorini", "Bali", "Tulum", "Lisbon", "Barcelona"}
+    assert ranked[0][1]["city"] in ("Santorini", "Bali", "Tulum")
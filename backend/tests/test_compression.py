@@ -0,0 +1,118 @@
+import asyncio
+import gzip
+import json
+
+import compression
+from compression import CompressionMiddleware, negotiate
+
+
+def _scope(headers: dict) -> dict:
+    return {"type": "http", "method": "POST", "path": "/chat",
+            "headers": [(k.lower().encode(), v.encode()) for k, v in headers.items()]}
+
+
+def _call(app, headers: dict, body_chunks, after_body=None):
+    """Run one request through the middleware; returns (status, headers, body, what the app received)."""
+    sent = []
+    received = []
+    wire = [{"type": "http.request", "body": chunk, "more_body": i < len(body_chunks) - 1}
+            for i, chunk in enumerate(body_chunks)]
+
+    async def receive():
+        if wire:
+            return wire.pop(0)
+        return await after_body()
+
+    async def send(message):
+        sent.append(message)
+
+    async def main():
+        await CompressionMiddleware(app(received))(_scope(headers), receive, send)
+
+    asyncio.run(main())
+    start = sent[0]
+    body = b"".join(m.get("body", b"") for m in sent[1:])
+    return start["status"], start["headers"], body, received
+
+
+def echo_app(response_headers=()):
+    """App factory for `_call`: echoes the request body in a compressible JSON reply."""
+    def build(received_list):
+        async def app(scope, receive, send):
+            message = await receive()
+            received_list.append(message)
+            payload = json.dumps({"echo": message["body"].decode()}).encode() * 40
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"application/json"), *response_headers]})
+            await send({"type": "http.response.body", "body": payload})
+        return app
+    return build
+
+
+def test_gzip_request_is_inflated_and_response_compressed():
+    status, headers, body, received = _call(echo_app(), {"content-encoding": "gzip", "accept-encoding": "gzip"},
+                                            [gzip.compress(b"hello")])
+    assert status == 200
+    assert received[0]["body"] == b"hello"
+    assert (b"content-encoding", b"gzip") in headers
+    assert b"hello" in gzip.decompress(body)
+
+
+def test_decompression_bomb_is_rejected_with_413(monkeypatch):
+    monkeypatch.setattr(compression, "MAX_INFLATED_BYTES", 64 * 1024)
+    bomb = gzip.compress(b"\0" * (1024 * 1024))
+    assert len(bomb) < compression.MAX_INFLATED_BYTES
+    status, _, body, received = _call(echo_app(), {"content-encoding": "gzip"}, [bomb])
+    assert status == 413
+    assert received == []
+
+
+def test_oversized_wire_body_is_rejected_with_413(monkeypatch):
+    monkeypatch.setattr(compression, "MAX_INFLATED_BYTES", 1024)
+    status, _, _, received = _call(echo_app(), {"content-encoding": "gzip"}, [b"x" * 800, b"x" * 800])
+    assert status == 413
+    assert received == []
+
+
+def test_unknown_encoding_is_415_and_corrupt_body_is_400():
+    assert _call(echo_app(), {"content-encoding": "compress"}, [b"abc"])[0] == 415
+    assert _call(echo_app(), {"content-encoding": "gzip"}, [b"not gzip at all"])[0] == 400
+
+
+def test_vary_is_merged_into_the_existing_header():
+    app = echo_app(response_headers=[(b"vary", b"Origin")])
+    _, headers, _, _ = _call(app, {"accept-encoding": "gzip"}, [b"hi"])
+    assert [v for k, v in headers if k == b"vary"] == [b"Origin, Accept-Encoding"]
+
+
+def test_receive_after_the_body_waits_for_the_real_disconnect():
+    disconnected = []
+
+    def app(received):
+        async def run(scope, receive, send):
+            received.append(await receive())
+            # A disconnect watcher: must block until the client actually goes away
+            try:
+                await asyncio.wait_for(receive(), timeout=0.05)
+            except asyncio.TimeoutError:
+                disconnected.append("still connected")
+            await send({"type": "http.response.start", "status": 204, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+        return run
+
+    async def never_disconnects():
+        await asyncio.sleep(10)
+
+    status, _, _, received = _call(app, {"content-encoding": "gzip"}, [gzip.compress(b"hello")], never_disconnects)
+    assert status == 204
+    assert received[0]["body"] == b"hello"
+    assert disconnected == ["still connected"]
+
+
+def test_negotiate_honours_q_values():
+    assert negotiate("gzip") == "gzip"
+    assert negotiate("gzip;q=0, identity") is None
+    assert negotiate("*;q=0.5") in compression.COMPRESSORS
+    assert negotiate("*, gzip;q=0") in (set(compression.COMPRESSORS) - {"gzip"}) | {None}
+    assert negotiate("deflate, identity") is None
+    assert negotiate("GZIP;q=0.8") == "gzip"
@@ -0,0 +1,58 @@
+import asyncio
+import os
+
+import conversation_log
+from conversation_log import ConversationLog
+
+
+def records(start, count):
+    return [{"ts": float(i), "user_id": "u", "session_id": "s", "message": f"m{i}"} for i in range(start, start + count)]
+
+
+def test_truncated_last_batch_keeps_the_complete_ones(tmp_path):
+    log = ConversationLog(directory=str(tmp_path))
+    log._append(records(0, 5))
+    log._append(records(5, 5))
+    path = log._segment[0]
+    complete = os.path.getsize(path)
+    log._append(records(10, 5))
+    with open(path, "rb") as f:
+        data = f.read()
+    last_member = len(data) - complete
+    # Crash mid-write: cut the last gzip member at several points
+    for cut in (1, 10, last_member // 2, last_member - 1):
+        truncated = tmp_path / "cut" / os.path.basename(path)
+        truncated.parent.mkdir(exist_ok=True)
+        truncated.write_bytes(data[:complete + cut])
+        messages = [r["message"] for r in conversation_log.read_records(str(truncated))]
+        # Both complete batches survive; anything after them is an in-order prefix of the cut one
+        assert len(messages) >= 10
+        assert messages == [f"m{i}" for i in range(len(messages))]
+
+
+def test_logged_records_read_back_as_scenarios(tmp_path):
+    async def main():
+        log = ConversationLog(directory=str(tmp_path))
+        log.start()
+        for record in records(0, 300):
+            log.log(record)
+        await log.close()
+        return log.snapshot()
+
+    stats = asyncio.run(main())
+    assert stats["written"] == 300 and stats["dropped"] == 0
+    read = list(conversation_log.read_records(str(tmp_path)))
+    assert [r["message"] for r in read] == [f"m{i}" for i in range(300)]
+    scenarios = conversation_log.to_scenarios(read)
+    assert len(scenarios) == 1 and len(scenarios[0]["turns"]) == 300
+
+
+def test_segments_are_only_deleted_when_keep_is_set(tmp_path):
+    for keep, expected in ((0, 6), (2, 2)):
+        directory = tmp_path / f"keep{keep}"
+        directory.mkdir()
+        log = ConversationLog(directory=str(directory), segment_bytes=1, keep=keep)
+        for batch in range(6):
+            log._append(records(batch, 1))  # one segment per batch
+        assert len(conversation_log.segment_paths(str(directory))) == expected
+    assert ConversationLog().keep == 0
@@ -0,0 +1,73 @@
+import random
+
+import engine_router
+from engine_router import EngineRouter, Endpoint
+from shared_state import MemoryStore
+
+
+class FakeClock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+def make_router(*names, store=None):
+    return EngineRouter([Endpoint(name, f"https://{name}.example/engine:query") for name in names],
+                        store=store, rng=random.Random(7))
+
+
+def serve(router, latencies: dict, requests: int, session_key: str = None) -> dict:
+    """Route `requests` calls, feeding back each endpoint's fixed latency; returns picks per endpoint."""
+    picks = dict.fromkeys(latencies, 0)
+    for _ in range(requests):
+        endpoint = router.choose(session_key)
+        picks[endpoint.name] += 1
+        router.record(endpoint, latencies[endpoint.name], ok=True, session_key=session_key)
+    return picks
+
+
+def test_slow_endpoint_loses_traffic():
+    router = make_router("fast", "slow")
+    picks = serve(router, {"fast": 0.05, "slow": 0.5}, 400)
+    # Only the first measurement and exploration reach the slow one
+    assert picks["slow"] < 400 * engine_router.EXPLORE_FRACTION
+    assert router.stats["explore"] > 0
+
+
+def test_session_keeps_its_endpoint_until_it_gets_much_slower():
+    router = make_router("a", "b", store=MemoryStore())
+    serve(router, {"a": 0.12, "b": 0.10}, 20)
+    router.record(router.choose(exclude=("b",)), 0.12, ok=True, session_key="s1")
+
+    # Slightly slower than the best primary: the session stays
+    assert serve(router, {"a": 0.12, "b": 0.10}, 20, session_key="s1") == {"a": 20, "b": 0}
+    assert router.stats["affinity"] == 20
+
+    # Far slower: it moves, and sticks to the new endpoint
+    picks = serve(router, {"a": 1.0, "b": 0.10}, 40, session_key="s1")
+    assert picks["b"] > picks["a"]
+    assert router.choose("s1").name == "b"
+
+
+def test_router_recovers_after_every_endpoint_failed(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(engine_router, "time", clock)
+    router = make_router("a", "b")
+    for _ in range(engine_router.EJECT_AFTER_FAILURES):
+        for endpoint in router.endpoints.values():
+            router.record(endpoint, 0.1, ok=False)
+    assert not any(e.healthy(clock.now) for e in router.endpoints.values())
+
+    # Still routes somewhere while everything is ejected
+    fallback = router.choose()
+    assert router.stats["fallback"] == 1
+    router.record(fallback, 0.1, ok=False)
+
+    # After the cooldown both are tried again and serve normally
+    clock.now += engine_router.EJECT_BASE_SECONDS + 1
+    picks = serve(router, {"a": 0.05, "b": 0.5}, 50)
+    assert picks["a"] > picks["b"]
+    assert router.stats["fallback"] == 1
+    assert all(e.healthy(clock.now) for e in router.endpoints.values())
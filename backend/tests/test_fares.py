@@ -0,0 +1,37 @@
+import os
+from datetime import date, timedelta
+
+import catalog
+
+
+def test_fare_series_starts_today_by_default():
+    fares = catalog.default_fares("Paris", 300)
+    assert fares["start"] == catalog.fares_start()
+    assert catalog.fares_start() == (os.environ.get("ZODIAC_FARES_START") or date.today().isoformat())
+    assert len(fares["prices"]) == catalog.DEFAULT_FARE_DAYS
+
+
+def test_a_dates_fare_does_not_depend_on_the_series_start():
+    first = date(2030, 1, 1)
+    early = catalog.default_fares("Paris", 300, start=first.isoformat(), days=30)
+    late = catalog.default_fares("Paris", 300, start=(first + timedelta(days=10)).isoformat(), days=20)
+    assert early["prices"][10:] == late["prices"]
+
+
+def test_artifact_rebuilds_built_in_fares_when_loaded(tmp_path, monkeypatch):
+    monkeypatch.setenv("ZODIAC_FARES_START", "2030-01-01")
+    data = catalog.default_catalog()
+    custom = {"start": "2030-01-01", "prices": [99, None, 101]}
+    data["destinations"][0]["fares"] = custom
+    path = str(tmp_path / catalog.ARTIFACT_NAME)
+    catalog.write_artifact(path, data)
+
+    # Loaded a year and a half after the build: the built-in series start that day
+    monkeypatch.setenv("ZODIAC_FARES_START", "2031-07-01")
+    loaded = catalog.load_artifact(path)
+    rows = loaded["destinations"]
+    assert rows[0]["fares"] == custom  # explicit fares are stored and kept as they are
+    for row in rows[1:]:
+        assert row["fares"]["start"] == "2031-07-01"
+        assert len(row["fares"]["prices"]) == catalog.DEFAULT_FARE_DAYS
+    assert loaded["user_data"] == data["user_data"]
@@ -0,0 +1,56 @@
+import asyncio
+import threading
+
+from health import Readiness, UpstreamProbe, overall_status
+
+TARGETS = [("a", "http://a"), ("b", "http://b"), ("c", "http://c")]
+
+
+def test_headers_are_built_once_per_round():
+    calls, sent = [], []
+    lock = threading.Lock()
+
+    def headers():
+        calls.append(1)
+        return {"Authorization": f"Bearer t{len(calls)}"}
+
+    def send(url, timeout, headers):
+        with lock:
+            sent.append((url, headers["Authorization"]))
+        return 200
+
+    probe = UpstreamProbe(lambda: TARGETS, send, headers=headers)
+    asyncio.run(probe.probe_all())
+    asyncio.run(probe.probe_all())
+    assert len(calls) == 2
+    assert sorted(sent) == sorted([(url, "Bearer t1") for _, url in TARGETS] + [(url, "Bearer t2") for _, url in TARGETS])
+
+
+def test_failed_headers_mark_every_endpoint_failing():
+    def headers():
+        raise RuntimeError("no credentials")
+
+    def send(url, timeout, headers):
+        raise AssertionError("must not probe without headers")
+
+    probe = UpstreamProbe(lambda: TARGETS, send, headers=headers)
+    asyncio.run(probe.probe_all())
+    asyncio.run(probe.probe_all())
+    assert sorted(probe.failing()) == ["a", "b", "c"]
+    assert "no credentials" in probe.snapshot()["endpoints"]["a"]["last_error"]
+
+
+def test_status_rolls_up_readiness_and_probes():
+    readiness = Readiness()
+    ready = {"ok": False}
+    readiness.add_check("auth_token", lambda: (ready["ok"], "no token yet"))
+    probe = UpstreamProbe(lambda: TARGETS[:1], lambda url, timeout, headers: 503)
+    engines = {"endpoints": {"a": {"ejected_for_s": 0}}}
+    assert overall_status(readiness.report(), engines, probe)["status"] == "starting"
+    ready["ok"] = True
+    assert overall_status(readiness.report(), engines, probe)["status"] == "ok"
+    asyncio.run(probe.probe_all())
+    asyncio.run(probe.probe_all())
+    status = overall_status(readiness.report(), engines, probe)
+    assert status["status"] == "degraded"
+    assert status["reasons"] == ["engine a: upstream probes failing"]
@@ -0,0 +1,87 @@
+import asyncio
+import sqlite3
+import time
+
+import idempotency
+from shared_state import MemoryStore, SqliteStore
+
+
+def _run_many(cache, count, pause_every=0, pause=0.0):
+    async def compute():
+        return 200, b'{"response": "ok"}', True
+
+    async def main():
+        for i in range(count):
+            await cache.run("user_001", f"key-{i}", "fp", compute, wait_seconds=1.0)
+            if pause_every and i % pause_every == pause_every - 1:
+                await asyncio.sleep(pause)
+
+    asyncio.run(main())
+
+
+def test_expired_results_are_deleted_from_the_store():
+    store = MemoryStore()
+    cache = idempotency.IdempotencyCache(store, result_ttl=0.01)
+    _run_many(cache, 500, pause_every=50, pause=0.02)
+    # Only the last batch (not yet expired) may remain; nothing reads the old keys again
+    assert len(store._data) <= 50
+    assert len(store._data) == len(cache._recent)
+
+
+def test_store_is_capped_at_max_keys():
+    store = MemoryStore()
+    cache = idempotency.IdempotencyCache(store, result_ttl=600, max_keys=10)
+    _run_many(cache, 100)
+    assert len(store._data) == 10
+    assert cache.stats["evicted"] == 90
+
+
+def test_duplicate_is_replayed_and_conflict_rejected():
+    store = MemoryStore()
+    cache = idempotency.IdempotencyCache(store)
+    calls = []
+
+    async def compute():
+        calls.append(time.monotonic())
+        return 200, b"reply", True
+
+    async def main():
+        first = await cache.run("u", "k", "fp", compute, wait_seconds=1.0)
+        second = await cache.run("u", "k", "fp", compute, wait_seconds=1.0)
+        try:
+            await cache.run("u", "k", "other", compute, wait_seconds=1.0)
+        except idempotency.IdempotencyConflict:
+            conflict = True
+        else:
+            conflict = False
+        return first, second, conflict
+
+    first, second, conflict = asyncio.run(main())
+    assert first == (200, b"reply", False)
+    assert second == (200, b"reply", True)
+    assert conflict
+    assert len(calls) == 1
+
+
+def test_sqlite_store_calls_do_not_block_the_event_loop(tmp_path):
+    # Another "worker" holds the SQLite write lock; the claim must wait for it in a
+    # thread so the loop stays free to run the callback that releases the lock.
+    path = str(tmp_path / "state.db")
+    cache = idempotency.IdempotencyCache(SqliteStore(path))
+    other_worker = sqlite3.connect(path, isolation_level=None)
+    other_worker.execute("BEGIN IMMEDIATE")
+
+    async def compute():
+        return 200, b"reply", True
+
+    async def main():
+        asyncio.get_running_loop().call_later(0.2, other_worker.execute, "COMMIT")
+        started = time.monotonic()
+        first = await cache.run("u", "k", "fp", compute, wait_seconds=1.0)
+        second = await idempotency.IdempotencyCache(SqliteStore(path)).run("u", "k", "fp", compute, wait_seconds=1.0)
+        return first, second, time.monotonic() - started
+
+    first, second, elapsed = asyncio.run(main())
+    assert first == (200, b"reply", False)
+    assert second == (200, b"reply", True)
+    assert elapsed < 2.0  # the 5 s busy timeout would fire if the loop were blocked
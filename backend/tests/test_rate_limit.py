@@ -0,0 +1,55 @@
+import json
+import time
+
+import pytest
+
+import rate_limit
+from rate_limit import RateLimiter, RateLimitExceeded
+from shared_state import MemoryStore
+
+
+def test_global_limit_refunds_the_user_bucket():
+    limiter = RateLimiter(user_bucket=(10.0, 1.0), global_bucket=(3.0, 0.001))
+    limiter.acquire("alice", 3)
+    with pytest.raises(RateLimitExceeded) as exc:
+        limiter.acquire("alice", 3)
+    assert exc.value.scope == "global"
+    # The refused request was refunded: 7 tokens left, not 4
+    assert limiter.store.get("ratelimit:user:alice")["tokens"] == pytest.approx(7, abs=0.1)
+
+
+def test_refund_keeps_the_bucket_ttl():
+    store = MemoryStore()
+    limiter = RateLimiter(store=store, user_bucket=(10.0, 1.0), global_bucket=(1.0, 0.001))
+    limiter.acquire("alice", 1)
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire("alice", 1)
+    _, expires_at = store._data["ratelimit:user:alice"]
+    assert expires_at is not None
+    assert expires_at - time.time() == pytest.approx(10.0 / 1.0 + 60, abs=1)
+
+
+def test_cost_above_capacity_is_charged_a_full_bucket():
+    limiter = RateLimiter(user_bucket=(4.0, 100.0), global_bucket=(600.0, 10.0))
+    limiter.acquire("bob", 50)
+    with pytest.raises(RateLimitExceeded) as exc:
+        limiter.acquire("bob", 50)
+    assert exc.value.retry_after <= 4.0 / 100.0
+    time.sleep(0.05)
+    limiter.acquire("bob", 50)
+
+
+def test_zero_rate_bucket_falls_back_to_the_default():
+    assert rate_limit._parse_bucket("30:0", (30.0, 0.5)) == (30.0, 0.5)
+    assert rate_limit._parse_bucket("0:5", (30.0, 0.5)) == (30.0, 0.5)
+    assert rate_limit._parse_bucket("10:2", (30.0, 0.5)) == (10.0, 2.0)
+
+
+def test_zero_rate_bucket_gives_a_finite_retry_hint():
+    limiter = RateLimiter(user_bucket=(1.0, 0.0))
+    limiter.acquire("carol", 1)
+    with pytest.raises(RateLimitExceeded) as exc:
+        limiter.acquire("carol", 1)
+    assert exc.value.retry_after == rate_limit.MAX_RETRY_AFTER_SECONDS
+    assert int(exc.value.retry_after + 0.999) == 3600
+    json.dumps({"retry_after": exc.value.retry_after}, allow_nan=False)
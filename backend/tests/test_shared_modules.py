@@ -0,0 +1,21 @@
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BACKEND = os.path.join(ROOT, "backend")
+AGENT = os.path.join(ROOT, "agent-source")
+
+
+def shared_modules() -> list:
+    """Modules that exist in both deploy units (each ships its own copy)."""
+    return sorted(name for name in os.listdir(BACKEND) if name.endswith(".py") and os.path.isfile(os.path.join(AGENT, name)))
+
+
+def test_shared_modules_are_identical():
+    modules = shared_modules()
+    assert "retry_policy.py" in modules
+    drifted = []
+    for name in modules:
+        with open(os.path.join(BACKEND, name), "rb") as a, open(os.path.join(AGENT, name), "rb") as b:
+            if a.read() != b.read():
+                drifted.append(name)
+    assert not drifted, f"backend/ and agent-source/ copies differ: {drifted} (edit one, copy it over)"
@@ -0,0 +1,33 @@
+import time
+
+from shared_state import MemoryStore, SqliteStore
+
+
+def test_purge_expired_drops_unread_keys(tmp_path):
+    for store in (MemoryStore(), SqliteStore(str(tmp_path / "state.db"))):
+        store.set("short", 1, ttl=0.01)
+        store.set("long", 2, ttl=60)
+        store.set("forever", 3)
+        time.sleep(0.02)
+        assert store.purge_expired() == 1
+        assert store.get("short") is None
+        assert (store.get("long"), store.get("forever")) == (2, 3)
+
+
+def test_sqlite_file_and_new_directory_are_owner_only(tmp_path):
+    path = tmp_path / "state" / "state.db"
+    store = SqliteStore(str(path))
+    store.set("k", 1)
+    assert path.stat().st_mode & 0o777 == 0o600
+    assert path.parent.stat().st_mode & 0o777 == 0o700
+
+
+def test_size_counts_live_keys(tmp_path):
+    for store in (MemoryStore(), SqliteStore(str(tmp_path / "state.db"))):
+        assert store.size() == 0
+        store.set("short", 1, ttl=0.01)
+        store.set("long", 2, ttl=60)
+        store.set("forever", 3)
+        assert store.size() == 3
+        time.sleep(0.02)
+        assert store.size() == 2
@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")  # TestClient transport
+pytest.importorskip("google.auth")
+pytest.importorskip("requests")
+
+from fastapi.testclient import TestClient
+
+import app as backend
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def generate_reply(request, deadline):
+        if request.message == "slow":
+            await asyncio.sleep(30)
+        return f"reply to {request.message}"
+
+    monkeypatch.setattr(backend, "generate_reply", generate_reply)
+    # No context manager: the lifespan (warm-up, auth) does not run
+    return TestClient(backend.app)
+
+
+def _until(socket, frame_type):
+    """Frames up to and including the first one of `frame_type`."""
+    frames = [socket.receive_json()]
+    while frames[-1]["type"] != frame_type:
+        frames.append(socket.receive_json())
+    return frames
+
+
+def test_reply_is_streamed_and_completed(client):
+    with client.websocket_connect("/ws/chat") as socket:
+        socket.send_json({"type": "message", "message": "hi", "user_id": "user_001"})
+        frames = _until(socket, "done")
+    assert frames[0]["type"] == "start" and frames[0]["turn"] == 1
+    assert "".join(f["text"] for f in frames if f["type"] == "delta") == "reply to hi"
+    assert frames[-1] == {"type": "done", "turn": 1, "response": "reply to hi"}
+
+
+def test_malformed_frames_get_an_error_and_the_socket_stays_open(client):
+    with client.websocket_connect("/ws/chat") as socket:
+        for frame in (["message", "hi"], {"type": "message", "message": 42}, {"message": "hi", "user_id": {"id": 1}}):
+            socket.send_json(frame)
+            assert socket.receive_json()["type"] == "error"
+        socket.send_json({"type": "message", "message": "still here"})
+        assert _until(socket, "done")[-1]["response"] == "reply to still here"
+
+
+def test_cancel_frame_stops_the_running_turn(client):
+    with client.websocket_connect("/ws/chat") as socket:
+        socket.send_json({"type": "message", "message": "slow"})
+        assert socket.receive_json()["type"] == "start"
+        socket.send_json({"type": "cancel"})
+        assert socket.receive_json() == {"type": "cancelled", "turn": 1}
+
+
+def test_new_message_cancels_the_previous_turn(client):
+    with client.websocket_connect("/ws/chat") as socket:
+        socket.send_json({"type": "message", "message": "slow"})
+        assert socket.receive_json()["type"] == "start"
+        socket.send_json({"type": "message", "message": "never mind"})
+        frames = _until(socket, "done")
+    assert frames[0] == {"type": "cancelled", "turn": 1}
+    assert frames[-1] == {"type": "done", "turn": 2, "response": "reply to never mind"}
+    assert not any(f.get("turn") == 1 for f in frames[1:])
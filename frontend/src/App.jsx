@@ -3,6 +3,39 @@ import { Send, Sparkles, Moon, Star, MapPin, User, Loader2, ChevronDown } from '
 import ReactMarkdown from 'react-markdown';
 import { motion, AnimatePresence } from 'framer-motion';
 
+// Long conversations carry the full history on every turn; gzip it when the
+// browser supports CompressionStream and the payload is big enough to matter.
+const COMPRESS_MIN_BYTES = 1024;
+
+async function compressBody(payload) {
+  if (typeof CompressionStream === 'undefined' || payload.length < COMPRESS_MIN_BYTES) {
+    return { body: payload, headers: {} };
+  }
+  const stream = new Blob([payload]).stream().pipeThrough(new CompressionStream('gzip'));
+  const body = await new Response(stream).arrayBuffer();
+  return { body, headers: { 'Content-Encoding': 'gzip' } };
+}
+
+// One key per user message, reused when a network hiccup forces a retry, so
+// the backend replays the first reply instead of running the turn twice.
+const NETWORK_RETRIES = 1;
+
+function newIdempotencyKey() {
+  if (typeof crypto !== 'undefined' && crypto.randomUUID) return crypto.randomUUID();
+  return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
+async function postChat(url, init) {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await fetch(url, init);
+    } catch (error) {
+      // fetch only rejects on network failure; HTTP errors are returned
+      if (attempt >= NETWORK_RETRIES) throw error;
+    }
+  }
+}
+
 function App() {
   const [messages, setMessages] = useState([
     { role: 'agent', content: "Greetings! ✨ I'm your Zodiac Travel Guide. Tell me your budget and vibe, and let's find your perfect destination!" }
@@ -41,16 +74,20 @@ function App() {
     const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
     try {
-      const response = await fetch(`${API_URL}/chat`, {
+      const payload = JSON.stringify({
+        user_id: currentUserId,
+        message: messageToSend,
+        history: newMessages // Pass full history
+      });
+      const { body, headers } = await compressBody(payload);
+      const response = await postChat(`${API_URL}/chat`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          'Idempotency-Key': newIdempotencyKey(),
+          ...headers,
         },
-        body: JSON.stringify({
-          user_id: currentUserId,
-          message: messageToSend,
-          history: newMessages // Pass full history
-        }),
+        body,
       });
 
       if (!response.ok) {